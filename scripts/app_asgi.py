@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# Servidor asincrono (ASGI) con el mismo contrato que app_flask_fixed.py: GET /,
+# POST /api/search y GET /api/stats, con la misma configuracion y caches.
+# El bucle de eventos solo atiende conexiones: la codificacion y la busqueda van a un
+# pool de WORKERS hilos. Con control de admision: como mucho MAX_QUEUE peticiones
+# esperando un hueco del pool y QUEUE_TIMEOUT segundos de espera; por encima se responde
+# 503 (con Retry-After) en lugar de acumular trabajo. GET /api/health no pasa por el pool.
+# Uso: python scripts/app_asgi.py [--workers 32] [--max-queue 64] [--port 8000]
+#      (o: uvicorn app_asgi:app --app-dir scripts)
+#
+# Con uvicorn instalado se sirve con uvicorn; si no, con un servidor HTTP/1.1 minimo
+# sobre asyncio incluido aqui (suficiente para la red local).
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+from pathlib import Path
+import sys
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import uvicorn
+    _HAS_UVICORN = True
+except Exception:
+    uvicorn = None
+    _HAS_UVICORN = False
+
+# Asegurar import local de app_flask_fixed (carga embeddings, modelo, indices y caches)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import app_flask_fixed as core
+
+# Busquedas simultaneas en el pool. Cada hilo solo espera su turno en el micro-lote de
+# app_flask_fixed (el modelo corre en un hilo); con tantos como BATCH_MAX se llenan los lotes.
+WORKERS = core.BATCH_MAX
+# Peticiones que pueden esperar un hueco del pool; la siguiente recibe 503
+MAX_QUEUE = 64
+# Segundos maximos de espera en cola antes de responder 503
+QUEUE_TIMEOUT = 10.0
+# Tamaño maximo del cuerpo de una peticion
+MAX_BODY = 64 * 1024
+
+
+class Saturated(Exception):
+    pass
+
+
+class Admission:
+    # Semaforo de WORKERS huecos delante de un pool de WORKERS hilos: las peticiones que
+    # no caben esperan (hasta max_queue y timeout segundos); el resto se rechaza al momento.
+    def __init__(self, workers: int = WORKERS, max_queue: int = MAX_QUEUE, timeout: float = QUEUE_TIMEOUT):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='search')
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.stats: Dict[str, int] = {'admitted': 0, 'rejected': 0, 'timeouts': 0}
+
+    async def run(self, fn, *args):
+        if self._slots is None:
+            # Se crea dentro del bucle de eventos que lo va a usar
+            self._slots = asyncio.Semaphore(self.workers)
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.stats['rejected'] += 1
+            raise Saturated('cola llena')
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise Saturated('tiempo de espera agotado')
+        finally:
+            self.waiting -= 1
+        self.stats['admitted'] += 1
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats, workers=self.workers, running=self.running, waiting=self.waiting,
+                    max_queue=self.max_queue)
+
+
+ADMISSION = Admission()
+
+
+async def _body(receive) -> bytes:
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        size += len(chunks[-1])
+        if size > MAX_BODY:
+            raise ValueError('cuerpo demasiado grande')
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _respond(send, status: int, body: bytes, content_type: str = 'application/json',
+                   headers: Tuple[Tuple[bytes, bytes], ...] = ()) -> None:
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+                + list(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _json(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+async def app(scope, receive, send):
+    # Aplicacion ASGI sin framework: tres rutas y el ciclo de vida (lifespan).
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                core.SEMANTIC.save()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+    method, path = scope['method'], scope['path']
+    if method == 'GET' and path == '/':
+        await _respond(send, 200, core.HTML.encode('utf-8'), 'text/html; charset=utf-8')
+    elif method == 'GET' and path == '/api/health':
+        await _respond(send, 200, _json({'ok': True, 'admission': ADMISSION.snapshot()}))
+    elif method == 'GET' and path == '/api/stats':
+        await _respond(send, 200, _json(dict(core.stats_payload(), admission=ADMISSION.snapshot())))
+    elif method == 'POST' and path == '/api/search':
+        try:
+            data = json.loads(await _body(receive) or b'{}')
+        except ValueError as e:
+            await _respond(send, 400, _json({'error': f'JSON invalido: {e}'}))
+            return
+        if not isinstance(data, dict):
+            data = {}
+        try:
+            payload, status = await ADMISSION.run(core.search_payload, data)
+        except Saturated as e:
+            await _respond(send, 503, _json({'error': f'Servidor ocupado ({e}), reintenta en unos segundos'}),
+                           headers=((b'retry-after', b'1'),))
+            return
+        await _respond(send, status, _json(payload))
+    else:
+        await _respond(send, 404, _json({'error': 'No encontrado'}))
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+            500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, asgi) -> None:
+    # Una conexion HTTP/1.1 (con keep-alive): cada peticion se pasa a la app ASGI.
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, version = lines[0].split(' ', 2)
+            headers = [tuple(line.split(':', 1)) for line in lines[1:] if ':' in line]
+            fields = {k.strip().lower(): v.strip() for k, v in headers}
+            length = int(fields.get('content-length', 0))
+            if length > MAX_BODY:
+                writer.write(b'HTTP/1.1 413 Payload Too Large\r\ncontent-length: 0\r\nconnection: close\r\n\r\n')
+                await writer.drain()
+                return
+            body = await reader.readexactly(length)
+            keep_alive = (fields.get('connection', '').lower() != 'close'
+                          and (version == 'HTTP/1.1' or fields.get('connection', '').lower() == 'keep-alive'))
+            path, _, query = target.partition('?')
+            scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': version[5:], 'method': method,
+                     'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                     'headers': [(k.strip().lower().encode(), v.strip().encode()) for k, v in headers]}
+            sent = {}
+
+            async def receive():
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    sent['status'] = message['status']
+                    sent['headers'] = message.get('headers', [])
+                elif message['type'] == 'http.response.body':
+                    status = sent['status']
+                    out = [f'HTTP/1.1 {status} {_REASONS.get(status, "")}'.encode()]
+                    out += [k + b': ' + v for k, v in sent['headers']]
+                    out.append(b'connection: ' + (b'keep-alive' if keep_alive else b'close'))
+                    writer.write(b'\r\n'.join(out) + b'\r\n\r\n' + message.get('body', b''))
+                    await writer.drain()
+
+            await asgi(scope, receive, send)
+            if not keep_alive:
+                return
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(asgi, host: str, port: int) -> None:
+    # Servidor HTTP minimo para cuando no esta uvicorn.
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, asgi), host, port, backlog=1024)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        core.SEMANTIC.save()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Servidor asincrono del chat (mismo API que app_flask_fixed.py)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Busquedas simultaneas en el pool de hilos')
+    parser.add_argument('--max-queue', type=int, default=MAX_QUEUE,
+                        help='Peticiones en espera antes de responder 503')
+    parser.add_argument('--queue-timeout', type=float, default=QUEUE_TIMEOUT,
+                        help='Segundos maximos de espera en cola antes de responder 503')
+    parser.add_argument('--builtin', action='store_true', help='Usa el servidor incluido aunque haya uvicorn')
+    args = parser.parse_args()
+
+    global ADMISSION
+    ADMISSION = Admission(args.workers, args.max_queue, args.queue_timeout)
+    print(f'Servidor asincrono en http://{args.host}:{args.port} ({args.workers} workers, cola {args.max_queue})')
+    if _HAS_UVICORN and not args.builtin:
+        uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+        return 0
+    try:
+        asyncio.run(serve(app, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
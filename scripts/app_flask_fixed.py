@@ -1,30 +1,58 @@
 #!/usr/bin/env python3
 # Servidor Flask - Chat estilo ChatGPT (sin controles de top_k/threshold)
 
+import atexit
 import sys
+import threading
 from pathlib import Path
 import json
-import numpy as np
 from flask import Flask, request, jsonify
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
 # Asegurar import local de search_engine
 sys.path.insert(0, str(Path(__file__).resolve().parent))
+import embedding_store
+import lexical_index
+import micro_batch
+import query_cache
 import search_engine
 
 APP = Flask(__name__)
 
 # Rutas a recursos
-EMB_PATH = Path('Data/embeddings.npz')
+EMB_PATH = Path('Data/embeddings')
+LEGACY_EMB_PATH = Path('Data/embeddings.npz')
 META_PATH = Path('Data/metadata.jsonl')
+INDEX_DIR = Path('Data/index')
+LEXICAL_DIR = Path('Data/lexical')
+SEMANTIC_CACHE_PATH = Path('Data/semantic_cache.npz')
+# Preguntas frecuentes (una por linea) con las que se precalienta la cache semantica
+WARM_QUESTIONS_PATH = Path('Data/warm_questions.txt')
 MODEL_NAME = 'all-MiniLM-L6-v2'
+# 'float32', 'float16' o 'int8' (ver search_engine.py)
+INDEX_DTYPE = 'float32'
+# 'flat' (exacto), 'ivf', 'ivfpq', 'hnsw', 'stream' o 'binary'; parametros en INDEX_PARAMS
+# (nlist, nprobe, ef_search, rerank, shards, pca_dim...)
+INDEX_KIND = 'flat'
+INDEX_PARAMS = {}
+# 'dense' (embeddings), 'lexical' (BM25, sin modelo) o 'hybrid'; el cliente puede enviar "mode"
+SEARCH_MODE = 'dense'
+# Micro-lotes: las preguntas que esperan mientras el modelo codifica el lote anterior
+# (mas las que lleguen en BATCH_WAIT_MS) se codifican y buscan juntas, hasta BATCH_MAX.
+# BATCH_MAX = 1 desactiva el agrupado.
+BATCH_MAX = 32
+BATCH_WAIT_MS = micro_batch.MAX_WAIT_MS
+# Preguntas recientes (normalizadas) cuyos embeddings y resultados se guardan en memoria
+CACHE_ENTRIES = query_cache.MAX_ENTRIES
+# Una pregunta a menos de esta distancia coseno de otra ya buscada reutiliza sus resultados
+SEMANTIC_MAX_DISTANCE = query_cache.SEMANTIC_DISTANCE
 
-if not EMB_PATH.exists() or not META_PATH.exists():
+if not (EMB_PATH.exists() or LEGACY_EMB_PATH.exists()) or not META_PATH.exists():
     raise SystemExit('ERROR: No se encontraron embeddings o metadata. Ejecuta scripts/generate_embeddings.py primero.')
 
 print('Cargando embeddings...')
-emb_data = np.load(str(EMB_PATH))
-EMBEDDINGS = emb_data['embeddings']
+EMBEDDINGS = embedding_store.load_embeddings(EMB_PATH, fallback=LEGACY_EMB_PATH)
 
 print('Cargando metadata...')
 METADATA = []
@@ -34,7 +62,69 @@ with META_PATH.open('r', encoding='utf-8') as f:
 
 print('Cargando modelo...')
 MODEL = SentenceTransformer(MODEL_NAME)
-INDEX = search_engine.build_index(EMBEDDINGS)
+FINGERPRINT = embedding_store.fingerprint(EMB_PATH, MODEL_NAME, fallback=LEGACY_EMB_PATH)
+INDEX = search_engine.load_or_build_index(EMBEDDINGS, INDEX_DIR, FINGERPRINT, INDEX_DTYPE,
+                                          INDEX_KIND, **INDEX_PARAMS)
+CACHE = query_cache.QueryCache(CACHE_ENTRIES, dict(FINGERPRINT, kind=INDEX_KIND, dtype=INDEX_DTYPE,
+                                                   params=INDEX.params, lexical=lexical_index.fingerprint(META_PATH)))
+SEMANTIC = query_cache.SemanticCache(SEMANTIC_MAX_DISTANCE, path=SEMANTIC_CACHE_PATH,
+                                     fingerprint=dict(FINGERPRINT, kind=INDEX_KIND, dtype=INDEX_DTYPE,
+                                                      params=INDEX.params))
+atexit.register(SEMANTIC.save)
+
+
+def encode_and_search(items):
+    # Un lote de (pregunta, top_k): una pasada del modelo (solo para las preguntas sin
+    # embedding en cache) y un search_batch para las que no tienen una pregunta parecida
+    # en la cache semantica.
+    questions = [q for q, _ in items]
+    q_embs = [CACHE.get_embedding(q) for q in questions]
+    missing = [i for i, e in enumerate(q_embs) if e is None]
+    if missing:
+        new = MODEL.encode([questions[i] for i in missing], batch_size=len(missing), convert_to_numpy=True)
+        for i, e in zip(missing, new):
+            CACHE.put_embedding(questions[i], e)
+            q_embs[i] = e
+    results = [SEMANTIC.lookup(e, k) for e, (_, k) in zip(q_embs, items)]
+    pending = [i for i, r in enumerate(results) if r is None]
+    if pending:
+        top_k = max(items[i][1] for i in pending)
+        raw = search_engine.search_batch(INDEX, np.stack([q_embs[i] for i in pending]), top_k=top_k)
+        for i, hits in zip(pending, raw):
+            SEMANTIC.put(q_embs[i], hits, top_k)
+            results[i] = hits[:items[i][1]]
+    return results
+
+
+BATCHER = micro_batch.MicroBatcher(encode_and_search, BATCH_MAX, BATCH_WAIT_MS)
+
+if WARM_QUESTIONS_PATH.exists():
+    # top_k de FUSION_DEPTH: las entradas sirven tambien para el modo 'hybrid'
+    warm = [q.strip() for q in WARM_QUESTIONS_PATH.read_text(encoding='utf-8').splitlines() if q.strip()]
+    added = SEMANTIC.warm(warm, lambda qs: MODEL.encode(qs, convert_to_numpy=True),
+                          lambda embs, k: search_engine.search_batch(INDEX, embs, top_k=k), lexical_index.FUSION_DEPTH)
+    print(f'Cache semantica: {len(SEMANTIC)} preguntas ({added} nuevas de {WARM_QUESTIONS_PATH})')
+
+
+def dense_search(question: str, top_k: int):
+    return BATCHER((question, top_k))
+
+
+# Indice BM25: se carga (o construye) con la primera pregunta 'lexical' o 'hybrid';
+# con SEARCH_MODE = 'dense' y sin clientes que pidan otro modo no ocupa memoria.
+LEXICAL = None
+_LEXICAL_LOCK = threading.Lock()
+
+
+def get_lexical():
+    global LEXICAL
+    if LEXICAL is None:
+        with _LEXICAL_LOCK:
+            if LEXICAL is None:
+                # Sobre la misma metadata que se devuelve, para que los ids coincidan
+                LEXICAL = lexical_index.load_or_build_index(META_PATH, LEXICAL_DIR)
+    return LEXICAL
+
 
 # Página HTML - Chat minimalista (sin controles expuestos)
 HTML = """
@@ -114,37 +204,63 @@ def index():
     return HTML
 
 
-@APP.route('/api/search', methods=['POST'])
-def api_search():
-    """Busca los fragmentos más relevantes usando top_k y threshold fijos.
+def search_payload(data):
+    """Respuesta (JSON, codigo HTTP) de /api/search para el cuerpo ya decodificado.
 
-    No expone top_k ni threshold al cliente (comportamiento ChatGPT-like).
+    La comparten este servidor y app_asgi.py, para que ambos tengan el mismo contrato.
     """
     try:
-        data = request.get_json()
         question = data.get('question', '').strip()
         if not question:
-            return jsonify({'error': 'Pregunta vacía'}), 400
+            return {'error': 'Pregunta vacía'}, 400
+        mode = data.get('mode', SEARCH_MODE)
+        if mode not in lexical_index.MODES:
+            return {'error': f'Modo desconocido: {mode}'}, 400
 
         # Parámetros Ajustados
         top_k = 3
         # CAMBIO CRITICO: Bajamos de 0.60 a 0.40 o 055 para permitir respuestas del PDF
         threshold = 0.55
 
-        q_emb = MODEL.encode([question], convert_to_numpy=True)[0]
-        raw_results = search_engine.search(INDEX, q_emb, top_k=top_k)
+        # Las preguntas repetidas salen de la cache sin pasar por el modelo ni el indice.
+        # El umbral solo filtra en 'dense' (ver lexical_index.retrieve)
+        raw_results, accepted = CACHE.cached(
+            question, lambda: lexical_index.retrieve(mode, question, top_k, get_lexical() if mode != 'dense' else None,
+                                                     dense_search, threshold),
+            mode, top_k, threshold)
 
+        # 'score' (coseno o BM25) o, en modo hybrid, 'rrf' (valor de la fusion)
+        score_key = lexical_index.SCORE_KEYS[mode]
         results = []
-        if raw_results:
-            top_idx, top_score = raw_results[0]
-            if top_score >= threshold:
-                for idx, score in raw_results:
-                    meta = METADATA[idx]
-                    results.append({'text': meta.get('text', ''), 'score': float(score), 'source': meta.get('source', 'desconocida')})
-
-        return jsonify({'results': results}), 200
+        if accepted:
+            for idx, score in raw_results:
+                meta = METADATA[idx]
+                results.append({'text': meta.get('text', ''), score_key: float(score), 'source': meta.get('source', 'desconocida')})
+
+        return {'results': results}, 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return {'error': str(e)}, 500
+
+
+def stats_payload():
+    """Contadores de la cache de consultas y de los micro-lotes."""
+    return {'cache': dict(CACHE.stats(), **SEMANTIC.stats()), 'batches': BATCHER.stats}
+
+
+@APP.route('/api/search', methods=['POST'])
+def api_search():
+    """Busca los fragmentos más relevantes usando top_k y threshold fijos.
+
+    No expone top_k ni threshold al cliente (comportamiento ChatGPT-like).
+    """
+    payload, status = search_payload(request.get_json(silent=True) or {})
+    return jsonify(payload), status
+
+
+@APP.route('/api/stats')
+def api_stats():
+    """Contadores de la cache de consultas y de los micro-lotes."""
+    return jsonify(stats_payload()), 200
 
 
 if __name__ == '__main__':
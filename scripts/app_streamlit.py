@@ -9,23 +9,36 @@ Ejecutar:
 import sys
 from pathlib import Path
 import json
-import numpy as np
 import streamlit as st
-from sentence_transformers import SentenceTransformer
 
 # Asegurar import local de search_engine
 sys.path.insert(0, str(Path(__file__).resolve().parent))
+import embedding_store
+import lexical_index
+import query_cache
 import search_engine
 
 
-@st.cache_data
-def load_embeddings(emb_path: str = 'Data/embeddings.npz'):
-    data = np.load(emb_path)
-    return data['embeddings']
+def data_version(path: str, fallback: str = None) -> int:
+    # Fecha de la ultima escritura (ns) de unos embeddings (cabecera del almacen o .npz) o de
+    # la metadata. Va como argumento de las funciones cacheadas: al regenerar los datos la
+    # clave cambia y se vuelven a cargar (y la huella invalida las caches de consultas).
+    p = Path(path)
+    if not p.exists() and fallback:
+        p = Path(fallback)
+    if embedding_store.is_store(p):
+        p = p / embedding_store.HEADER
+    return p.stat().st_mtime_ns if p.exists() else 0
 
 
-@st.cache_data
-def load_metadata(meta_path: str = 'Data/metadata.jsonl'):
+@st.cache_resource(max_entries=1)
+def load_embeddings(emb_path: str = 'Data/embeddings', version: int = 0):
+    # cache_resource: el memmap se comparte tal cual, sin copiarlo en cada sesion.
+    return embedding_store.load_embeddings(emb_path, fallback='Data/embeddings.npz')
+
+
+@st.cache_data(max_entries=1)
+def load_metadata(meta_path: str = 'Data/metadata.jsonl', version: int = 0):
     meta = []
     with open(meta_path, 'r', encoding='utf-8') as f:
         for line in f:
@@ -33,43 +46,90 @@ def load_metadata(meta_path: str = 'Data/metadata.jsonl'):
     return meta
 
 
+@st.cache_data
+def get_fingerprint(model_name: str, emb_path: str = 'Data/embeddings', version: int = 0):
+    # version (data_version) en la clave: se recalcula cuando se regeneran los embeddings.
+    return embedding_store.fingerprint(emb_path, model_name, fallback='Data/embeddings.npz')
+
+
+@st.cache_resource(max_entries=1)
+def get_index(model_name: str, emb_path: str = 'Data/embeddings', index_dir: str = 'Data/index', version: int = 0):
+    return search_engine.load_or_build_index(load_embeddings(emb_path, version), Path(index_dir),
+                                             get_fingerprint(model_name, emb_path, version))
+
+
+@st.cache_resource
+def get_cache():
+    # Una sola cache para todas las sesiones: las preguntas repetidas no tocan el modelo.
+    return query_cache.QueryCache()
+
+
+@st.cache_resource
+def get_semantic_cache(path: str = 'Data/semantic_cache.npz'):
+    # Preguntas parecidas (no identicas) reutilizan la respuesta sin buscar en el indice.
+    return query_cache.SemanticCache(path=path)
+
+
+@st.cache_resource(max_entries=1)
+def get_lexical(meta_path: str = 'Data/metadata.jsonl', index_dir: str = 'Data/lexical', version: int = 0):
+    return lexical_index.load_or_build_index(Path(meta_path), Path(index_dir))
+
+
 @st.cache_resource
 def get_model(name: str = 'all-MiniLM-L6-v2'):
+    # Import aqui: el modo lexical no necesita sentence-transformers
+    from sentence_transformers import SentenceTransformer
     return SentenceTransformer(name)
 
 
 def main():
     st.title('Buscador del Libro de IA — Chatbot')
-    st.markdown('Carga: `Data/chunks.jsonl`, `Data/embeddings.npz`, `Data/metadata.jsonl`.')
+    st.markdown('Carga: `Data/chunks.jsonl`, `Data/embeddings/`, `Data/metadata.jsonl`.')
 
     with st.sidebar:
         model_name = st.text_input('Modelo embeddings', 'all-MiniLM-L6-v2')
         top_k = st.number_input('Top K', min_value=1, max_value=10, value=3)
         threshold = st.slider('Umbral de similitud', 0.0, 1.0, 0.45)
-
-    embeddings = load_embeddings()
-    meta = load_metadata()
-    model = get_model(model_name)
-    index = search_engine.build_index(embeddings)
+        mode = st.selectbox('Modo de busqueda', lexical_index.MODES)
+
+    emb_version = data_version('Data/embeddings', 'Data/embeddings.npz')
+    meta_version = data_version('Data/metadata.jsonl')
+    meta = load_metadata(version=meta_version)
+    lexical = get_lexical(version=meta_version) if mode != 'dense' else None
+    cache = get_cache()
+    # Cambiar de modelo (o regenerar los embeddings) invalida la cache.
+    cache.validate(get_fingerprint(model_name, version=emb_version))
+
+    def dense(question: str, k: int):
+        # El modelo y el indice denso solo se cargan si el modo los usa.
+        q_emb = cache.embed(question, lambda q: get_model(model_name).encode([q], convert_to_numpy=True)[0])
+        index = get_index(model_name, version=emb_version)
+        semantic = get_semantic_cache()
+        semantic.validate(dict(get_fingerprint(model_name, version=emb_version), kind=index.kind, dtype=index.dtype, params=index.params))
+        results = semantic.lookup(q_emb, k)
+        if results is None:
+            results = search_engine.search(index, q_emb, top_k=k)
+            semantic.put(q_emb, results, k)
+        return results
 
     q = st.text_input('Pregunta:', '')
     if st.button('Buscar') and q.strip():
-        q_emb = model.encode([q], convert_to_numpy=True)[0]
-        results = search_engine.search(index, q_emb, top_k=top_k)
-        if not results:
+        results, accepted = cache.cached(
+            q, lambda: lexical_index.retrieve(mode, q, top_k, lexical, dense, threshold), mode, top_k, threshold)
+        if not accepted:
             st.info('Lo siento, no encontré información relevante sobre eso en el libro.')
         else:
             top_idx, top_score = results[0]
-            if top_score < threshold:
-                st.info('Lo siento, no encontré información relevante sobre eso en el libro.')
-            else:
-                st.success(f'Resultados (top score={top_score:.3f})')
-                for idx, score in results:
-                    item = meta[idx]
-                    st.write('**Fuente:**', item.get('source', 'desconocida'))
-                    st.write('**Similitud:**', f'{score:.3f}')
-                    st.write(item.get('text', '')[:2000])
-                    st.markdown('---')
+            score_key = lexical_index.SCORE_KEYS[mode]
+            st.success(f'Resultados (top {score_key}={top_score:.3f})')
+            for idx, score in results:
+                item = meta[idx]
+                st.write('**Fuente:**', item.get('source', 'desconocida'))
+                st.write('**Puntuacion:**' if score_key == 'score' else '**Puntuacion (rrf):**', f'{score:.3f}')
+                st.write(item.get('text', '')[:2000])
+                st.markdown('---')
+    stats = cache.stats()
+    st.sidebar.caption(f"Cache: {stats['result_hits']} aciertos, {stats['result_misses']} fallos")
 
 
 if __name__ == '__main__':
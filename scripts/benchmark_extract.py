@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# Compara los backends de extraccion de extract_pdf.py: paginas/segundo y
+# diferencias de texto respecto al primero de --backends (por defecto PyPDF2).
+# Uso: python scripts/benchmark_extract.py [--pdf "ruta/archivo.pdf"] [--pages 50]
+
+import argparse
+import difflib
+from pathlib import Path
+import sys
+import time
+
+# Asegurar import local de extract_pdf
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import extract_pdf
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de backends de extraccion de PDF")
+    parser.add_argument("--pdf", default="Data/FUNDAMENTO+DE+LA+IA+volumen+I.pdf", help="PDF de prueba")
+    parser.add_argument("--pages", type=int, default=None, help="Numero de paginas a extraer (por defecto todas)")
+    parser.add_argument("--backends", nargs="*", default=None,
+                        help="Backends a comparar; el primero es la referencia (por defecto todos los instalados)")
+    parser.add_argument("--show-diff", type=int, default=0,
+                        help="Muestra hasta N lineas de diff por backend frente al de referencia")
+    args = parser.parse_args()
+
+    pdf_path = Path(args.pdf)
+    if not pdf_path.exists():
+        print(f"ERROR: no existe el PDF: {pdf_path}")
+        return 2
+
+    names = args.backends or sorted(extract_pdf.BACKENDS)
+    missing = [n for n in names if n not in extract_pdf.BACKENDS]
+    if missing:
+        print(f"ERROR: backends no instalados: {', '.join(missing)}")
+        return 2
+    # El primer backend es la referencia para los diffs: el primero de --backends o,
+    # sin --backends, el backend por defecto.
+    if not args.backends:
+        names = sorted(names, key=lambda n: n != extract_pdf.DEFAULT_BACKEND)
+    reference_name = names[0]
+
+    reference = None
+    print(f"Referencia para similitud y diffs: {reference_name}")
+    print(f"{'backend':<10} {'paginas':>8} {'seg':>8} {'pag/s':>8} {'chars':>9} {'similitud':>10} {'lineas≠':>8}")
+    for name in names:
+        t0 = time.perf_counter()
+        # Sin cache ni pool: se mide el coste real del extractor.
+        pages = extract_pdf.extract_pages(pdf_path, 0, args.pages, workers=1, backend=name)
+        elapsed = time.perf_counter() - t0
+        text = "\n\n".join(p for p in pages if p)
+
+        lines = text.splitlines()
+        if reference is None:
+            reference = lines
+        matcher = difflib.SequenceMatcher(None, reference, lines, autojunk=False)
+        changed = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal')
+        rate = len(pages) / elapsed if elapsed > 0 else float('inf')
+        print(f"{name:<10} {len(pages):>8} {elapsed:>8.2f} {rate:>8.1f} {len(text):>9} {matcher.ratio():>10.3f} {changed:>8}")
+
+        if args.show_diff and lines is not reference:
+            diff = difflib.unified_diff(reference, lines, reference_name, name, lineterm="", n=0)
+            for i, line in enumerate(diff):
+                if i >= args.show_diff:
+                    break
+                print("    " + line)
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# Compara los indices de search_engine.py (tipo de almacenamiento, flat/ivf/ivfpq/hnsw/
+# stream/binary y dimension tras PCA):
+# memoria, tiempo de construccion, milisegundos por consulta (una a una y en lote con
+# search_batch) y recall@k frente a la busqueda exacta en float32.
+# Uso: python scripts/benchmark_index.py [--emb Data/embeddings] [--kinds flat hnsw] [--nprobe 16]
+#
+# Sin --questions, las consultas son vectores del corpus con ruido gaussiano.
+
+import argparse
+import functools
+import itertools
+from pathlib import Path
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+# Asegurar import local de search_engine
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import embedding_store
+import search_engine
+
+
+def make_queries(embeddings: np.ndarray, n: int, noise: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows = np.asarray(embeddings[np.sort(rng.choice(len(embeddings), size=min(n, len(embeddings)), replace=False))],
+                      dtype='float32')
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True) + 1e-12
+    return rows + rng.normal(scale=noise, size=rows.shape).astype('float32')
+
+
+def recall_at_k(results: List, truth: List) -> float:
+    hits = [len({i for i, _ in r} & {i for i, _ in t}) / max(len(t), 1) for r, t in zip(results, truth)]
+    return float(np.mean(hits))
+
+
+def make_index(backend: str, embeddings: np.ndarray, dtype: str, kind: str, params: dict):
+    if kind == 'stream':
+        return search_engine.StreamingIndex(embeddings, dtype)
+    if kind == 'binary':
+        return search_engine.BinaryIndex(embeddings, dtype)
+    if backend == 'faiss':
+        return search_engine.FaissIndexWrapper(embeddings, dtype, kind, **params)
+    if kind == 'flat':
+        return search_engine.NumpyIndex(embeddings, dtype)
+    return search_engine.NumpyIVFIndex(embeddings, dtype, kind, **params)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de indices (memoria, latencia y recall@k)")
+    parser.add_argument("--emb", default="Data/embeddings", help="Almacen de embeddings o embeddings.npz")
+    parser.add_argument("--queries", type=int, default=200, help="Numero de consultas sinteticas")
+    parser.add_argument("--noise", type=float, default=0.05, help="Ruido de las consultas sinteticas")
+    parser.add_argument("--questions", default=None,
+                        help="Archivo con una pregunta por linea (se codifican con --model)")
+    parser.add_argument("--model", default='all-MiniLM-L6-v2', help="Modelo para codificar --questions")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dtypes", nargs="*", default=list(search_engine.DTYPES),
+                        help="Tipos a comparar (float32, float16, int8)")
+    parser.add_argument("--kinds", nargs="*", default=['flat'],
+                        help="Indices a comparar (flat, ivf, ivfpq, hnsw, stream, binary)")
+    parser.add_argument("--backends", nargs="*", default=None, help="numpy y/o faiss (por defecto los instalados)")
+    parser.add_argument("--nlist", type=int, default=None, help="Listas IVF (por defecto 4*sqrt(n))")
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[search_engine.QUERY_PARAMS['nprobe']],
+                        help="Listas IVF visitadas por consulta (se prueban todos los valores)")
+    parser.add_argument("--ef-search", type=int, nargs="*", default=[search_engine.QUERY_PARAMS['ef_search']],
+                        help="Amplitud de busqueda HNSW (se prueban todos los valores)")
+    parser.add_argument("--shards", type=int, nargs="*", default=[1],
+                        help="Numero de shards buscados en paralelo (se prueban todos los valores)")
+    parser.add_argument("--block-rows", type=int, nargs="*", default=[search_engine.QUERY_PARAMS['block_rows']],
+                        help="Filas por bloque en 'stream' (se prueban todos los valores)")
+    parser.add_argument("--readahead", type=int, default=search_engine.QUERY_PARAMS['readahead'],
+                        help="Bloques leidos por adelantado en 'stream'")
+    parser.add_argument("--rerank", type=int, nargs="*", default=[search_engine.QUERY_PARAMS['rerank']],
+                        help="Candidatos recalculados exactos en 'binary' (se prueban todos los valores)")
+    parser.add_argument("--pca-dims", type=int, nargs="*", default=[0],
+                        help="Dimensiones tras PCA (0: sin reducir; se prueban todos los valores)")
+    parser.add_argument("--pq-m", type=int, default=None, help="Subcuantizadores de IVF-PQ")
+    args = parser.parse_args()
+
+    emb_path = Path(args.emb)
+    if not emb_path.exists():
+        print(f"ERROR: no existen embeddings en {emb_path}")
+        return 2
+    unknown = [d for d in args.dtypes if d not in search_engine.DTYPES]
+    unknown += [k for k in args.kinds if k not in search_engine.KINDS]
+    if unknown:
+        print(f"ERROR: tipos desconocidos: {', '.join(unknown)}")
+        return 2
+    embeddings = embedding_store.load_embeddings(emb_path)
+
+    if args.questions:
+        from sentence_transformers import SentenceTransformer
+        questions = [q.strip() for q in Path(args.questions).read_text(encoding='utf-8').splitlines() if q.strip()]
+        queries = SentenceTransformer(args.model).encode(questions, convert_to_numpy=True).astype('float32')
+    else:
+        queries = make_queries(embeddings, args.queries, args.noise)
+
+    # Referencia: busqueda exacta float32 recorriendo el almacen (no necesita la matriz en RAM).
+    truth = search_engine.StreamingIndex(embeddings).search_batch(queries, args.top_k)
+    baseline = len(embeddings) * embeddings.shape[1] * 4
+
+    backends = ['numpy'] + (['faiss'] if search_engine._HAS_FAISS else [])
+    names = args.backends or backends
+    if any(b not in backends for b in names):
+        print(f"ERROR: backends disponibles: {', '.join(backends)}")
+        return 2
+
+    print(f"{len(embeddings)} vectores x {embeddings.shape[1]} dims, {len(queries)} consultas, top-k {args.top_k}")
+    print(f"{'backend':<8} {'indice':<7} {'tipo':<8} {'dims':>5} {'shards':>6} {'consulta':<12} {'MB':>8} {'ahorro':>7} "
+          f"{'build s':>8} {'ms/consulta':>12} {'ms/q lote':>10} {'recall@k':>9}")
+    for backend in names:
+        for kind in args.kinds:
+            for dtype, pca_dim, shards in itertools.product(args.dtypes, args.pca_dims, args.shards):
+                if kind == 'ivfpq' and dtype != 'float32':
+                    continue
+                if kind in ('stream', 'binary') and (dtype != 'float32' or backend != 'numpy'):
+                    continue
+                if pca_dim and (kind == 'stream' or not 0 < pca_dim < embeddings.shape[1]):
+                    continue
+                params = {'nlist': args.nlist, 'pq_m': args.pq_m}
+                t0 = time.perf_counter()
+                factory = functools.partial(make_index, backend, dtype=dtype, kind=kind, params=params)
+                if shards > 1:
+                    factory = functools.partial(search_engine.ShardedIndex, shards=shards, dtype=dtype, kind=kind,
+                                                factory=factory)
+                if pca_dim:
+                    index = search_engine.PCAIndex(embeddings, pca_dim, dtype, kind, factory=factory)
+                else:
+                    index = factory(embeddings)
+                build = time.perf_counter() - t0
+
+                # Parametros de consulta: se recorren sin reconstruir el indice.
+                if kind in ('ivf', 'ivfpq') or (kind == 'hnsw' and backend == 'numpy'):
+                    settings = [{'nprobe': n} for n in args.nprobe]
+                elif kind == 'hnsw':
+                    settings = [{'ef_search': e} for e in args.ef_search]
+                elif kind == 'stream':
+                    settings = [{'block_rows': b, 'readahead': args.readahead} for b in args.block_rows]
+                elif kind == 'binary':
+                    settings = [{'rerank': r} for r in args.rerank]
+                else:
+                    settings = [{}]
+                for setting in settings:
+                    index.set_params(**setting)
+                    mem = index.memory_bytes()
+                    t0 = time.perf_counter()
+                    results = [index.search(q, args.top_k) for q in queries]
+                    elapsed = time.perf_counter() - t0
+                    # Las mismas consultas en una sola llamada (producto matriz-matriz).
+                    t0 = time.perf_counter()
+                    index.search_batch(queries, args.top_k)
+                    batched = time.perf_counter() - t0
+                    label = ','.join(f'{k}={v}' for k, v in setting.items()) or '-'
+                    dims = pca_dim or embeddings.shape[1]
+                    print(f"{backend:<8} {kind:<7} {dtype:<8} {dims:>5} {shards:>6} {label:<12} {mem / 1e6:>8.2f} {1 - mem / baseline:>7.0%} "
+                          f"{build:>8.2f} {1000 * elapsed / len(queries):>12.3f} {1000 * batched / len(queries):>10.3f} "
+                          f"{recall_at_k(results, truth):>9.3f}")
+                    if pca_dim and setting is settings[-1]:
+                        print(f"{'':<8} PCA {pca_dim} dims conserva el {index.energy:.1%} de la energia")
+                    if kind == 'stream' and shards == 1:
+                        # Ritmo de lectura de la ultima busqueda en lote
+                        print(f"{'':<8} leidos {index.last_stats['bytes'] / 1e9:.2f} GB a "
+                              f"{index.last_stats['gbps']:.2f} GB/s")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Prueba de carga de /api/search: N clientes concurrentes lanzan preguntas sin pausa y se
+# mide el rendimiento (peticiones/s) y la latencia p50/p99 de cada nivel de concurrencia.
+# Uso: python scripts/benchmark_server.py [--url http://127.0.0.1:5000/api/search] [--concurrency 1 8 32]
+#
+# Sin --questions se usan unas preguntas de ejemplo sobre el libro.
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+from pathlib import Path
+import threading
+import time
+from typing import List, Tuple
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+QUESTIONS = [
+    '¿Qué es la inteligencia artificial?',
+    '¿Quién propuso la prueba de Turing?',
+    '¿Qué es un perceptrón?',
+    '¿Para qué sirven los algoritmos genéticos?',
+    '¿Qué es el aprendizaje supervisado?',
+    '¿Qué es un sistema experto?',
+    '¿Cómo funciona una red neuronal?',
+    '¿Qué es la lógica difusa?',
+]
+
+
+def post(url: str, question: str, mode: str, timeout: float) -> Tuple[int, float]:
+    # (codigo HTTP, segundos); 0 si no hubo respuesta.
+    body = {'question': question}
+    if mode:
+        body['mode'] = mode
+    req = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'),
+                                 headers={'Content-Type': 'application/json'})
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - t0
+
+
+def run_level(url: str, questions: List[str], concurrency: int, requests: int, mode: str, timeout: float):
+    counter = itertools.count()
+    lock = threading.Lock()
+    results: List[Tuple[int, float]] = []
+
+    def client():
+        while True:
+            i = next(counter)
+            if i >= requests:
+                return
+            r = post(url, questions[i % len(questions)], mode, timeout)
+            with lock:
+                results.append(r)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    return results, time.perf_counter() - t0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Prueba de carga del endpoint /api/search')
+    parser.add_argument('--url', default='http://127.0.0.1:5000/api/search')
+    parser.add_argument('--questions', default=None, help='Archivo con una pregunta por linea')
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 8, 32],
+                        help='Clientes simultaneos (se prueban todos los valores)')
+    parser.add_argument('--requests', type=int, default=200, help='Peticiones por nivel de concurrencia')
+    parser.add_argument('--mode', default=None, help='Modo de busqueda enviado al servidor (dense, lexical, hybrid)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Timeout por peticion (segundos)')
+    args = parser.parse_args()
+
+    questions = QUESTIONS
+    if args.questions:
+        path = Path(args.questions)
+        if not path.exists():
+            print(f'ERROR: no existe {path}')
+            return 2
+        questions = [q.strip() for q in path.read_text(encoding='utf-8').splitlines() if q.strip()]
+    status, _ = post(args.url, questions[0], args.mode, args.timeout)
+    if status != 200:
+        print(f'ERROR: {args.url} no responde correctamente (HTTP {status})')
+        return 2
+
+    print(f"{'clientes':>8} {'peticiones':>10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errores':>8}")
+    for concurrency in args.concurrency:
+        results, elapsed = run_level(args.url, questions, concurrency, args.requests, args.mode, args.timeout)
+        ok = np.array([t for s, t in results if s == 200]) * 1000
+        errors = len(results) - len(ok)
+        p50, p99, worst = np.percentile(ok, [50, 99, 100]) if len(ok) else (float('nan'),) * 3
+        print(f'{concurrency:>8} {len(results):>10} {len(ok) / elapsed:>8.1f} {p50:>8.1f} {p99:>8.1f} '
+              f'{worst:>8.1f} {errors:>8}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -5,65 +5,135 @@
 import argparse
 import json
 from pathlib import Path
-import numpy as np
 import sys
 
-from sentence_transformers import SentenceTransformer
-
 # Asegurar que el directorio scripts/ este en sys.path
 sys.path.insert(0, str(Path(__file__).resolve().parent))
+import embedding_store
+import lexical_index
+import query_cache
 import search_engine
 
 
 def load_metadata(path: Path):
     # Carga metadatos desde archivo JSONL.
+    meta = []
+    with path.open('r', encoding='utf-8') as f:
+        for line in f:
+            meta.append(json.loads(line))
+    return meta
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--ask', type=str, help='Pregunta para responder (modo no interactivo)')
-    parser.add_argument('--emb', type=str, default='Data/embeddings.npz', help='Ruta embeddings .npz')
+    parser.add_argument('--emb', type=str, default='Data/embeddings',
+                        help='Almacen de embeddings (directorio) o embeddings.npz antiguo')
     parser.add_argument('--meta', type=str, default='Data/metadata.jsonl', help='Ruta metadata jsonl')
     parser.add_argument('--model', type=str, default='all-MiniLM-L6-v2')
     parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--index-dtype', choices=search_engine.DTYPES, default='float32',
+                        help='Almacenamiento del indice (float16/int8 ocupan menos y se reordenan exacto)')
+    parser.add_argument('--index-type', choices=search_engine.KINDS, default='flat',
+                        help='flat (exacto) o aproximado: ivf, ivfpq, hnsw, binary; stream recorre el almacen')
+    parser.add_argument('--nprobe', type=int, default=None, help='Listas IVF visitadas por consulta')
+    parser.add_argument('--ef-search', type=int, default=None, help='Amplitud de busqueda HNSW')
+    parser.add_argument('--rerank', type=int, default=None,
+                        help='Candidatos del prefiltro binario que se recalculan exactos')
+    parser.add_argument('--shards', type=int, default=None,
+                        help='Reparte el indice en N shards buscados en paralelo (hilos)')
+    parser.add_argument('--pca-dim', type=int, default=None, help='Dimension del indice reducido con PCA')
+    parser.add_argument('--index-dir', type=str, default='Data/index',
+                        help='Indice persistido (se reconstruye si no coincide con los embeddings)')
     parser.add_argument('--threshold', type=float, default=0.60, help='Umbral de similitud para aceptar respuesta')
+    parser.add_argument('--mode', choices=lexical_index.MODES, default='dense',
+                        help='dense (embeddings), lexical (BM25, sin modelo) o hybrid (fusion de ambos)')
+    parser.add_argument('--lexical-dir', type=str, default='Data/lexical',
+                        help='Indice BM25 persistido (se reconstruye si cambia la metadata)')
+    parser.add_argument('--semantic-cache', type=str, default='Data/semantic_cache.npz',
+                        help="Cache semantica de respuestas en disco ('' para no guardarla)")
+    parser.add_argument('--semantic-distance', type=float, default=query_cache.SEMANTIC_DISTANCE,
+                        help='Distancia coseno maxima para reutilizar la respuesta de una pregunta parecida')
+    parser.add_argument('--warm', type=str, default=None,
+                        help='Archivo con preguntas (una por linea) para precalentar la cache semantica')
     args = parser.parse_args()
 
     emb_path = Path(args.emb)
     meta_path = Path(args.meta)
-    if not emb_path.exists() or not meta_path.exists():
+    if not emb_path.exists() and emb_path == Path('Data/embeddings'):
+        emb_path = Path('Data/embeddings.npz')
+    if (args.mode != 'lexical' and not emb_path.exists()) or not meta_path.exists():
         print('ERROR: embeddings o metadata no encontrados. Ejecute scripts/generate_embeddings.py primero.')
         return 2
 
-    data = np.load(str(emb_path))
-    embeddings = data['embeddings']
-    model = SentenceTransformer(args.model)
     meta = load_metadata(meta_path)
-
-    index = search_engine.build_index(embeddings)
+    # Las preguntas repetidas en la sesion se responden desde la cache.
+    cache = query_cache.QueryCache()
+    cache_fingerprint = {'mode': args.mode, 'lexical': lexical_index.fingerprint(meta_path)}
+    # El indice lexico se construye sobre los mismos chunks que se muestran (metadata).
+    lexical = None
+    if args.mode != 'dense':
+        lexical = lexical_index.load_or_build_index(meta_path, Path(args.lexical_dir))
+
+    dense = None
+    if args.mode != 'lexical':
+        # Solo los modos dense/hybrid necesitan sentence-transformers
+        from sentence_transformers import SentenceTransformer
+        embeddings = embedding_store.load_embeddings(emb_path)
+        model = SentenceTransformer(args.model)
+        fingerprint = embedding_store.fingerprint(emb_path, args.model)
+        try:
+            index = search_engine.load_or_build_index(embeddings, Path(args.index_dir), fingerprint,
+                                                      args.index_dtype, args.index_type, nprobe=args.nprobe,
+                                                      ef_search=args.ef_search, rerank=args.rerank,
+                                                      shards=args.shards, pca_dim=args.pca_dim)
+        except ValueError as e:
+            print(f'ERROR: {e}')
+            return 2
+        index_fingerprint = dict(fingerprint, kind=args.index_type, dtype=args.index_dtype, params=index.params)
+        cache_fingerprint.update(index_fingerprint)
+        semantic = query_cache.SemanticCache(args.semantic_distance, path=args.semantic_cache or None,
+                                             fingerprint=index_fingerprint)
+        if args.warm:
+            warm = [q.strip() for q in Path(args.warm).read_text(encoding='utf-8').splitlines() if q.strip()]
+            added = semantic.warm(warm, lambda qs: model.encode(qs, convert_to_numpy=True),
+                                  lambda embs, k: search_engine.search_batch(index, embs, top_k=k),
+                                  max(args.top_k, lexical_index.FUSION_DEPTH))
+            print(f'Cache semantica: {len(semantic)} preguntas ({added} nuevas)')
+
+        def dense(query: str, k: int):
+            q_emb = cache.embed(query, lambda q: model.encode([q], convert_to_numpy=True)[0])
+            # Una pregunta parecida ya buscada evita la busqueda en el indice.
+            results = semantic.lookup(q_emb, k)
+            if results is None:
+                results = search_engine.search(index, q_emb, top_k=k)
+                semantic.put(q_emb, results, k)
+            return results
+
+    cache.validate(cache_fingerprint)
 
     def answer(query: str):
-        q_emb = model.encode([query], convert_to_numpy=True)[0]
-        results = search_engine.search(index, q_emb, top_k=args.top_k)
+        results, accepted = cache.cached(
+            query, lambda: lexical_index.retrieve(args.mode, query, args.top_k, lexical, dense, args.threshold))
         # results: list of (idx, score)
-        if not results:
+        if not accepted:
             print('Lo siento, no encontré información relevante sobre eso en el libro.')
             return
         top_idx, top_score = results[0]
-        if top_score < args.threshold:
-            print('Lo siento, no encontré información relevante sobre eso en el libro.')
-            return
+        score_key = lexical_index.SCORE_KEYS[args.mode]
 
-        print(f'--- Respuesta (similaridad {top_score:.3f}) ---')
+        print(f'--- Respuesta ({args.mode}, {score_key} {top_score:.3f}) ---')
         for idx, score in results:
             item = meta[idx]
             print('\nFuente:', item.get('source', 'desconocida'))
             print('--- Fragmento ---')
             print(item.get('text', '')[:1500])
-            print('--- End Fragmento (score:', f'{score:.3f})')
+            print(f'--- End Fragmento ({score_key}: {score:.3f})')
 
     if args.ask:
         answer(args.ask)
+        if dense is not None:
+            semantic.save()
         return 0
 
     # interactive
@@ -80,6 +150,11 @@ def main():
             break
         answer(q)
 
+    stats = cache.stats()
+    print(f"Cache: {stats['result_hits']} preguntas repetidas de {stats['result_hits'] + stats['result_misses']}")
+    if dense is not None:
+        print(f'Cache semantica: {semantic.hits} respuestas reutilizadas')
+        semantic.save()
     return 0
 
 
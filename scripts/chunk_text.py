@@ -1,63 +1,262 @@
 #!/usr/bin/env python3
 # Divide un texto en fragmentos (chunks) coherentes para busqueda semantica.
 # Genera archivo JSONL con id, texto y fuente de cada chunk.
+# El texto se lee por bloques de parrafos, se segmenta en oraciones en paralelo
+# y los chunks se escriben a medida que se generan (memoria acotada).
 
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import json
+import os
 import sys
 import warnings
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, Iterable, Iterator, List
 
 import nltk
 
-def chunk_text(text: str, max_chars: int = 1000, overlap: int = 200) -> List[str]:
+# Tamaño aproximado de los bloques de texto que se segmentan en cada worker.
+BLOCK_CHARS = 64 * 1024
+
+
+def _sent_tokenize(text: str) -> List[str]:
     try:
-        sentences = nltk.sent_tokenize(text)
+        return nltk.sent_tokenize(text)
     except LookupError:
         print("Descargando tokenizadores 'punkt' y 'punkt_tab' de NLTK...")
         nltk.download(['punkt', 'punkt_tab'])
-        sentences = nltk.sent_tokenize(text)
- 
-    if not sentences:
-        return []
+        return nltk.sent_tokenize(text)
+
+
+def iter_text_blocks(text_or_path, block_chars: int = BLOCK_CHARS) -> Iterator[str]:
+    # Trocea el texto (str o ruta a un archivo) en bloques de ~block_chars cortados tras
+    # un salto de parrafo. Los bloques concatenados reproducen el texto exacto.
+    if isinstance(text_or_path, str):
+        chunks: Iterable[str] = (text_or_path[i:i + block_chars] for i in range(0, len(text_or_path), block_chars))
+        f = None
+    else:
+        f = Path(text_or_path).open('r', encoding='utf-8')
+        chunks = iter(lambda: f.read(block_chars), '')
+    try:
+        buffer = ''
+        for data in chunks:
+            buffer += data
+            if len(buffer) < block_chars:
+                continue
+            cut = buffer.rfind('\n\n')
+            if cut > 0:
+                yield buffer[:cut + 2]
+                buffer = buffer[cut + 2:]
+        if buffer:
+            yield buffer
+    finally:
+        if f is not None:
+            f.close()
+
+
+def _bounded_map(ex: ProcessPoolExecutor, fn, items: Iterable, ahead: int) -> Iterator:
+    # Como ex.map, pero sin consumir toda la entrada: como mucho `ahead` tareas en vuelo.
+    pending = deque()
+    for item in items:
+        pending.append((item, ex.submit(fn, item)))
+        if len(pending) >= ahead:
+            item, fut = pending.popleft()
+            yield item, fut.result()
+    while pending:
+        item, fut = pending.popleft()
+        yield item, fut.result()
+
+
+def _offsets(block: str, sentences: List[str]) -> List[int]:
+    # Posicion de cada oracion dentro del bloque (Punkt devuelve subcadenas en orden).
+    pos = 0
+    starts = []
+    for s in sentences:
+        pos = block.find(s, pos)
+        starts.append(pos)
+        pos += len(s)
+    return starts
+
+
+def iter_sentences(blocks: Iterable[str], workers: int = 1) -> Iterator[str]:
+    # Segmenta en oraciones una secuencia de bloques consecutivos del texto.
+    # Punkt decide cada corte mirando solo el texto vecino, asi que cada bloque se
+    # segmenta por separado (en paralelo con workers > 1) y solo se revisa la union:
+    # las ultimas oraciones de un bloque y las primeras del siguiente se vuelven a
+    # segmentar juntas con el texto original entre ellas, y esa segmentacion prevalece.
+    # El resultado es el mismo que nltk.sent_tokenize sobre el texto completo.
+    if workers > 1:
+        _sent_tokenize('')  # descarga 'punkt' una sola vez, antes de crear el pool
+        ex = ProcessPoolExecutor(max_workers=workers)
+        results = _bounded_map(ex, _sent_tokenize, blocks, workers * 2)
+    else:
+        ex = None
+        results = ((block, _sent_tokenize(block)) for block in blocks)
+
+    try:
+        # Las dos ultimas oraciones quedan pendientes: Punkt puede mirar hasta la oracion
+        # siguiente para decidir un corte, asi que solo se confirman con contexto a la derecha.
+        pending: List[str] = []
+        carry = ''  # texto original desde el inicio de `pending` hasta el final de lo leido
+        for block, sentences in results:
+            if not sentences:
+                carry += block
+                continue
+            if carry and not pending:
+                # Bloques anteriores sin oraciones (solo espacios): su texto va al inicio
+                # de la primera oracion, como al segmentar el texto completo.
+                block = carry + block
+                sentences = _sent_tokenize(block)
+            starts = _offsets(block, sentences)
+            if pending:
+                # Se amplia la ventana oracion a oracion hasta que Punkt, con el contexto
+                # de ambos lados, corte las dos ultimas oraciones igual que el bloque solo.
+                for k in range(1, len(sentences)):
+                    window = carry + block[:starts[k] + len(sentences[k])]
+                    joined = _sent_tokenize(window)
+                    if joined[-2:] == sentences[k - 1:k + 1]:
+                        yield from joined[:-2]
+                        sentences, starts = sentences[k - 1:], starts[k - 1:]
+                        break
+                else:
+                    # Sin acuerdo: todo el bloque se segmenta junto con lo pendiente.
+                    window = carry + block
+                    sentences = _sent_tokenize(window)
+                    starts = _offsets(window, sentences)
+                    block = window
+            yield from sentences[:-2]
+            pending = sentences[-2:]
+            carry = block[starts[-len(pending)]:]
+        yield from pending
+    finally:
+        if ex is not None:
+            ex.shutdown()
+
 
-    chunks: List[str] = []
+def iter_chunks(sentences: Iterable[str], max_chars: int = 1000, overlap: int = 200,
+                length: Callable[[str], int] = len, join_cost: int = 1, hard_limit: bool = False) -> Iterator[str]:
+    # Agrupa oraciones en chunks de hasta max_chars unidades con solapamiento.
+    # Por defecto mide caracteres (cada union suma 1 por el espacio); con length y
+    # join_cost se puede medir en tokens (ver iter_token_chunks).
+    # Con hard_limit el solapamiento se recorta si con la nueva oración no cabe.
+    # La longitud del chunk en curso se lleva de forma incremental (coste lineal).
     current_chunk_sentences: List[str] = []
+    current_lens: List[int] = []
+    current_len = 0  # == length(" ".join(current_chunk_sentences))
 
     for sentence in sentences:
+        sentence_len = length(sentence)
         # Si una oración es más larga que el tamaño máximo, trátala como un chunk propio.
-        if len(sentence) > max_chars:
-            warnings.warn(f"Una oración de {len(sentence)} caracteres excede el máximo de {max_chars} y será un chunk individual.")
+        if sentence_len > max_chars:
+            warnings.warn(f"Una oración de {sentence_len} unidades excede el máximo de {max_chars} y será un chunk individual.")
             # Si había un chunk en proceso, guárdalo primero.
             if current_chunk_sentences:
-                chunks.append(" ".join(current_chunk_sentences))
-            chunks.append(sentence)
-            current_chunk_sentences = []
+                yield " ".join(current_chunk_sentences)
+            yield sentence
+            current_chunk_sentences, current_lens = [], []
+            current_len = 0
             continue
 
         # Si agregar la nueva oración excede el tamaño máximo, finaliza el chunk actual.
-        if len(" ".join(current_chunk_sentences + [sentence])) > max_chars:
-            chunks.append(" ".join(current_chunk_sentences))
+        new_len = current_len + (join_cost if current_chunk_sentences else 0) + sentence_len
+        if new_len > max_chars:
+            yield " ".join(current_chunk_sentences)
 
             # Inicia el siguiente chunk con solapamiento.
-            overlap_sentences: List[str] = []
+            keep = 0
             current_overlap_len = 0
             # Retrocede desde el final del chunk recién creado para construir el solapamiento.
-            for s in reversed(current_chunk_sentences):
-                if current_overlap_len + len(s) > overlap:
+            for s_len in reversed(current_lens):
+                if current_overlap_len + s_len > overlap:
                     break
-                overlap_sentences.insert(0, s)
-                current_overlap_len += len(s) + 1 # +1 por el espacio
-            
-            current_chunk_sentences = overlap_sentences
- 
+                keep += 1
+                current_overlap_len += s_len + join_cost  # + el espacio
+            if hard_limit:
+                while keep and sum(current_lens[-keep:]) + join_cost * keep + sentence_len > max_chars:
+                    keep -= 1
+            current_chunk_sentences = current_chunk_sentences[len(current_lens) - keep:]
+            current_lens = current_lens[len(current_lens) - keep:]
+            current_len = sum(current_lens) + join_cost * max(keep - 1, 0)
+            new_len = current_len + (join_cost if current_chunk_sentences else 0) + sentence_len
+
         current_chunk_sentences.append(sentence)
+        current_lens.append(sentence_len)
+        current_len = new_len
 
     if current_chunk_sentences:
-        chunks.append(" ".join(current_chunk_sentences))
+        yield " ".join(current_chunk_sentences)
+
+
+def chunk_text(text: str, max_chars: int = 1000, overlap: int = 200, workers: int = 1) -> List[str]:
+    return list(iter_chunks(iter_sentences(iter_text_blocks(text), workers), max_chars, overlap))
+
+
+def _split_long_sentence(sentence: str, tokenizer, max_tokens: int) -> Iterator[str]:
+    # Parte una oración que no cabe en el presupuesto en trozos de palabras completas.
+    # Sin esto la cola de la oración se truncaria y nunca seria buscable.
+    piece: List[str] = []
+    piece_tokens = 0
+    for word in sentence.split():
+        n = len(tokenizer.tokenize(word))
+        if piece and piece_tokens + n > max_tokens:
+            yield " ".join(piece)
+            piece, piece_tokens = [], 0
+        piece.append(word)
+        piece_tokens += n
+    if piece:
+        yield " ".join(piece)
+
+
+def iter_token_chunks(sentences: Iterable[str], tokenizer, max_tokens: int, overlap: int = 50) -> Iterator[str]:
+    # Igual que iter_chunks pero midiendo con el tokenizer del modelo: cada chunk cabe
+    # en max_tokens (sin contar [CLS]/[SEP]). El tokenizer separa por espacios antes
+    # de trocear en subpalabras, asi que unir oraciones con un espacio no añade tokens.
+    cache: Dict[str, int] = {}
 
-    return chunks
+    def length(sentence: str) -> int:
+        # Cada oración se mide dos veces (al filtrar y al agrupar): se recuerda un rato.
+        n = cache.get(sentence)
+        if n is None:
+            if len(cache) > 4096:
+                cache.clear()
+            n = cache[sentence] = len(tokenizer.tokenize(sentence))
+        return n
+
+    def fitted() -> Iterator[str]:
+        for sentence in sentences:
+            if length(sentence) > max_tokens:
+                yield from _split_long_sentence(sentence, tokenizer, max_tokens)
+            else:
+                yield sentence
+
+    return iter_chunks(fitted(), max_tokens, overlap, length=length, join_cost=0, hard_limit=True)
+
+
+def truncation_report(chunks: Iterable[str], tokenizer, max_seq_length: int) -> Dict[str, float]:
+    # Cuantos tokens se pierden por chunk al truncar a max_seq_length (incluye [CLS]/[SEP]).
+    total = truncated = truncated_chunks = n = 0
+    for chunk in chunks:
+        tokens = len(tokenizer.tokenize(chunk)) + 2
+        lost = max(tokens - max_seq_length, 0)
+        n += 1
+        total += tokens
+        truncated += lost
+        truncated_chunks += lost > 0
+    return {
+        'chunks': n,
+        'tokens': total,
+        'truncated_tokens': truncated,
+        'truncated_chunks': truncated_chunks,
+        'truncated_pct': 100.0 * truncated / total if total else 0.0,
+        'avg_truncated_per_chunk': truncated / n if n else 0.0,
+    }
+
+
+def _print_report(label: str, r: Dict[str, float]) -> None:
+    print(f"{label:<8} chunks={r['chunks']} tokens={r['tokens']} "
+          f"truncados={r['truncated_tokens']} ({r['truncated_pct']:.1f}%) "
+          f"chunks_truncados={r['truncated_chunks']} media_por_chunk={r['avg_truncated_per_chunk']:.1f}")
 
 
 def main() -> int:
@@ -66,6 +265,14 @@ def main() -> int:
     parser.add_argument("--out", required=False, help="Salida JSONL (opcional)")
     parser.add_argument("--max-chars", type=int, default=1000, help="Tamaño máximo por chunk en caracteres")
     parser.add_argument("--overlap", type=int, default=200, help="Solapamiento entre chunks (caracteres)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Procesos para segmentar oraciones en paralelo (1 = secuencial)")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="Agrupa por tokens del modelo en vez de caracteres (0 = max_seq_length del modelo)")
+    parser.add_argument("--overlap-tokens", type=int, default=50, help="Solapamiento en tokens (con --max-tokens)")
+    parser.add_argument("--model", default='all-MiniLM-L6-v2', help="Modelo cuyo tokenizer mide los chunks")
+    parser.add_argument("--token-report", action="store_true",
+                        help="Informa de los tokens truncados por chunk con --max-chars (antes) y --max-tokens (despues)")
     args = parser.parse_args()
 
     input_path = Path(args.input)
@@ -73,20 +280,44 @@ def main() -> int:
         print(f"ERROR: no existe el archivo de entrada: {input_path}")
         return 2
 
-    text = input_path.read_text(encoding='utf-8')
-    chunks = chunk_text(text, args.max_chars, args.overlap)
+    sentences = iter_sentences(iter_text_blocks(input_path), args.workers)
+    tokenizer = None
+    if args.max_tokens is not None or args.token_report:
+        # Solo el tokenizer (sin los pesos del modelo); el mismo que usa generate_embeddings.py
+        from generate_embeddings import load_tokenizer
+        tokenizer, max_seq_length = load_tokenizer(args.model)
+    if args.token_report:
+        # El informe recorre las oraciones dos veces: se guardan en memoria.
+        sentences = list(sentences)
+    if args.max_tokens is not None:
+        # [CLS] y [SEP] ocupan 2 posiciones de la secuencia del modelo.
+        max_tokens = args.max_tokens or max_seq_length - 2
+        chunks = iter_token_chunks(sentences, tokenizer, max_tokens, args.overlap_tokens)
+    else:
+        chunks = iter_chunks(sentences, args.max_chars, args.overlap)
 
     out_path = Path(args.out) if args.out else input_path.parent / 'chunks.jsonl'
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
     source_name = input_path.stem
+    count = 0
     with out_path.open('w', encoding='utf-8') as f:
         for i, c in enumerate(chunks):
             obj = {"id": i, "text": c, "source": source_name}
             f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            count += 1
+
+    print(f"Chunks generados: {count} -> {out_path}")
 
-    print(f"Chunks generados: {len(chunks)} -> {out_path}")
+    if args.token_report:
+        print(f"Tokens truncados a max_seq_length={max_seq_length} de {args.model}:")
+        _print_report('antes', truncation_report(iter_chunks(sentences, args.max_chars, args.overlap),
+                                                 tokenizer, max_seq_length))
+        if args.max_tokens is not None:
+            _print_report('despues', truncation_report(
+                iter_token_chunks(sentences, tokenizer, max_tokens, args.overlap_tokens), tokenizer, max_seq_length))
     return 0
 
 
 if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,144 +1,348 @@
 #!/usr/bin/env python3
 # Limpia el texto extraído eliminando ISBN, títulos repetidos,
 # encabezados, números de página y espacios en blanco excesivos.
+# Las reglas se cargan por corpus desde cleaning_rules/*.json y se compilan una
+# sola vez; clean_pages() limpia por bloques (paginas) con memoria acotada.
 
-import re
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import json
+import os
 from pathlib import Path
+import re
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Match, Optional, Pattern, Tuple, Union
+
+# Conjuntos de reglas por corpus (JSON). El predeterminado reproduce la limpieza
+# específica del libro incluido en Data/; generic.json sirve para otros libros.
+RULES_DIR = Path(__file__).resolve().parent / 'cleaning_rules'
+DEFAULT_RULES = RULES_DIR / 'fundamentos_ia.json'
+
+# Tamaño (caracteres) a partir del cual clean_pages intenta cerrar el bloque pendiente
+BLOCK_CHARS = 1 << 16
+
+Rule = Tuple[str, Pattern, Union[str, Callable[[Match], str]]]
+Timings = Dict[str, float]
+
+
+def _fuse(name: str, rules: List[Rule]) -> Rule:
+    # Une varias reglas en una sola alternativa (una pasada sobre el texto). Cada
+    # alternativa termina en un grupo vacio que marca que regla ha coincidido; la
+    # funcion de reemplazo aplica el repl de esa regla con sus referencias renumeradas.
+    # Sin grupos al inicio ni banderas locales, re conserva la busqueda por prefijo.
+    flags = {pattern.flags for _, pattern, _ in rules}
+    if len(flags) > 1:
+        raise ValueError(f'las reglas del grupo {name} deben tener las mismas banderas')
+    parts = []
+    dispatch = {}
+    index = 1
+    for _, pattern, repl in rules:
+        parts.append(f'(?:{pattern.pattern}())')
+        if '\\' in repl:
+            repl = re.sub(r'\\(?:(\d+)|g<(\d+)>)', lambda m, i=index: f'\\g<{int(m[1] or m[2]) + i - 1}>', repl)
+        index += pattern.groups + 1
+        dispatch[index - 1] = repl
+    combined = re.compile('|'.join(parts), flags.pop())
+
+    def replace(m: Match) -> str:
+        repl = dispatch[m.lastindex]
+        return m.expand(repl) if '\\' in repl else repl
+
+    return name, combined, replace
+
+
+def _compile_rules(entries: List[dict]) -> List[Rule]:
+    # Las reglas consecutivas con el mismo "group" se aplican en una sola pasada. Solo
+    # vale para reglas independientes: ninguna debe crear ni solapar coincidencias de
+    # otra del grupo, porque en una pasada no ven el texto que dejan las anteriores.
+    # Con re solo compensa si comparten prefijo (p. ej. las dos de ISBN): alternativas
+    # con distinto inicio se prueban en cada posicion y tardan mas que pasadas separadas.
+    rules = []
+    groups: List[Tuple[Optional[str], List[Rule]]] = []
+    for entry in entries:
+        flags = 0
+        for flag in entry.get('flags', []):
+            flags |= getattr(re, flag)
+        pattern = re.compile(entry['pattern'], flags)
+        rule = (entry.get('name', entry['pattern']), pattern, entry.get('repl', ''))
+        group = entry.get('group')
+        if group and groups and groups[-1][0] == group:
+            groups[-1][1].append(rule)
+        else:
+            groups.append((group, [rule]))
+    for group, members in groups:
+        rules.append(_fuse(group, members) if len(members) > 1 else members[0])
+    return rules
 
 
-def clean_text(text: str) -> str:
-   # Elimina patrones no deseados del texto para mejorar la calidad de los chunks.
-    
-    # Eliminar ISBN y patrones similares
-    text = re.sub(r'ISBN.*?:\s*[0-9\-\s]+', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'ISBN\s*[0-9\-\s]+', '', text, flags=re.IGNORECASE)
-    
-    # Eliminar números de página y patrones como "- 23 -"
-    text = re.sub(r'-\s*\d+\s*-', '', text)
-    text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)
-    
-    # Eliminar el título principal repetido múltiples veces
-    title_pattern = r'FUNDAMENTOS DE LA INTELIGENCIA ARTIFICIAL:\s*UNA\s*VISION\s*INTRODUCTORIA'
-    text = re.sub(title_pattern, '', text, flags=re.IGNORECASE)
-    
-    # Eliminar encabezados comunes repetidos
-    text = re.sub(r'volumen\s*I', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'Tomo\s*1', '', text, flags=re.IGNORECASE)
-    
-    # Eliminar líneas que solo contienen números o caracteres especiales
-    text = re.sub(r'^\s*[0-9\s\-_\.]+\s*$', '', text, flags=re.MULTILINE)
-    
-    # Consolidar múltiples espacios en blanco en uno
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-    text = re.sub(r'[ \t]+', ' ', text)
-    
-    # Eliminar espacios en blanco al inicio/final de líneas
-    text = '\n'.join(line.strip() for line in text.split('\n'))
-    
-    # Eliminar líneas vacías al inicio y final
-    text = text.strip()
-    
-    # PATRONES ADICIONALES
-    
-    # 1. Eliminar referencias de pie de página (p. ej., "[1]", "[23]")
-    text = re.sub(r'\[\d+\]', '', text)
-    
-    # 2. Eliminar URLs y enlaces
-    text = re.sub(r'https?://\S+|www\.\S+', '', text, flags=re.IGNORECASE)
-    
-    # 3. Eliminar saltos de línea excesivos dentro de palabras (hiphenación)
-    text = re.sub(r'(\w+)-\s*\n\s*(\w+)', r'\1\2', text)
-    
-    # 4. Eliminar encabezados de página (típicamente en mayúsculas al inicio)
-    text = re.sub(r'^[A-Z\s]{3,}\s*$', '', text, flags=re.MULTILINE)
-    
-    # 5. Eliminar caracteres especiales repetidos (decorativos)
-    text = re.sub(r'([*_\-~]){3,}', '', text)
-
-     # 6. Eliminar índices/tablas de contenido (líneas con muchos puntos)
-    text = re.sub(r'^.*\.{4,}.*\d+\s*$', '', text, flags=re.MULTILINE)
-    
-    # 7. Eliminar saltos de página y marcas de sección (típicamente "Página X")
-    text = re.sub(r'(página|page|pág\.?)\s*\d+', '', text, flags=re.IGNORECASE)
-    
-    # 8. Eliminar marcas de formato OCR incorrectas (caracteres rotos)
-    text = re.sub(r'[¬§¶†‡]', '', text)
-    
-    # 9. Eliminar líneas que solo contienen palabras muy cortas repetidas
-    text = re.sub(r'^([a-z]{1,2}\s+){3,}$', '', text, flags=re.MULTILINE | re.IGNORECASE)
-    
-    # 10. Normalizar espacios alrededor de puntuación
-    text = re.sub(r'\s+([,.;:!?])', r'\1', text)
-    text = re.sub(r'([,.;:!?])\s+', r'\1 ', text)
-
-    # === LIMPIEZA ESPECÍFICA PARA PORTADA Y DEDICATORIA ===
-    # Eliminar líneas típicas de la portada violeta
-    text = re.sub(r'1era\s*Ed\.\s*2024\s*Vol\.\s*1', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'PUERTO MADERO EDITORIAL', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'puertomaderoeditorial\.com\.ar', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'La Plata - Argentina', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'[\u2022\u2023\u25CF\u25CB\u25D8\u25D9\u25E6]+', '', text)  # puntos decorativos
-    text = re.sub(r'\.{4,}', '', text)  # puntos suspensivos largos
-    text = re.sub(r'^\s*[\dIVX]+\s*$', '', text, flags=re.MULTILINE)  # números romanos sueltos
-    
-    # Consolidar la dedicatoria (está partida en varias líneas)
-    text = re.sub(r'A\s+mis\s+hijos\s*[,y]?\s*', 'A mis hijos, ', text, flags=re.IGNORECASE)
-    text = re.sub(r'y\s+a\s+los\s+lectores\s+de\s+Russell\s*y\s+Norvig', 'y a los lectores de Russell y Norvig', text, flags=re.IGNORECASE)
-    
-    # Aumentado: Quitar saltos de línea dentro de frases de la portada/dedicatoria
-    lines = text.split('\n')
-    cleaned_lines = []
-    current = ""
-    for line in lines:
-        line = line.strip()
+class RuleSet:
+    # Reglas compiladas de un corpus. Se aplican en tres etapas:
+    # pre (texto crudo), post (tras normalizar líneas) y final (tras filtrar líneas cortas).
+    def __init__(self, config: dict):
+        self.name = config.get('name', 'sin_nombre')
+        self.pre = _compile_rules(config.get('pre', []))
+        self.post = _compile_rules(config.get('post', []))
+        self.final = _compile_rules(config.get('final', []))
+        keep = config.get('keep_lines', {})
+        self.min_length = keep.get('min_length', 0)
+        self.keep_patterns = [(re.compile(k['pattern']), k.get('min_length', 0), k.get('max_length', float('inf')))
+                              for k in keep.get('patterns', [])]
+        self.keep_words = tuple(keep.get('words', []))
+
+    def apply(self, rules: List[Rule], text: str, timings: Optional[Timings] = None) -> str:
+        # Una pasada por regla (o grupo de reglas unidas) y en orden: varias actúan sobre
+        # lo que dejan las anteriores (p. ej. lineas_vacias_multiples tras borrar números
+        # de página), así que solo se unen las marcadas con "group" en el JSON.
+        if timings is None:
+            for _, pattern, repl in rules:
+                text = pattern.sub(repl, text)
+            return text
+        for name, pattern, repl in rules:
+            t0 = time.perf_counter()
+            text = pattern.sub(repl, text)
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - t0
+        return text
+
+    def keep_line(self, line: str) -> bool:
+        # Decide si una línea (ya sin espacios extremos) se conserva.
         if not line:
-            continue
-            
-        # Si es una línea con nombre de autor (contiene solo letras, espacios y mayúsculas)
-        if re.match(r'^[A-ZÁÉÍÓÚÑ\s]+$', line) and 10 < len(line) < 50:
-            cleaned_lines.append(line)
-            continue
-            
-        # Si es dedicatoria
-        if any(x in line.lower() for x in ['hijos', 'russell', 'norvig', 'dedicado']):
-            cleaned_lines.append(line)
-            continue
-            
-        # Si es línea normal del libro (más de 20 caracteres)
-        if len(line) > 20:
-            cleaned_lines.append(line)
-    
-    text = '\n'.join(cleaned_lines)
-    
-    # Forzar juntar los autores en una sola línea (esto es clave)
-    text = re.sub(r'(PATRICIO XAVIER MORENO VALLEJO)\s*\n\s*(GISEL KATERINE BASTIDAS GUACHO)\s*\n\s*(PATRICIO RENÉ MORENO COSTALES)', 
-                  r'\1, \2 y \3', text, flags=re.IGNORECASE)
-    
-    # Dedicatoria en una sola línea
-    text = re.sub(r'A\s+mis\s+hijos[.,\s]*\n\s*y?\s*a\s+los\s+lectores\s+de\s+Russell\s+y\s+Norvig', 
-                  'A mis hijos y a los lectores de Russell y Norvig', text, flags=re.IGNORECASE)
-    
-    return text
+            return False
+        # p. ej. una línea con nombre de autor (solo letras, espacios y mayúsculas)
+        for pattern, lo, hi in self.keep_patterns:
+            if pattern.match(line) and lo < len(line) < hi:
+                return True
+        # p. ej. la dedicatoria
+        if self.keep_words and any(x in line.lower() for x in self.keep_words):
+            return True
+        # Si es línea normal del libro
+        return len(line) > self.min_length
+
+
+@lru_cache(maxsize=None)
+def load_rules(path: Optional[str] = None) -> RuleSet:
+    # Carga y compila un conjunto de reglas; se cachea por ruta (una vez por proceso).
+    rules_path = Path(path) if path else DEFAULT_RULES
+    with rules_path.open('r', encoding='utf-8') as f:
+        return RuleSet(json.load(f))
+
+
+def clean_text(text: str, rules: Optional[RuleSet] = None, timings: Optional[Timings] = None) -> str:
+    # Elimina patrones no deseados del texto para mejorar la calidad de los chunks.
+    # timings, si se pasa, acumula los segundos empleados por cada regla.
+    rules = rules or load_rules()
+    text = rules.apply(rules.pre, text, timings)
+
+    # Eliminar espacios en blanco al inicio/final de líneas y líneas vacías al inicio y final
+    text = '\n'.join(line.strip() for line in text.split('\n')).strip()
+
+    text = rules.apply(rules.post, text, timings)
+
+    # Quitar líneas vacías o demasiado cortas (restos de portada, encabezados, etc.)
+    text = '\n'.join(line for line in (l.strip() for l in text.split('\n')) if rules.keep_line(line))
+
+    return rules.apply(rules.final, text, timings)
+
+
+def _edge(lines: List[str], window: int, rules: RuleSet, from_end: bool = False) -> Tuple[List[str], str]:
+    # Líneas del borde de un bloque hasta que, una vez limpias, sobrevivan `window`
+    # líneas. Las reglas solo cruzan espacios y texto que se elimina (encabezados,
+    # números de página, ISBN...), así que el texto que sobrevive hace de barrera.
+    # Devuelve las líneas crudas del borde y su versión limpia.
+    n = window * 4
+    while True:
+        edge = lines[-n:] if from_end else lines[:n]
+        cleaned = clean_text('\n'.join(edge), rules)
+        if n >= len(lines) or cleaned.count('\n') + 1 > window:
+            return edge, cleaned
+        n *= 2
+
+
+def clean_pages(pages: Iterable[str], sep: str = '\n\n', window: int = 2, rules: Optional[RuleSet] = None,
+                timings: Optional[Timings] = None, block_chars: int = BLOCK_CHARS) -> Iterator[str]:
+    # Limpia un flujo de páginas (p. ej. extract_pdf.iter_pages) por bloques.
+    # Equivale a clean_text(sep.join(pages), rules): los bloques generados se unen con '\n'.
+    # Solo se intenta cortar cuando el bloque pendiente llega a block_chars, y el corte
+    # se hace solo si ninguna regla cruza la unión. La memoria queda acotada por
+    # block_chars más el tramo de páginas enlazadas más largo, no por el documento.
+    # Cada intento limpia los bordes de la unión. Intentarlo en cada página costaba más
+    # CPU que la propia limpieza.
+    # timings solo mide la limpieza de los bloques, no las comprobaciones de los cortes.
+    rules = rules or load_rules()
+    buffer: List[str] = []
+    size = 0
+    # Borde final de todo lo visto (incluye bloques ya emitidos): una regla puede
+    # cruzar varias páginas que quedan vacías al limpiar. pending son las páginas que
+    # aún no se han incorporado a ese borde.
+    tail: List[str] = []
+    clean_tail = ''
+    pending: List[str] = []
+    for page in pages:
+        if size >= block_chars:
+            tail, clean_tail = _edge(sep.join(['\n'.join(tail)] + pending if tail else pending).split('\n'),
+                                     window, rules, from_end=True)
+            pending = []
+            head, clean_head = _edge(page.split('\n'), window, rules)
+            # El corte es seguro si limpiar la unión da lo mismo que limpiar cada lado por
+            # separado. Si un lado queda vacío no hay barrera y no se puede decidir.
+            if clean_tail and clean_head and \
+                    clean_text('\n'.join(tail) + sep + '\n'.join(head), rules) == clean_tail + '\n' + clean_head:
+                block = clean_text(sep.join(buffer), rules, timings)
+                if block:
+                    yield block
+                buffer = []
+                size = 0
+        buffer.append(page)
+        pending.append(page)
+        size += len(page)
+    if buffer:
+        block = clean_text(sep.join(buffer), rules, timings)
+        if block:
+            yield block
+
+
+def iter_blocks(path: Path, sep: str = '\n\n', chunk_size: int = 1 << 16) -> Iterator[str]:
+    # Lee un archivo de texto por trozos y genera los bloques separados por sep
+    # (mismo resultado que text.split(sep), sin cargar el archivo entero).
+    rest = ''
+    with path.open('r', encoding='utf-8') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            parts = (rest + data).split(sep)
+            rest = parts.pop()
+            yield from parts
+    yield rest
+
+
+def _counted(pages: Iterable[str], stats: Dict[str, int]) -> Iterator[str]:
+    # Cuenta los caracteres del texto original (páginas unidas por '\n\n') al pasar.
+    for i, page in enumerate(pages):
+        stats['original'] = stats.get('original', 0) + len(page) + (2 if i else 0)
+        yield page
+
+
+def _write_clean(blocks: Iterable[str], output_path: Path) -> int:
+    # Escribe los bloques limpios (unidos por '\n') y devuelve los caracteres escritos.
+    cleaned = 0
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open('w', encoding='utf-8') as out:
+        for i, block in enumerate(blocks):
+            if i:
+                out.write('\n')
+                cleaned += 1
+            out.write(block)
+            cleaned += len(block)
+    return cleaned
+
+
+def clean_file(input_path: str, output_path: str, rules_path: Optional[str] = None) -> Tuple[int, int, Timings]:
+    # Limpia un documento de texto en streaming. Se ejecuta en los workers del pool:
+    # cada proceso compila el conjunto de reglas una sola vez (load_rules está cacheada).
+    # Devuelve (caracteres originales, caracteres limpios, tiempos por regla).
+    rules = load_rules(rules_path)
+    stats: Dict[str, int] = {}
+    timings: Timings = {}
+    pages = _counted(iter_blocks(Path(input_path)), stats)
+    cleaned = _write_clean(clean_pages(pages, rules=rules, timings=timings), Path(output_path))
+    return stats.get('original', 0), cleaned, timings
+
+
+def _expand_inputs(inputs: List[str]) -> List[Path]:
+    # Acepta archivos y directorios (todos los .txt que no sean ya *_clean.txt).
+    paths = []
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            paths.extend(sorted(x for x in p.glob('*.txt') if not x.stem.endswith('_clean')))
+        else:
+            paths.append(p)
+    return paths
+
+
+def print_timings(timings: Timings) -> None:
+    total = sum(timings.values()) or 1.0
+    print(f"{'regla':<30} {'seg':>8} {'%':>6}")
+    for name, secs in sorted(timings.items(), key=lambda kv: -kv[1]):
+        print(f"{name[:30]:<30} {secs:>8.3f} {100 * secs / total:>6.1f}")
 
 
 def main():
-    input_path = Path('Data/FUNDAMENTO+DE+LA+IA+volumen+I.txt')
-    output_path = Path('Data/FUNDAMENTO+DE+LA+IA+volumen+I_clean.txt')
-    
-    if not input_path.exists():
-        print(f'ERROR: {input_path} no existe')
+    parser = argparse.ArgumentParser(description='Limpia el texto extraído de uno o varios documentos')
+    parser.add_argument('--input', nargs='+', default=['Data/FUNDAMENTO+DE+LA+IA+volumen+I.txt'],
+                        help='Textos de entrada (archivos o directorios con .txt)')
+    parser.add_argument('--pdf', default=None,
+                        help='Limpia directamente desde el PDF, solapando extracción y limpieza')
+    parser.add_argument('--out', default=None,
+                        help='Salida para un único documento (por defecto <entrada>_clean.txt)')
+    parser.add_argument('--out-dir', default=None, help='Directorio de salida para varios documentos')
+    parser.add_argument('--rules', default=None,
+                        help=f'Conjunto de reglas JSON (por defecto {DEFAULT_RULES.relative_to(RULES_DIR.parent.parent)})')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Procesos: documentos en paralelo, o extracción de páginas con --pdf')
+    parser.add_argument('--timings', action='store_true', help='Muestra el tiempo acumulado por regla')
+    parser.add_argument('--verify', action='store_true',
+                        help='Comprueba que la limpieza por bloques coincide con clean_text sobre el texto completo')
+    args = parser.parse_args()
+
+    rules_path = args.rules
+    if rules_path and not Path(rules_path).exists():
+        print(f'ERROR: {rules_path} no existe')
         return 1
-    
-    print(f'Leyendo {input_path}...')
-    text = input_path.read_text(encoding='utf-8')
-    
-    print('Limpiando texto...')
-    clean = clean_text(text)
-    
-    print(f'Guardando en {output_path}...')
-    output_path.write_text(clean, encoding='utf-8')
-    
-    print(f'✅ Texto limpiado. Original: {len(text)} chars, Limpio: {len(clean)} chars')
+
+    inputs = [Path(args.pdf)] if args.pdf else _expand_inputs(args.input)
+    for input_path in inputs:
+        if not input_path.exists():
+            print(f'ERROR: {input_path} no existe')
+            return 1
+    if args.out and len(inputs) > 1:
+        print('ERROR: --out solo admite un documento; usa --out-dir')
+        return 2
+
+    def output_for(input_path: Path) -> Path:
+        if args.out:
+            return Path(args.out)
+        out_dir = Path(args.out_dir) if args.out_dir else input_path.parent
+        return out_dir / (input_path.stem + '_clean.txt')
+
+    timings: Timings = {}
+    if args.pdf:
+        sys.path.insert(0, str(Path(__file__).resolve().parent))
+        import extract_pdf
+        input_path = inputs[0]
+        rules = load_rules(rules_path)
+        print(f'Extrayendo y limpiando {input_path}...')
+        # extract_text descarta las páginas vacías al unirlas: aquí igual.
+        stats: Dict[str, int] = {}
+        pages = _counted((p for p in extract_pdf.iter_pages(input_path, workers=args.workers) if p), stats)
+        cleaned = _write_clean(clean_pages(pages, rules=rules, timings=timings), output_for(input_path))
+        print(f"✅ {output_for(input_path)}. Original: {stats.get('original', 0)} chars, Limpio: {cleaned} chars")
+    else:
+        print(f'Limpiando {len(inputs)} documento(s) con {args.workers} proceso(s)...')
+        with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(inputs)))) as ex:
+            results = ex.map(clean_file, [str(p) for p in inputs], [str(output_for(p)) for p in inputs],
+                             [rules_path] * len(inputs))
+            for input_path, (original, cleaned, doc_timings) in zip(inputs, results):
+                for name, secs in doc_timings.items():
+                    timings[name] = timings.get(name, 0.0) + secs
+                print(f'✅ {output_for(input_path)}. Original: {original} chars, Limpio: {cleaned} chars')
+
+    if args.timings:
+        print_timings(timings)
+
+    if args.verify:
+        rules = load_rules(rules_path)
+        for input_path in inputs:
+            if args.pdf:
+                full = clean_text(extract_pdf.extract_text(input_path, workers=args.workers), rules)
+            else:
+                full = clean_text(input_path.read_text(encoding='utf-8'), rules)
+            if output_for(input_path).read_text(encoding='utf-8') != full:
+                print(f'ERROR: la limpieza por bloques de {input_path} difiere de clean_text sobre el texto completo')
+                return 1
+        print('Verificado: salida idéntica a clean_text sobre el texto completo')
     return 0
 
 
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# Almacen de embeddings sin comprimir y mapeable en memoria (reemplaza embeddings.npz).
+# Un directorio con header.json (dim, count, model, dtype, shards) y shards binarios
+# de dtype fijo. Los lectores abren los shards con np.memmap: no hay descompresion al
+# arrancar y varios procesos comparten las mismas paginas de la cache del sistema.
+# Uso: python scripts/embedding_store.py --convert Data/embeddings.npz [--out Data/embeddings]
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+from typing import List, Optional
+
+import numpy as np
+
+HEADER = 'header.json'
+SHARD_ROWS = 65536
+
+
+class EmbeddingStoreWriter:
+    # Escribe vectores en streaming (append) en shards de SHARD_ROWS filas.
+    # Se escribe en <path>.tmp y al cerrar se sustituye el almacen anterior de golpe;
+    # los lectores que ya tenian shards mapeados siguen leyendo los archivos antiguos.
+    def __init__(self, path: Path, dim: int, model: str, dtype: str = 'float32', shard_rows: int = SHARD_ROWS):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + '.tmp')
+        if self.tmp.exists():
+            shutil.rmtree(self.tmp)
+        self.tmp.mkdir(parents=True)
+        self.dim = dim
+        self.model = model
+        self.dtype = np.dtype(dtype)
+        self.shard_rows = shard_rows
+        self.shards: List[dict] = []
+        self._file = None
+        # Hash del contenido, calculado al escribir: los lectores obtienen la huella
+        # de los embeddings sin volver a leer los shards.
+        self._sha = hashlib.sha256()
+
+    def _open_shard(self):
+        name = f'shard_{len(self.shards):05d}.bin'
+        self.shards.append({'file': name, 'count': 0})
+        self._file = (self.tmp / name).open('wb')
+
+    def append(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f'se esperaban vectores de dimension {self.dim}, recibido {vectors.shape}')
+        start = 0
+        while start < len(vectors):
+            if self._file is None or self.shards[-1]['count'] >= self.shard_rows:
+                if self._file is not None:
+                    self._file.close()
+                self._open_shard()
+            n = min(self.shard_rows - self.shards[-1]['count'], len(vectors) - start)
+            data = vectors[start:start + n].tobytes()
+            self._file.write(data)
+            self._sha.update(data)
+            self.shards[-1]['count'] += n
+            start += n
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        header = {'dim': self.dim, 'count': sum(s['count'] for s in self.shards), 'model': self.model,
+                  'dtype': self.dtype.name, 'sha256': self._sha.hexdigest(), 'shards': self.shards}
+        (self.tmp / HEADER).write_text(json.dumps(header, indent=2), encoding='utf-8')
+        old = self.path.with_name(self.path.name + '.old')
+        if self.path.exists():
+            if old.exists():
+                shutil.rmtree(old)
+            os.replace(self.path, old)
+        os.replace(self.tmp, self.path)
+        if old.exists():
+            shutil.rmtree(old)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            if self._file is not None:
+                self._file.close()
+            shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+class EmbeddingStore:
+    # Lector de solo lectura: cada shard es un np.memmap (sin copiar nada a RAM).
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        header = json.loads((self.path / HEADER).read_text(encoding='utf-8'))
+        self.dim = header['dim']
+        self.count = header['count']
+        self.model = header.get('model')
+        self.dtype = np.dtype(header['dtype'])
+        self.sha256 = header.get('sha256')
+        self.shards = [np.memmap(self.path / s['file'], dtype=self.dtype, mode='r', shape=(s['count'], self.dim))
+                       for s in header['shards'] if s['count']]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def matrix(self):
+        # Matriz completa sin copia: el memmap si hay un solo shard, si no una vista
+        # ShardedMatrix que lee de cada shard solo las filas que se piden.
+        if not self.shards:
+            return np.zeros((0, self.dim), dtype=self.dtype)
+        if len(self.shards) == 1:
+            return self.shards[0]
+        return ShardedMatrix(self.shards)
+
+
+class ShardedMatrix:
+    # Vista de solo lectura de varios shards como una matriz (n, dim).
+    # Un slice de filas devuelve otra vista (sin leer nada); indices enteros o listas
+    # de indices devuelven un ndarray con esas filas; np.asarray() la materializa.
+    def __init__(self, parts: List[np.ndarray]):
+        self.parts = parts
+        self.offsets = np.cumsum([0] + [len(p) for p in parts])
+        self.dtype = parts[0].dtype
+        self.shape = (int(self.offsets[-1]), parts[0].shape[1])
+        self.ndim = 2
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(p.nbytes for p in self.parts)
+
+    def __array__(self, dtype=None, copy=None):
+        out = np.concatenate(self.parts) if self.parts else np.zeros((0, self.shape[1]), self.dtype)
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return np.asarray(self)[key]
+            parts = []
+            for part, off in zip(self.parts, self.offsets):
+                a, b = max(start - off, 0), min(stop - off, len(part))
+                if a < b:
+                    parts.append(part[a:b])
+            return ShardedMatrix(parts) if parts else np.zeros((0, self.shape[1]), self.dtype)
+        idx = np.asarray(key)
+        if idx.ndim == 0:
+            return self[np.array([int(idx)])][0]
+        idx = np.where(idx < 0, idx + len(self), idx)
+        out = np.empty((len(idx), self.shape[1]), dtype=self.dtype)
+        shard = np.searchsorted(self.offsets, idx, side='right') - 1
+        for s in np.unique(shard):
+            mask = shard == s
+            out[mask] = self.parts[s][idx[mask] - self.offsets[s]]
+        return out
+
+
+def is_store(path: Path) -> bool:
+    return (Path(path) / HEADER).exists()
+
+
+def load_embeddings(path, fallback: Optional[Path] = None) -> np.ndarray:
+    # Abre los embeddings de un almacen (directorio, sin copiarlos a RAM) o de un .npz antiguo.
+    # Si path no existe y hay fallback (p. ej. Data/embeddings.npz), se usa ese.
+    path = Path(path)
+    if not path.exists() and fallback is not None:
+        path = Path(fallback)
+    if is_store(path):
+        return EmbeddingStore(path).matrix()
+    data = np.load(str(path))
+    return data['embeddings']
+
+
+def _file_sha256(paths) -> str:
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    return h.hexdigest()
+
+
+def _npz_summary(path: Path) -> dict:
+    # Hash y forma de un .npz antiguo. Hashearlo entero en cada arranque crece con el
+    # corpus: el resultado se guarda junto al archivo (<npz>.sha256.json) con su tamaño y
+    # fecha de modificacion, y solo se recalcula si cambian.
+    stat = path.stat()
+    key = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    cache = path.with_name(path.name + '.sha256.json')
+    try:
+        cached = json.loads(cache.read_text(encoding='utf-8'))
+        if {k: cached.get(k) for k in key} == key:
+            return cached
+    except (OSError, ValueError):
+        pass
+    with np.load(str(path)) as data:
+        shape = data['embeddings'].shape
+    summary = dict(key, sha256=_file_sha256([path]), chunks=shape[0], dim=shape[1])
+    try:
+        tmp = cache.with_name(cache.name + '.tmp')
+        tmp.write_text(json.dumps(summary), encoding='utf-8')
+        os.replace(tmp, cache)
+    except OSError:
+        # Directorio de solo lectura: se recalcula en cada arranque
+        pass
+    return summary
+
+
+def fingerprint(path, model: Optional[str] = None, fallback: Optional[Path] = None) -> dict:
+    # Huella de unos embeddings (hash del contenido, modelo, numero de chunks y dimension).
+    # En un almacen se lee de header.json; la de un .npz antiguo se guarda junto a el.
+    path = Path(path)
+    if not path.exists() and fallback is not None:
+        path = Path(fallback)
+    if is_store(path):
+        header = json.loads((path / HEADER).read_text(encoding='utf-8'))
+        sha = header.get('sha256') or _file_sha256(path / s['file'] for s in header['shards'])
+        return {'embeddings_sha256': sha, 'model': model or header.get('model'),
+                'chunks': header['count'], 'dim': header['dim']}
+    summary = _npz_summary(path)
+    return {'embeddings_sha256': summary['sha256'], 'model': model, 'chunks': summary['chunks'],
+            'dim': summary['dim']}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Convierte o inspecciona un almacen de embeddings')
+    parser.add_argument('--convert', default=None, help='embeddings.npz a convertir')
+    parser.add_argument('--out', default=None, help='Directorio del almacen (por defecto junto al .npz)')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help='Modelo que genero los embeddings')
+    parser.add_argument('--info', default=None, help='Muestra la cabecera de un almacen')
+    args = parser.parse_args()
+
+    if args.info:
+        if not is_store(Path(args.info)):
+            print(f'ERROR: {args.info} no es un almacen de embeddings')
+            return 2
+        print((Path(args.info) / HEADER).read_text(encoding='utf-8'))
+        return 0
+
+    if not args.convert:
+        parser.print_help()
+        return 2
+    src = Path(args.convert)
+    if not src.exists():
+        print(f'ERROR: no existe {src}')
+        return 2
+    emb = np.load(str(src))['embeddings'].astype('float32')
+    out = Path(args.out) if args.out else src.with_suffix('')
+    with EmbeddingStoreWriter(out, emb.shape[1], args.model) as w:
+        w.append(emb)
+    print(f'Almacen creado en {out}: {emb.shape[0]} x {emb.shape[1]} float32')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
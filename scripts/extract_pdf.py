@@ -1,25 +1,220 @@
 #!/usr/bin/env python3
-# Extrae texto completo desde un archivo PDF usando PyPDF2.
-# Uso: python scripts/extract_pdf.py --pdf "ruta/archivo.pdf"
+# Extrae texto completo desde un archivo PDF (PyPDF2 por defecto; pypdf o PyMuPDF opcionales).
+# Uso: python scripts/extract_pdf.py --pdf "ruta/archivo.pdf" [--workers 4] [--backend pymupdf]
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
 from pathlib import Path
 import sys
+from typing import Iterator, List, Optional, Tuple
 
 import PyPDF2
 
+try:
+    import pypdf
+    _HAS_PYPDF = True
+except Exception:
+    pypdf = None
+    _HAS_PYPDF = False
 
-def extract_text(pdf_path: Path) -> str:
-    # Lee un numero limitado de paginas del PDF y extrae el texto.
-    MAX_PAGES_TO_EXTRACT = 81  # Limite de paginas a procesar
+try:
+    import pymupdf
+    _HAS_PYMUPDF = True
+except Exception:
+    pymupdf = None
+    _HAS_PYMUPDF = False
 
-    reader = PyPDF2.PdfReader(str(pdf_path))
+
+def _split_range(start: int, end: int, parts: int) -> List[Tuple[int, int]]:
+    # Divide [start, end) en tramos contiguos de tamaño similar.
+    total = max(end - start, 0)
+    parts = max(1, min(parts, total))
+    size, extra = divmod(total, parts)
+    shards = []
+    lo = start
+    for i in range(parts):
+        hi = lo + size + (1 if i < extra else 0)
+        if hi > lo:
+            shards.append((lo, hi))
+        lo = hi
+    return shards
+
+
+class PyPDF2Backend:
+    # Backend por defecto: PyPDF2 (Python puro, el mas lento pero siempre disponible).
+    name = 'pypdf2'
+
+    def __init__(self, pdf_path: str):
+        self.reader = PyPDF2.PdfReader(pdf_path)
+
+    def __len__(self) -> int:
+        return len(self.reader.pages)
+
+    def page_content(self, i: int) -> bytes:
+        contents = self.reader.pages[i].get_contents()
+        if contents is None:
+            return b""
+        # /Contents puede ser un array de flujos: se concatenan en orden
+        if isinstance(contents, list):
+            return b"".join(part.get_object().get_data() for part in contents)
+        return contents.get_data()
+
+    def page_text(self, i: int) -> str:
+        return self.reader.pages[i].extract_text() or ""
+
+
+class PypdfBackend(PyPDF2Backend):
+    # Sucesor mantenido de PyPDF2 con la misma API de lectura.
+    name = 'pypdf'
+
+    def __init__(self, pdf_path: str):
+        self.reader = pypdf.PdfReader(pdf_path)
+
+
+class PyMuPDFBackend:
+    # Backend basado en MuPDF (extension C): el mas rapido de los soportados.
+    name = 'pymupdf'
+
+    def __init__(self, pdf_path: str):
+        self.doc = pymupdf.open(pdf_path)
+
+    def __len__(self) -> int:
+        return self.doc.page_count
+
+    def page_content(self, i: int) -> bytes:
+        return self.doc[i].read_contents()
+
+    def page_text(self, i: int) -> str:
+        return self.doc[i].get_text() or ""
+
+
+BACKENDS = {'pypdf2': PyPDF2Backend}
+if _HAS_PYPDF:
+    BACKENDS['pypdf'] = PypdfBackend
+if _HAS_PYMUPDF:
+    BACKENDS['pymupdf'] = PyMuPDFBackend
+
+DEFAULT_BACKEND = 'pypdf2'
+
+
+def open_backend(pdf_path, backend: str = DEFAULT_BACKEND):
+    # Abre el PDF con el backend indicado; falla si no esta instalado.
+    if backend not in BACKENDS:
+        raise ValueError(f"backend de extraccion no disponible: {backend} "
+                         f"(disponibles: {', '.join(sorted(BACKENDS))})")
+    return BACKENDS[backend](str(pdf_path))
+
+
+def page_hash(doc, i: int) -> Optional[str]:
+    # Hash del flujo de contenido crudo de la pagina (clave de la cache).
+    # Devuelve None si el contenido no se puede leer (la pagina no se cachea).
+    try:
+        data = doc.page_content(i)
+    except Exception:
+        return None
+    return hashlib.sha256(data or b"").hexdigest()
+
+
+def _extract_page(doc, i: int, cache_dir: Optional[Path]) -> Tuple[str, bool]:
+    # Extrae una pagina consultando antes la cache. Devuelve (texto, acierto_de_cache).
+    cache_file = None
+    if cache_dir is not None:
+        key = page_hash(doc, i)
+        if key is not None:
+            # Cada backend produce un texto distinto: la clave incluye su nombre.
+            cache_file = cache_dir / f"{doc.name}-{key}.txt"
+            if cache_file.exists():
+                return cache_file.read_text(encoding='utf-8'), True
+
+    try:
+        text = doc.page_text(i)
+    except Exception:
+        # No se cachean los fallos: se reintentan en la siguiente ejecucion.
+        return "", False
+
+    if cache_file is not None:
+        # Escritura atomica: varios workers pueden compartir el mismo directorio.
+        tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(text, encoding='utf-8')
+        os.replace(tmp, cache_file)
+    return text, False
+
+
+def _extract_shard(pdf_path: str, start: int, end: int, cache_dir: Optional[str] = None,
+                   backend: str = DEFAULT_BACKEND) -> Tuple[List[str], int]:
+    # Extrae las paginas [start, end) en un proceso propio (cada worker abre su lector).
+    # Devuelve los textos y el numero de paginas servidas desde la cache.
+    doc = open_backend(pdf_path, backend)
+    cache = Path(cache_dir) if cache_dir else None
     pages = []
-    for p in reader.pages[:MAX_PAGES_TO_EXTRACT]:
-        try:
-            pages.append(p.extract_text() or "")
-        except Exception:
-            pages.append("")
+    hits = 0
+    for i in range(start, end):
+        text, hit = _extract_page(doc, i, cache)
+        pages.append(text)
+        hits += hit
+    return pages, hits
+
+
+def iter_pages(pdf_path: Path, start: int = 0, end: Optional[int] = None, workers: int = 1,
+               cache_dir: Optional[Path] = None, stats: Optional[dict] = None,
+               backend: str = DEFAULT_BACKEND) -> Iterator[str]:
+    # Genera el texto de cada pagina del rango [start, end) en orden, a medida que se extrae,
+    # para que la limpieza (clean_text.clean_pages) pueda solaparse con la extraccion.
+    # Con workers > 1 el rango se reparte entre un pool de procesos.
+    # Con cache_dir solo se extraen las paginas cuyo contenido no esta en la cache.
+    doc = open_backend(pdf_path, backend)
+    end = len(doc) if end is None else min(end, len(doc))
+    start = max(start, 0)
+
+    cache = None
+    if cache_dir is not None:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        cache = str(cache_dir)
+
+    count = 0
+    hits = 0
+    try:
+        if start >= end:
+            return
+        if workers <= 1:
+            cache_path = Path(cache) if cache else None
+            for i in range(start, end):
+                text, hit = _extract_page(doc, i, cache_path)
+                count += 1
+                hits += hit
+                yield text
+        else:
+            # Varios tramos por worker para repartir mejor paginas de coste desigual.
+            shards = _split_range(start, end, workers * 4)
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                # map() devuelve los resultados en el orden de los tramos.
+                for shard_pages, shard_hits in ex.map(_extract_shard, [str(pdf_path)] * len(shards),
+                                                      [s for s, _ in shards], [e for _, e in shards],
+                                                      [cache] * len(shards), [backend] * len(shards)):
+                    hits += shard_hits
+                    for text in shard_pages:
+                        count += 1
+                        yield text
+    finally:
+        if stats is not None:
+            stats['pages'] = count
+            stats['cache_hits'] = hits
+
+
+def extract_pages(pdf_path: Path, start: int = 0, end: Optional[int] = None, workers: int = 1,
+                  cache_dir: Optional[Path] = None, stats: Optional[dict] = None,
+                  backend: str = DEFAULT_BACKEND) -> List[str]:
+    # Extrae el texto de cada pagina del rango [start, end) manteniendo el orden.
+    return list(iter_pages(pdf_path, start, end, workers, cache_dir, stats, backend))
+
+
+def extract_text(pdf_path: Path, start: int = 0, end: Optional[int] = None, workers: int = 1,
+                 cache_dir: Optional[Path] = None, stats: Optional[dict] = None,
+                 backend: str = DEFAULT_BACKEND) -> str:
+    # Extrae el texto del rango de paginas indicado y lo une en un solo documento.
+    pages = extract_pages(pdf_path, start, end, workers, cache_dir, stats, backend)
     return "\n\n".join(p for p in pages if p)
 
 
@@ -28,6 +223,16 @@ def main() -> int:
     parser = argparse.ArgumentParser(description="Extrae texto de un PDF y lo guarda en un .txt")
     parser.add_argument("--pdf", required=True, help="Ruta al archivo PDF de entrada")
     parser.add_argument("--out", required=False, help="Ruta de salida .txt (opcional)")
+    parser.add_argument("--start-page", type=int, default=0, help="Primera pagina a extraer (base 0)")
+    parser.add_argument("--end-page", type=int, default=None,
+                        help="Pagina final exclusiva (por defecto, hasta el final del PDF)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Procesos para extraer paginas en paralelo (por defecto 1 = secuencial)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directorio de la cache de paginas (por defecto <carpeta del PDF>/.page_cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Desactiva la cache de paginas")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=sorted(BACKENDS),
+                        help="Motor de extraccion (ver scripts/benchmark_extract.py)")
     args = parser.parse_args()
 
     pdf_path = Path(args.pdf)
@@ -35,7 +240,15 @@ def main() -> int:
         print(f"ERROR: no existe el PDF: {pdf_path}")
         return 2
 
-    text = extract_text(pdf_path)
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = Path(args.cache_dir) if args.cache_dir else pdf_path.parent / '.page_cache'
+
+    stats = {}
+    text = extract_text(pdf_path, args.start_page, args.end_page, args.workers, cache_dir, stats,
+                        args.backend)
+    if cache_dir is not None:
+        print(f"Paginas: {stats.get('pages', 0)}, desde cache: {stats.get('cache_hits', 0)}")
 
     out_path = Path(args.out) if args.out else pdf_path.with_suffix('.txt')
     out_path.parent.mkdir(parents=True, exist_ok=True)
@@ -1,14 +1,28 @@
 #!/usr/bin/env python3
 # Genera embeddings vectoriales para cada chunk usando sentence-transformers.
-# Guarda embeddings en formato NPZ y metadata en JSONL.
+# Guarda embeddings en un almacen mapeable en memoria (Data/embeddings/, ver
+# embedding_store.py) y metadata en JSONL.
+# Los vectores ya calculados se reutilizan desde una cache por (modelo, hash del texto).
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import json
+import multiprocessing
+import os
 from pathlib import Path
+import sys
+import time
+from typing import Dict, List, Optional
+import warnings
 import numpy as np
 from tqdm import tqdm
 
-from sentence_transformers import SentenceTransformer
+# Asegurar import local de embedding_store
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import embedding_store
+from embedding_store import EmbeddingStoreWriter, SHARD_ROWS
+import search_engine
 
 
 def load_chunks(path: Path):
@@ -19,13 +33,165 @@ def load_chunks(path: Path):
     return chunks
 
 
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    # Cache persistente de embeddings de un modelo: hash sha256 del texto -> vector.
+    # Se guarda como NPZ sin comprimir (keys: digests de 32 bytes, vectors: float32).
+    def __init__(self, path: Optional[Path]):
+        # path None: cache solo en memoria (no se lee ni se guarda).
+        self.path = path
+        self.vectors: Dict[bytes, np.ndarray] = {}
+        if path is not None and path.exists():
+            data = np.load(str(path))
+            for key, vec in zip(data['keys'], data['vectors']):
+                self.vectors[bytes(key)] = vec
+
+    @staticmethod
+    def path_for(cache_dir: Path, model_name: str) -> Path:
+        slug = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in model_name)
+        return cache_dir / f'{slug}.npz'
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        return self.vectors.get(key)
+
+    def put(self, key: bytes, vec: np.ndarray) -> None:
+        self.vectors[key] = vec
+
+    def prune(self, keep) -> None:
+        # Olvida los vectores de textos que ya no estan en el corpus.
+        keep = set(keep)
+        self.vectors = {k: v for k, v in self.vectors.items() if k in keep}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        keys = np.array(list(self.vectors.keys()), dtype='S32')
+        if self.vectors:
+            vectors = np.stack(list(self.vectors.values())).astype('float32')
+        else:
+            vectors = np.zeros((0, 0), dtype='float32')
+        # Escritura atomica: una ejecucion interrumpida no deja la cache corrupta.
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with tmp.open('wb') as f:
+            np.savez(f, keys=keys, vectors=vectors)
+        os.replace(tmp, self.path)
+
+
+_WORKER_MODEL = None
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    # Cada worker carga su copia del modelo y limita sus hilos de torch para que
+    # workers * hilos no supere los nucleos disponibles.
+    global _WORKER_MODEL
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _WORKER_MODEL = SentenceTransformer(model_name, device='cpu')
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return _WORKER_MODEL.encode(texts, batch_size=len(texts), show_progress_bar=False,
+                                convert_to_numpy=True, normalize_embeddings=False).astype('float32')
+
+
+def load_tokenizer(model_name: str = 'all-MiniLM-L6-v2'):
+    # (tokenizer, max_seq_length) del modelo de embeddings sin cargar sus pesos: con
+    # --workers > 1 el proceso principal solo mide longitudes y los pesos los cargan los
+    # workers; chunk_text.py e ingest_corpus.py lo usan para medir los chunks en tokens.
+    # Todo texto que pase de max_seq_length tokens se trunca en silencio al codificarlo.
+    from transformers import AutoTokenizer
+    path = Path(model_name)
+    # Mismo criterio que SentenceTransformer para nombres cortos del hub
+    repo = model_name if path.exists() or '/' in model_name else f'sentence-transformers/{model_name}'
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    max_len = tokenizer.model_max_length
+    try:
+        if path.exists():
+            config_path = path / 'sentence_bert_config.json'
+        else:
+            from huggingface_hub import hf_hub_download
+            config_path = hf_hub_download(repo, 'sentence_bert_config.json')
+        max_len = json.loads(Path(config_path).read_text(encoding='utf-8'))['max_seq_length']
+    except Exception:
+        # Sin configuracion de sentence-transformers: el limite del tokenizer
+        warnings.warn(f'No se encontro sentence_bert_config.json de {model_name}; '
+                      f'se usa max_seq_length={max_len} del tokenizer')
+    return tokenizer, max_len
+
+
+def make_pool(model_name: str, workers: int) -> ProcessPoolExecutor:
+    # Pool de workers que cargan el modelo una vez y codifican lotes (ver _init_worker).
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # spawn: torch no es seguro tras fork si el proceso padre ya inicio sus hilos.
+    ctx = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                               initializer=_init_worker, initargs=(model_name, threads))
+
+
+def length_sorted_batches(tokenizer, max_len: int, texts: List[str], batch_size: int) -> List[List[int]]:
+    # Agrupa los indices en lotes de textos con longitud en tokens parecida, para que
+    # cada lote se rellene (padding) lo minimo posible.
+    lengths = [min(len(ids), max_len) for ids in
+               tokenizer(texts, add_special_tokens=True, truncation=True, max_length=max_len)['input_ids']]
+    order = sorted(range(len(texts)), key=lambda i: -lengths[i])
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def encode_texts(texts: List[str], tokenizer, max_len: int, batch_size: int = 32, model=None,
+                 pool: Optional[ProcessPoolExecutor] = None) -> np.ndarray:
+    # Codifica los textos por lotes ordenados por longitud y devuelve los vectores en
+    # el orden original. Con pool (make_pool) los lotes se reparten entre sus procesos,
+    # que ya tienen el modelo cargado; si no, se usa model en este proceso.
+    batches = length_sorted_batches(tokenizer, max_len, texts, batch_size)
+    if pool is None:
+        vecs = [model.encode([texts[i] for i in idx], batch_size=len(idx), show_progress_bar=False,
+                             convert_to_numpy=True, normalize_embeddings=False) for idx in tqdm(batches, desc='Lotes')]
+    else:
+        vecs = tqdm(pool.map(_encode_batch, [[texts[i] for i in idx] for idx in batches]),
+                    total=len(batches), desc='Lotes')
+    out = None
+    for idx, v in zip(batches, vecs):
+        if out is None:
+            out = np.zeros((len(texts), v.shape[1]), dtype='float32')
+        out[idx] = v
+    return out if out is not None else np.zeros((0, 0), dtype='float32')
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description='Genera embeddings para chunks')
     parser.add_argument('--chunks', required=True, help='Ruta a chunks.jsonl')
     parser.add_argument('--model', default='all-MiniLM-L6-v2', help='Modelo sentence-transformers')
     parser.add_argument('--out', default=None, help='Ruta base de salida (por defecto usar Data/)')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directorio de la cache de embeddings (por defecto <salida>/.embedding_cache)')
+    parser.add_argument('--no-cache', action='store_true', help='Recalcula todos los embeddings')
+    parser.add_argument('--prune-cache', action='store_true',
+                        help='Elimina de la cache los textos que ya no estan en chunks.jsonl')
+    parser.add_argument('--batch-size', type=int, default=32, help='Textos por lote al codificar')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Procesos de codificacion (cada uno carga su copia del modelo)')
+    parser.add_argument('--window', type=int, default=SHARD_ROWS,
+                        help='Chunks que se codifican y añaden al almacen en cada paso')
+    parser.add_argument('--npz', action='store_true',
+                        help='Escribe tambien el formato antiguo embeddings.npz (comprimido)')
+    parser.add_argument('--index-dtype', choices=search_engine.DTYPES, default='float32',
+                        help='Tipo del indice que se construye y guarda en <salida>/index')
+    parser.add_argument('--index-type', choices=search_engine.KINDS, default='flat',
+                        help='flat (exacto) o aproximado: ivf, ivfpq, hnsw')
+    parser.add_argument('--nlist', type=int, default=None, help='Listas IVF (por defecto 4*sqrt(n))')
+    parser.add_argument('--shards', type=int, default=1, help='Shards del indice (busqueda en paralelo)')
+    parser.add_argument('--pca-dim', type=int, default=None,
+                        help='Reduce los vectores del indice a esta dimension con PCA (ver benchmark_index.py --pca-dims)')
+    parser.add_argument('--no-index', action='store_true', help='No construye el indice persistido')
     args = parser.parse_args()
 
+    if args.window < 1:
+        print('ERROR: --window debe ser >= 1')
+        return 2
+
     chunks_path = Path(args.chunks)
     if not chunks_path.exists():
         print('ERROR: no existe', chunks_path)
@@ -37,25 +203,112 @@ def main() -> int:
     print('Cargando chunks...', flush=True)
     chunks = load_chunks(chunks_path)
     texts = [c.get('text', '') for c in chunks]
+    keys = [text_hash(t) for t in texts]
+
+    if args.no_cache:
+        # Cache solo en memoria: evita codificar dos veces un texto repetido.
+        cache = EmbeddingCache(None)
+    else:
+        cache_dir = Path(args.cache_dir) if args.cache_dir else out_dir / '.embedding_cache'
+        cache = EmbeddingCache(EmbeddingCache.path_for(cache_dir, args.model))
+
+    pending = len({k for k in keys if cache.get(k) is None})
+    print(f'Chunks: {len(texts)}, a codificar: {pending} (el resto se reutiliza de la cache)')
+
+    # Los chunks se procesan por ventanas y cada ventana se añade al almacen en cuanto
+    # esta lista, en el orden de chunks.jsonl.
+    emb_path = out_dir / 'embeddings'
+    # Modelo (un proceso) o pool de workers (--workers > 1): se crean con la primera
+    # ventana que tenga textos nuevos y sirven para todas las siguientes.
+    tokenizer = None
+    model = None
+    pool = None
+    writer = None
+    encoded_total = 0
+    encode_time = 0.0
+    legacy = [] if args.npz else None
+    try:
+        for start in range(0, len(texts), args.window):
+            window_keys = keys[start:start + args.window]
+            # Solo se codifican los textos nuevos o modificados (y cada texto repetido una vez).
+            missing: Dict[bytes, str] = {}
+            for key, text in zip(window_keys, texts[start:start + args.window]):
+                if cache.get(key) is None and key not in missing:
+                    missing[key] = text
 
-    print('Cargando modelo:', args.model)
-    model = SentenceTransformer(args.model)
+            if missing:
+                if tokenizer is None:
+                    print('Cargando modelo:', args.model)
+                    if args.workers > 1:
+                        tokenizer, max_len = load_tokenizer(args.model)
+                        pool = make_pool(args.model, args.workers)
+                    else:
+                        from sentence_transformers import SentenceTransformer
+                        model = SentenceTransformer(args.model)
+                        tokenizer, max_len = model.tokenizer, model.max_seq_length
+                    print(f'Generando embeddings (lotes de {args.batch_size}, {args.workers} proceso(s))...')
+                t0 = time.perf_counter()
+                new = encode_texts(list(missing.values()), tokenizer, max_len, args.batch_size, model, pool)
+                encode_time += time.perf_counter() - t0
+                encoded_total += len(missing)
+                for key, vec in zip(missing.keys(), new):
+                    cache.put(key, vec)
 
-    print('Generando embeddings...')
-    embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True, normalize_embeddings=False)
+            block = np.stack([cache.get(k) for k in window_keys]).astype('float32')
+            if writer is None:
+                writer = EmbeddingStoreWriter(emb_path, block.shape[1], args.model)
+            writer.append(block)
+            if legacy is not None:
+                legacy.append(block)
+    except BaseException:
+        if writer is not None:
+            writer.__exit__(*sys.exc_info())
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if writer is None:
+        print('ERROR: no hay chunks en', chunks_path)
+        return 2
+    writer.close()
+
+    if encoded_total:
+        print(f'Codificados {encoded_total} chunks en {encode_time:.1f}s '
+              f'({encoded_total / max(encode_time, 1e-9):.1f} chunks/s)')
 
-    # Guardar embeddings y metadata
-    emb_path = out_dir / 'embeddings.npz'
-    np.savez_compressed(emb_path, embeddings=embeddings.astype('float32'))
+    if cache.path is not None:
+        if args.prune_cache:
+            cache.prune(keys)
+        if encoded_total or args.prune_cache:
+            cache.save()
+
+    if legacy is not None:
+        # Formato antiguo, para consumidores que aun lean embeddings.npz
+        np.savez_compressed(out_dir / 'embeddings.npz', embeddings=np.concatenate(legacy))
 
     meta_path = out_dir / 'metadata.jsonl'
     with meta_path.open('w', encoding='utf-8') as f:
         for c in chunks:
             f.write(json.dumps(c, ensure_ascii=False) + "\n")
 
+    if not args.no_index:
+        # Las apps cargan este indice directamente mientras la huella coincida.
+        index_dir = out_dir / 'index'
+        fingerprint = embedding_store.fingerprint(emb_path, args.model)
+        t0 = time.perf_counter()
+        try:
+            index = search_engine.build_index(embedding_store.load_embeddings(emb_path), args.index_dtype,
+                                              args.index_type, nlist=args.nlist, shards=args.shards,
+                                              pca_dim=args.pca_dim)
+        except ValueError as e:
+            print(f'ERROR: no se pudo construir el indice: {e}')
+            return 2
+        search_engine.save_index(index, index_dir, fingerprint)
+        print(f'Indice guardado en: {index_dir} ({time.perf_counter() - t0:.1f}s)')
+
     print('Embeddings guardados en:', emb_path)
     print('Metadata guardada en:', meta_path)
-    print('Dimensiones embeddings:', embeddings.shape)
+    print('Dimensiones embeddings:', (len(texts), writer.dim))
     return 0
 
 
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# Ingesta de un corpus de varios documentos (PDF o texto) en un unico almacen de chunks.
+# Cada documento se extrae, limpia (opcional) y fragmenta en un proceso del pool;
+# los chunks se escriben en el orden del manifiesto.
+# Cada chunk lleva "id" (su fila en chunks.jsonl/embeddings: cambia si cambia un documento
+# anterior) y "uid" = "<id del documento>:<sha256 del documento, 16 hex>:<n de chunk>",
+# unico en el corpus y que solo cambia si cambia su propio documento.
+# Uso: python scripts/ingest_corpus.py --corpus "carpeta/o/manifiesto.jsonl" [--workers 4]
+#
+# Manifiesto (JSON con una lista o JSONL), rutas ("path" y "rules") relativas al propio manifiesto:
+#   {"path": "libro.pdf", "id": "libro", "rules": "reglas/generic.json"}
+# "id" es opcional (por defecto el nombre del archivo) y "rules" activa la limpieza.
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Asegurar import local de los scripts del pipeline
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import chunk_text
+import clean_text
+import extract_pdf
+import generate_embeddings
+
+SUPPORTED = ('.pdf', '.txt')
+
+
+def load_manifest(corpus: Path) -> List[dict]:
+    # Devuelve la lista de documentos del corpus (directorio o manifiesto JSON/JSONL).
+    if corpus.is_dir():
+        paths = sorted(p for p in corpus.iterdir()
+                       if p.suffix.lower() in SUPPORTED and not p.stem.endswith('_clean'))
+        # Un .txt junto a un .pdf del mismo nombre es su texto ya extraido (lo que escribe
+        # extract_pdf.py por defecto): se ingesta solo el PDF.
+        pdfs = {p.stem for p in paths if p.suffix.lower() == '.pdf'}
+        paths = [p for p in paths if p.suffix.lower() == '.pdf' or p.stem not in pdfs]
+        docs = [{'path': str(p)} for p in paths]
+    else:
+        raw = corpus.read_text(encoding='utf-8')
+        if corpus.suffix.lower() == '.jsonl':
+            docs = [json.loads(line) for line in raw.splitlines() if line.strip()]
+        else:
+            docs = json.loads(raw)
+        for doc in docs:
+            for key in ('path', 'rules'):
+                if doc.get(key) and not Path(doc[key]).is_absolute():
+                    doc[key] = str(corpus.parent / doc[key])
+
+    seen = set()
+    for doc in docs:
+        doc.setdefault('id', Path(doc['path']).stem)
+        if doc['id'] in seen:
+            raise ValueError(f"id de documento repetido en el corpus: {doc['id']}")
+        seen.add(doc['id'])
+    return docs
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open('rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _joined(blocks: Iterable[str], sep: str) -> Iterator[str]:
+    # Trozos consecutivos de sep.join(blocks), para segmentar en streaming.
+    for i, block in enumerate(blocks):
+        yield sep + block if i else block
+
+
+def document_chunks(doc: dict, max_chars: int = 1000, overlap: int = 200,
+                    max_tokens: Optional[int] = None, overlap_tokens: int = 50,
+                    model: str = 'all-MiniLM-L6-v2', use_cache: bool = True) -> List[str]:
+    # Extrae, limpia y fragmenta un documento. Se ejecuta en los workers del pool.
+    path = Path(doc['path'])
+    if path.suffix.lower() == '.pdf':
+        cache_dir = path.parent / '.page_cache' if use_cache else None
+        # extract_text descarta las páginas vacías al unirlas: aquí igual.
+        pages = (p for p in extract_pdf.iter_pages(path, cache_dir=cache_dir) if p)
+    else:
+        pages = clean_text.iter_blocks(path)
+
+    if doc.get('rules'):
+        text = _joined(clean_text.clean_pages(pages, rules=clean_text.load_rules(doc['rules'])), '\n')
+    else:
+        text = _joined(pages, '\n\n')
+
+    sentences = chunk_text.iter_sentences(text)
+    if max_tokens is not None:
+        tokenizer, max_seq_length = _tokenizer(model)
+        budget = max_tokens or max_seq_length - 2
+        return list(chunk_text.iter_token_chunks(sentences, tokenizer, budget, overlap_tokens))
+    return list(chunk_text.iter_chunks(sentences, max_chars, overlap))
+
+
+_TOKENIZERS: Dict[str, tuple] = {}
+
+
+def _tokenizer(model: str):
+    # Un tokenizer por proceso y modelo.
+    if model not in _TOKENIZERS:
+        _TOKENIZERS[model] = generate_embeddings.load_tokenizer(model)
+    return _TOKENIZERS[model]
+
+
+def _process(args) -> List[str]:
+    doc, opts = args
+    return document_chunks(doc, **opts)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ingesta un corpus de documentos en un unico chunks.jsonl")
+    parser.add_argument("--corpus", required=True, help="Directorio con PDFs/.txt o manifiesto JSON/JSONL")
+    parser.add_argument("--out-dir", default="Data", help="Directorio de salida (chunks.jsonl y documents.jsonl)")
+    parser.add_argument("--max-chars", type=int, default=1000, help="Tamaño máximo por chunk en caracteres")
+    parser.add_argument("--overlap", type=int, default=200, help="Solapamiento entre chunks (caracteres)")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="Agrupa por tokens del modelo (ver chunk_text.py --max-tokens)")
+    parser.add_argument("--overlap-tokens", type=int, default=50, help="Solapamiento en tokens")
+    parser.add_argument("--model", default='all-MiniLM-L6-v2', help="Modelo cuyo tokenizer mide los chunks")
+    parser.add_argument("--rules", default=None,
+                        help="Reglas de limpieza para los documentos que no indiquen las suyas")
+    parser.add_argument("--no-cache", action="store_true", help="Desactiva la cache de paginas de los PDF")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Documentos procesados en paralelo")
+    args = parser.parse_args()
+
+    corpus = Path(args.corpus)
+    if not corpus.exists():
+        print(f"ERROR: no existe el corpus: {corpus}")
+        return 2
+    try:
+        docs = load_manifest(corpus)
+    except (ValueError, KeyError, json.JSONDecodeError) as e:
+        print(f"ERROR: manifiesto invalido: {e}")
+        return 2
+    missing = [d['path'] for d in docs if not Path(d['path']).exists()]
+    if missing:
+        print(f"ERROR: no existen: {', '.join(missing)}")
+        return 2
+    if not docs:
+        print(f"ERROR: no hay documentos en {corpus}")
+        return 2
+    if args.rules:
+        for doc in docs:
+            doc.setdefault('rules', args.rules)
+
+    opts = {'max_chars': args.max_chars, 'overlap': args.overlap, 'max_tokens': args.max_tokens,
+            'overlap_tokens': args.overlap_tokens, 'model': args.model, 'use_cache': not args.no_cache}
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    chunks_path = out_dir / 'chunks.jsonl'
+    docs_path = out_dir / 'documents.jsonl'
+
+    print(f"Ingestando {len(docs)} documento(s) con {args.workers} proceso(s)...")
+    next_id = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(docs)))) as ex, \
+            chunks_path.open('w', encoding='utf-8') as fc, docs_path.open('w', encoding='utf-8') as fd:
+        # map() devuelve los documentos en el orden del manifiesto: los ids globales
+        # solo dependen de ese orden, no de qué worker termina antes.
+        for doc, chunks in zip(docs, ex.map(_process, [(d, opts) for d in docs])):
+            sha = _file_sha256(Path(doc['path']))
+            for i, c in enumerate(chunks):
+                obj = {"id": next_id + i, "uid": f"{doc['id']}:{sha[:16]}:{i}", "text": c, "source": doc['id'], "chunk": i}
+                fc.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            entry = {"id": doc['id'], "path": doc['path'], "sha256": sha,
+                     "first_chunk": next_id, "num_chunks": len(chunks)}
+            fd.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            print(f"  {doc['id']}: {len(chunks)} chunks (ids {next_id}..{next_id + len(chunks) - 1})")
+            next_id += len(chunks)
+
+    print(f"Chunks generados: {next_id} -> {chunks_path}")
+    print(f"Documentos: {len(docs)} -> {docs_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
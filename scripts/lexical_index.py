@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# Indice invertido BM25 sobre los chunks (busqueda por palabras clave, sin modelo).
+# Tokenizacion para español: minusculas, sin tildes ni dieresis (canción == cancion),
+# sin palabras vacias. Las listas de postings se guardan contiguas (formato CSR) con el
+# peso BM25 de cada (termino, chunk) ya calculado: una consulta solo suma pesos.
+# Se guarda en Data/lexical/ con la huella de chunks.jsonl y se reconstruye si cambia.
+# La fusion con la busqueda densa (modo 'hybrid') usa reciprocal rank fusion (rrf).
+# Uso: python scripts/lexical_index.py --chunks Data/chunks.jsonl [--out Data/lexical] [--ask "perceptron"]
+
+import argparse
+from collections import Counter
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import sys
+import time
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Asegurar import local de search_engine
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from search_engine import top_k_indices
+
+MODES = ('dense', 'lexical', 'hybrid')
+# Parametros BM25 habituales: saturacion del tf y normalizacion por longitud
+K1 = 1.2
+B = 0.75
+# Constante de reciprocal rank fusion: score = sum(1 / (RRF_K + posicion))
+RRF_K = 60
+# Resultados de cada lista que entran en la fusion del modo 'hybrid'
+FUSION_DEPTH = 20
+# Que es la puntuacion de cada resultado segun el modo: similitud coseno, peso BM25 o
+# el valor de la fusion (~0.016-0.033, no comparable con los otros ni con el umbral).
+# Las interfaces la muestran con este nombre ('score' o 'rrf').
+SCORE_KEYS = {'dense': 'score', 'lexical': 'score', 'hybrid': 'rrf'}
+LEXICAL_MANIFEST = 'manifest.json'
+
+TOKEN_RE = re.compile(r'\w+')
+# Palabras vacias del español, ya sin tildes (se comparan tras fold()).
+STOPWORDS = frozenset('''
+a al algo algun alguna algunas alguno algunos ante antes aqui asi aun cada como con contra cual cuales
+cuando de del desde donde dos el ella ellas ello ellos en entre era eran es esa esas ese eso esos esta
+estaba estan estar estas este esto estos fue fueron ha han hasta hay la las le les lo los mas me mi mis
+mucho muy nada ni no nos o otra otras otro otros para pero poco por porque que quien se sea segun ser si
+sin sino sobre son su sus tambien tan tanto te tiene tienen todo todos tu tus un una unas uno unos y ya
+'''.split())
+
+
+def fold(text: str) -> str:
+    # Minusculas y sin marcas diacriticas (tildes, dieresis; la ñ queda como n).
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(fold(text)) if t not in STOPWORDS]
+
+
+def load_texts(path: Path) -> List[str]:
+    # Textos de un JSONL de chunks (chunks.jsonl o metadata.jsonl), en orden de id.
+    with Path(path).open('r', encoding='utf-8') as f:
+        return [json.loads(line).get('text', '') for line in f if line.strip()]
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with Path(path).open('rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class BM25Index:
+    def __init__(self, texts: Iterable[str], k1: float = K1, b: float = B):
+        self.params = {'k1': k1, 'b': b}
+        counts = [Counter(tokenize(t)) for t in texts]
+        lengths = np.array([sum(c.values()) for c in counts], dtype='float32')
+        self.n = len(counts)
+        avgdl = float(lengths.mean()) if self.n and lengths.sum() else 1.0
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc, c in enumerate(counts):
+            for term, tf in c.items():
+                postings.setdefault(term, []).append((doc, tf))
+        self.terms = sorted(postings)
+        self.vocab = {t: i for i, t in enumerate(self.terms)}
+        self.offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(postings[t]) for t in self.terms])
+        self.docs = np.empty(self.offsets[-1], dtype=np.int32)
+        tfs = np.empty(self.offsets[-1], dtype='float32')
+        for i, t in enumerate(self.terms):
+            a, z = self.offsets[i], self.offsets[i + 1]
+            self.docs[a:z], tfs[a:z] = zip(*postings[t])
+        # Peso BM25 de cada posting: idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        df = np.diff(self.offsets).astype('float32')
+        idf = np.log(1 + (self.n - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * lengths[self.docs] / avgdl)
+        self.weights = (np.repeat(idf, np.diff(self.offsets)) * tfs * (k1 + 1) / (tfs + norm)).astype('float32')
+
+    def memory_bytes(self) -> int:
+        return self.offsets.nbytes + self.docs.nbytes + self.weights.nbytes
+
+    def save(self, index_dir: Path) -> None:
+        np.save(index_dir / 'offsets.npy', self.offsets)
+        np.save(index_dir / 'docs.npy', self.docs)
+        np.save(index_dir / 'weights.npy', self.weights)
+        (index_dir / 'terms.json').write_text(json.dumps(self.terms, ensure_ascii=False), encoding='utf-8')
+
+    @classmethod
+    def load(cls, index_dir: Path, params: dict, n: int):
+        self = cls.__new__(cls)
+        self.params = params
+        self.n = n
+        self.terms = json.loads((index_dir / 'terms.json').read_text(encoding='utf-8'))
+        self.vocab = {t: i for i, t in enumerate(self.terms)}
+        self.offsets = np.load(index_dir / 'offsets.npy')
+        self.docs = np.load(index_dir / 'docs.npy', mmap_mode='r')
+        self.weights = np.load(index_dir / 'weights.npy', mmap_mode='r')
+        return self
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        # Suma los pesos de los postings de cada termino de la consulta (repetidos una vez).
+        ids = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        if not ids:
+            return []
+        docs = np.concatenate([self.docs[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        weights = np.concatenate([self.weights[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        # Solo se tocan los chunks que contienen algun termino, no los n del corpus.
+        hits, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        return [(int(hits[i]), float(scores[i])) for i in top_k_indices(scores, top_k)]
+
+
+def rrf(rankings: Iterable[List[Tuple[int, float]]], top_k: int = 5, k: int = RRF_K) -> List[Tuple[int, float]]:
+    # Reciprocal rank fusion: cada lista aporta 1 / (k + posicion) a sus resultados.
+    # Solo usa las posiciones, asi que mezcla cosenos y puntuaciones BM25 sin calibrarlas.
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (idx, _) in enumerate(ranking, 1):
+            fused[idx] = fused.get(idx, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda hit: -hit[1])[:top_k]
+
+
+def retrieve(mode: str, question: str, top_k: int, lexical: Optional[BM25Index] = None,
+             dense: Optional[Callable[[str, int], List[Tuple[int, float]]]] = None,
+             threshold: float = 0.0) -> Tuple[List[Tuple[int, float]], bool]:
+    # Resultados de una pregunta segun el modo y si superan el umbral de respuesta.
+    # En 'hybrid' la puntuacion de cada resultado es su valor rrf (ver SCORE_KEYS).
+    # dense(question, k) codifica y busca en el indice denso: en modo 'lexical' no se
+    # llama, asi que no se toca el modelo. El umbral es de similitud coseno: en 'lexical'
+    # basta con que algun chunk contenga los terminos; en 'hybrid' vale cualquiera de los dos.
+    if mode not in MODES:
+        raise ValueError(f"modo desconocido: {mode} (disponibles: {', '.join(MODES)})")
+    if mode == 'lexical':
+        results = lexical.search(question, top_k)
+        return results, bool(results)
+    if mode == 'dense':
+        results = dense(question, top_k)
+        return results, bool(results) and results[0][1] >= threshold
+    semantic = dense(question, max(top_k, FUSION_DEPTH))
+    keyword = lexical.search(question, max(top_k, FUSION_DEPTH))
+    accepted = bool(keyword) or (bool(semantic) and semantic[0][1] >= threshold)
+    return rrf([semantic, keyword], top_k), accepted
+
+
+def fingerprint(chunks_path: Path) -> dict:
+    return {'chunks_sha256': _file_sha256(chunks_path)}
+
+
+def save_index(index: BM25Index, index_dir: Path, fp: dict) -> None:
+    # Mismo esquema que search_engine.save_index: directorio temporal y manifiesto al final.
+    index_dir = Path(index_dir)
+    tmp = index_dir.with_name(index_dir.name + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    index.save(tmp)
+    manifest = dict(fp, params=index.params, chunks=index.n)
+    (tmp / LEXICAL_MANIFEST).write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    if index_dir.exists():
+        shutil.rmtree(index_dir)
+    os.replace(tmp, index_dir)
+
+
+def load_index(index_dir: Path, fp: dict, k1: float = K1, b: float = B) -> Optional[BM25Index]:
+    manifest_path = Path(index_dir) / LEXICAL_MANIFEST
+    if not manifest_path.exists():
+        return None
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    except json.JSONDecodeError:
+        return None
+    if manifest.get('chunks_sha256') != fp['chunks_sha256'] or manifest.get('params') != {'k1': k1, 'b': b}:
+        return None
+    return BM25Index.load(Path(index_dir), manifest['params'], manifest['chunks'])
+
+
+def load_or_build_index(chunks_path: Path, index_dir: Path, k1: float = K1, b: float = B) -> BM25Index:
+    # Carga el indice persistido; si falta o chunks_path cambio lo construye y lo guarda.
+    fp = fingerprint(chunks_path)
+    index = load_index(index_dir, fp, k1, b)
+    if index is not None:
+        return index
+    index = BM25Index(load_texts(chunks_path), k1, b)
+    try:
+        save_index(index, index_dir, fp)
+    except OSError as e:
+        print(f'Aviso: no se pudo guardar el indice lexico en {index_dir}: {e}')
+    return index
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Construye (o consulta) el indice BM25 de los chunks')
+    parser.add_argument('--chunks', default='Data/chunks.jsonl', help='JSONL de chunks')
+    parser.add_argument('--out', default='Data/lexical', help='Directorio del indice')
+    parser.add_argument('--k1', type=float, default=K1)
+    parser.add_argument('--b', type=float, default=B)
+    parser.add_argument('--ask', default=None, help='Consulta de prueba')
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    chunks_path = Path(args.chunks)
+    if not chunks_path.exists():
+        print(f'ERROR: no existe {chunks_path}')
+        return 2
+    t0 = time.perf_counter()
+    index = load_or_build_index(chunks_path, Path(args.out), args.k1, args.b)
+    print(f'Indice lexico: {index.n} chunks, {len(index.terms)} terminos, '
+          f'{index.memory_bytes() / 1e6:.2f} MB ({time.perf_counter() - t0:.2f}s) -> {args.out}')
+    if args.ask:
+        t0 = time.perf_counter()
+        results = index.search(args.ask, args.top_k)
+        elapsed = time.perf_counter() - t0
+        texts = load_texts(chunks_path)
+        for idx, score in results:
+            print(f'[{idx}] {score:.3f}  {texts[idx][:120]!r}')
+        print(f'{len(results)} resultados en {elapsed * 1e6:.0f} us')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Planificador de micro-lotes: agrupa peticiones concurrentes y las procesa juntas.
+# Cada hilo de peticion llama a submit(item) y espera su Future; un hilo propio recoge
+# las peticiones en cola (mas las que lleguen durante max_wait_ms, hasta max_batch) y
+# llama una sola vez a fn(items), que devuelve un resultado por item en el mismo orden. Asi el modelo hace
+# una pasada con N preguntas en lugar de N pasadas de una, y la espera extra de cada
+# peticion esta acotada por la ventana.
+
+from concurrent.futures import Future
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+MAX_BATCH = 32
+# Con fn ocupada las peticiones ya se acumulan en la cola y forman el siguiente lote;
+# una ventana > 0 solo compensa si llegan a rafagas mientras fn esta libre.
+MAX_WAIT_MS = 0.0
+
+
+class MicroBatcher:
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch: int = MAX_BATCH,
+                 max_wait_ms: float = MAX_WAIT_MS, name: str = 'micro-batch'):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self.stats: Dict[str, int] = {'batches': 0, 'items': 0, 'max_batch': 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any, timeout: float = None) -> Any:
+        # Encola item y espera su resultado (las excepciones de fn se relanzan aqui).
+        return self.submit(item).result(timeout)
+
+    def _collect(self) -> list:
+        # Bloquea hasta la primera peticion y luego espera como mucho max_wait mas.
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = [(item, future) for item, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            self.stats['batches'] += 1
+            self.stats['items'] += len(batch)
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
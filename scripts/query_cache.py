@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# Cache LRU de consultas compartida por app_flask_fixed.py, chat_cli.py y app_streamlit.py.
+# Guarda, por texto de pregunta normalizado, su embedding y los resultados top-k ya
+# calculados: una pregunta repetida se responde sin tocar el modelo ni el indice.
+# Cada parte tiene un maximo de entradas (se descarta la menos usada) y contadores de
+# aciertos/fallos. La huella (embeddings, modelo, indice...) se comprueba con validate():
+# si cambia, la cache se vacia.
+# SemanticCache va un paso mas alla: compara el embedding de la pregunta con los de
+# preguntas anteriores y, si alguno esta a menos de max_distance (coseno), devuelve sus
+# resultados sin buscar en el indice. Se guarda en disco y se puede precalentar.
+# Calibrar la distancia con pares de preguntas (ver Data/paraphrase_pairs.tsv):
+#   python scripts/query_cache.py --calibrate Data/paraphrase_pairs.tsv [--model all-MiniLM-L6-v2]
+
+import argparse
+from collections import OrderedDict
+import json
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+MAX_ENTRIES = 1024
+# Distancia coseno maxima (1 - similitud) para reutilizar la respuesta de otra pregunta.
+# Con 0.1 (similitud 0.9) solo coincidian preguntas casi identicas: con all-MiniLM-L6-v2
+# las reformulaciones ("¿Qué es la IA?" / "qué es inteligencia artificial") quedan mas
+# lejos. 0.2 (similitud 0.8) admite reformulaciones y deja fuera preguntas distintas del
+# mismo tema; un acierto falso devuelve la respuesta de otra pregunta (un fallo solo
+# cuesta una busqueda), asi que ante la duda se prefiere quedarse corto. Comprobar con
+# --calibrate al cambiar de modelo.
+SEMANTIC_DISTANCE = 0.2
+SEMANTIC_ENTRIES = 4096
+# Entradas nuevas tras las que SemanticCache se guarda sola en disco
+SAVE_EVERY = 32
+
+_SPACES = re.compile(r'\s+')
+
+
+def _canonical(fingerprint: Optional[dict]) -> Optional[dict]:
+    # La huella tal como queda tras guardarla en JSON (tuplas -> listas...), para compararla.
+    return None if fingerprint is None else json.loads(json.dumps(fingerprint, sort_keys=True, default=str))
+
+
+def normalize_question(question: str) -> str:
+    # Minusculas, espacios colapsados y sin signos de interrogacion/exclamacion en los
+    # extremos: "¿Qué es un perceptrón?" y "qué es un  perceptrón" comparten entrada.
+    return _SPACES.sub(' ', question.lower()).strip(' ¿?¡!.')
+
+
+class LRUCache:
+    # Diccionario acotado y seguro entre hilos: get() mueve la entrada al final y put()
+    # descarta la del principio (la menos usada) al pasar de max_entries.
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max(0, max_entries)
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, fingerprint: Optional[dict] = None):
+        self.embeddings = LRUCache(max_entries)
+        self.results = LRUCache(max_entries)
+        self.fingerprint = fingerprint
+        self.invalidations = 0
+
+    def validate(self, fingerprint: dict) -> None:
+        # Vacia la cache si los embeddings, el modelo o el indice ya no son los mismos.
+        if fingerprint != self.fingerprint:
+            if self.fingerprint is not None:
+                self.invalidations += 1
+            self.embeddings.clear()
+            self.results.clear()
+            self.fingerprint = fingerprint
+
+    def get_embedding(self, question: str) -> Optional[np.ndarray]:
+        return self.embeddings.get(normalize_question(question))
+
+    def put_embedding(self, question: str, embedding: np.ndarray) -> None:
+        self.embeddings.put(normalize_question(question), embedding)
+
+    def embed(self, question: str, encode: Callable[[str], np.ndarray]) -> np.ndarray:
+        # Embedding de la pregunta; encode(question) solo se llama si no esta en cache.
+        embedding = self.get_embedding(question)
+        if embedding is None:
+            embedding = encode(question)
+            self.put_embedding(question, embedding)
+        return embedding
+
+    def cached(self, question: str, compute: Callable[[], Any], *params: Hashable) -> Any:
+        # Resultado de compute() para (pregunta, params); params distingue modo, top_k, umbral...
+        key = (normalize_question(question),) + params
+        value = self.results.get(key)
+        if value is None:
+            value = compute()
+            self.results.put(key, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {'embedding_hits': self.embeddings.hits, 'embedding_misses': self.embeddings.misses,
+                'embedding_entries': len(self.embeddings), 'result_hits': self.results.hits,
+                'result_misses': self.results.misses, 'result_entries': len(self.results),
+                'invalidations': self.invalidations}
+
+
+class SemanticCache:
+    # Matriz (entradas, d) de embeddings normalizados de preguntas ya buscadas, con su
+    # lista de resultados y el top_k con que se obtuvo. lookup() hace un producto con
+    # todas (pocas miles: mucho menos que el corpus) y reutiliza la mas parecida si su
+    # distancia coseno es <= max_distance y tiene al menos top_k resultados. Las
+    # puntuaciones devueltas son las de la pregunta original. Llena, se reemplaza la
+    # entrada usada hace mas tiempo.
+    def __init__(self, max_distance: float = SEMANTIC_DISTANCE, max_entries: int = SEMANTIC_ENTRIES,
+                 path: Optional[Path] = None, fingerprint: Optional[dict] = None):
+        self.max_distance = max_distance
+        self.max_entries = max(1, max_entries)
+        self.path = Path(path) if path else None
+        self.fingerprint = _canonical(fingerprint)
+        self._lock = threading.Lock()
+        self._clear()
+        self.hits = 0
+        self.misses = 0
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def _clear(self) -> None:
+        self.vectors: Optional[np.ndarray] = None
+        self.results: List[List[Tuple[int, float]]] = []
+        self.ks = np.zeros(self.max_entries, dtype=np.int64)
+        self.used = np.zeros(self.max_entries, dtype=np.int64)
+        self.size = 0
+        self._tick = 0
+        self._dirty = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def validate(self, fingerprint: dict) -> None:
+        fingerprint = _canonical(fingerprint)
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self._clear()
+                self.fingerprint = fingerprint
+
+    @staticmethod
+    def _normalized(embedding: np.ndarray) -> np.ndarray:
+        v = np.asarray(embedding, dtype='float32').ravel()
+        return v / (np.linalg.norm(v) + 1e-12)
+
+    def lookup(self, embedding: np.ndarray, top_k: int) -> Optional[List[Tuple[int, float]]]:
+        q = self._normalized(embedding)
+        with self._lock:
+            if self.size:
+                sims = np.where(self.ks[:self.size] >= top_k, self.vectors[:self.size] @ q, -np.inf)
+                best = int(np.argmax(sims))
+                if 1.0 - sims[best] <= self.max_distance:
+                    self._tick += 1
+                    self.used[best] = self._tick
+                    self.hits += 1
+                    return self.results[best][:top_k]
+            self.misses += 1
+            return None
+
+    def put(self, embedding: np.ndarray, results: List[Tuple[int, float]], top_k: int) -> None:
+        q = self._normalized(embedding)
+        with self._lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, len(q)), dtype='float32')
+            if self.size < self.max_entries:
+                slot = self.size
+                self.size += 1
+                self.results.append(results)
+            else:
+                slot = int(np.argmin(self.used))
+                self.results[slot] = results
+            self._tick += 1
+            self.vectors[slot] = q
+            self.ks[slot] = top_k
+            self.used[slot] = self._tick
+            self._dirty += 1
+            autosave = self.path is not None and self._dirty >= SAVE_EVERY
+        if autosave:
+            self.save()
+
+    def warm(self, questions: List[str], encode: Callable[[List[str]], np.ndarray],
+             search: Callable[[np.ndarray, int], List[List[Tuple[int, float]]]], top_k: int) -> int:
+        # Precalienta con una lista de preguntas: un encode y un search_batch para las
+        # que aun no tienen respuesta parecida. Devuelve cuantas entradas se anadieron.
+        embeddings = np.atleast_2d(encode(questions)) if questions else np.zeros((0, 0))
+        new = [e for e in embeddings if self.lookup(e, top_k) is None]
+        if not new:
+            return 0
+        for e, results in zip(new, search(np.stack(new), top_k)):
+            self.put(e, results, top_k)
+        return len(new)
+
+    def save(self) -> None:
+        # Escribe en un temporal y lo sustituye de golpe (np.savez sin comprimir).
+        if self.path is None:
+            return
+        with self._lock:
+            n = self.size
+            width = max((len(r) for r in self.results), default=0)
+            ids = np.full((n, width), -1, dtype=np.int64)
+            scores = np.zeros((n, width), dtype='float32')
+            for i, r in enumerate(self.results):
+                if r:
+                    ids[i, :len(r)], scores[i, :len(r)] = zip(*r)
+            arrays = {'vectors': self.vectors[:n] if n else np.zeros((0, 0), dtype='float32'),
+                      'ks': self.ks[:n], 'used': self.used[:n], 'ids': ids, 'scores': scores,
+                      'fingerprint': np.array(json.dumps(self.fingerprint))}
+            self._dirty = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with tmp.open('wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self.path)
+
+    def _load(self) -> None:
+        # Una cache guardada con otra huella (otros embeddings u otro indice) se ignora.
+        try:
+            data = np.load(self.path)
+            fingerprint = json.loads(str(data['fingerprint']))
+        except (OSError, ValueError, KeyError):
+            return
+        if self.fingerprint is not None and fingerprint != self.fingerprint:
+            return
+        n = min(len(data['ks']), self.max_entries)
+        if not n:
+            return
+        self.vectors = np.zeros((self.max_entries, data['vectors'].shape[1]), dtype='float32')
+        self.vectors[:n] = data['vectors'][:n]
+        self.ks[:n] = data['ks'][:n]
+        self.used[:n] = data['used'][:n]
+        self.results = [[(int(i), float(sc)) for i, sc in zip(ids, scores) if i >= 0]
+                        for ids, scores in zip(data['ids'][:n], data['scores'][:n])]
+        self.size = n
+        self._tick = int(self.used[:n].max())
+        self.fingerprint = fingerprint
+
+    def stats(self) -> Dict[str, int]:
+        return {'semantic_hits': self.hits, 'semantic_misses': self.misses, 'semantic_entries': self.size}
+
+
+def load_pairs(path: Path) -> List[Tuple[str, str, bool]]:
+    # Pares "pregunta_a<TAB>pregunta_b<TAB>1|0" (1: piden lo mismo); '#' inicia un comentario.
+    pairs = []
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        if not line.strip() or line.startswith('#'):
+            continue
+        a, b, same = line.split('\t')
+        pairs.append((a, b, same.strip() == '1'))
+    return pairs
+
+
+def calibrate(pairs: List[Tuple[str, str, bool]],
+              encode: Callable[[List[str]], np.ndarray]) -> Tuple[List[float], Optional[float]]:
+    # Distancia coseno de cada par y la max_distance sugerida: el punto medio entre el par
+    # equivalente mas lejano y el par distinto mas cercano. Si se solapan, justo por debajo
+    # del distinto mas cercano (ningun acierto falso, aunque se pierdan reformulaciones).
+    if not pairs:
+        return [], None
+    emb = np.asarray(encode([q for a, b, _ in pairs for q in (a, b)]), dtype='float32')
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+    distances = [float(1.0 - emb[2 * i] @ emb[2 * i + 1]) for i in range(len(pairs))]
+    same = [d for d, (_, _, s) in zip(distances, pairs) if s]
+    other = [d for d, (_, _, s) in zip(distances, pairs) if not s]
+    if not same or not other:
+        return distances, None
+    if max(same) < min(other):
+        return distances, (max(same) + min(other)) / 2
+    return distances, max(min(other) - 0.005, 0.0)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Calibra la distancia de la cache semantica con pares de preguntas')
+    parser.add_argument('--calibrate', required=True, help='TSV de pares (ver Data/paraphrase_pairs.tsv)')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help='Modelo de embeddings')
+    args = parser.parse_args()
+
+    path = Path(args.calibrate)
+    if not path.exists():
+        print(f'ERROR: no existe {path}')
+        return 2
+    try:
+        pairs = load_pairs(path)
+    except ValueError as e:
+        print(f'ERROR: formato invalido en {path}: {e}')
+        return 2
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(args.model)
+    distances, suggested = calibrate(pairs, lambda qs: model.encode(qs, convert_to_numpy=True))
+    for (a, b, same), d in zip(pairs, distances):
+        hit = 'reutiliza' if d <= SEMANTIC_DISTANCE else 'busca'
+        print(f"{d:.3f}  {'igual   ' if same else 'distinta'}  {hit:<9}  {a} | {b}")
+    if suggested is None:
+        print('Hacen falta pares iguales (1) y distintos (0) para sugerir una distancia')
+    else:
+        print(f'SEMANTIC_DISTANCE actual: {SEMANTIC_DISTANCE}; sugerida para {args.model}: {suggested:.3f}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,8 +1,33 @@
 #!/usr/bin/env python3
 # Motor de busqueda semantica que usa FAISS si esta disponible,
 # sino utiliza busqueda por similitud coseno con numpy.
+# Opcionalmente el indice guarda los vectores en float16 o int8 (menos memoria);
+# en ese caso los candidatos se puntuan con la version compacta y el top-k final
+# se recalcula exacto con los float32 originales (el almacen en disco).
+# Ademas de la busqueda exacta ('flat') hay indices aproximados: 'ivf', 'ivfpq' y
+# 'hnsw' (FAISS). Sin FAISS, los tipos aproximados usan una IVF en numpy.
+# 'stream' es busqueda exacta sin indice en memoria: recorre el almacen en disco por
+# bloques (para corpus cuyos vectores no caben en RAM).
+# 'binary' guarda 1 bit por dimension (32x menos que float32): preselecciona candidatos
+# por distancia de Hamming (popcount) y los recalcula exactos con los float32.
+# Con pca_dim los vectores se proyectan a menos dimensiones (PCA) antes de indexarlos;
+# las consultas se proyectan igual y el top-k se recalcula exacto en float32.
+# Con shards > 1 los vectores se reparten en trozos que se buscan en paralelo en un
+# pool de hilos (numpy y FAISS liberan el GIL) y se fusionan los top-k.
+# El indice construido se guarda en disco (Data/index/) junto a una huella de los
+# embeddings; al arrancar se carga tal cual y solo se reconstruye si la huella cambia.
 
-from typing import List, Tuple, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import json
+import math
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+from typing import Dict, List, Tuple, Optional
 import numpy as np
 
 try:
@@ -12,47 +37,880 @@ except Exception:
     faiss = None
     _HAS_FAISS = False
 
+DTYPES = ('float32', 'float16', 'int8')
+KINDS = ('flat', 'ivf', 'ivfpq', 'hnsw', 'stream', 'binary')
+# Parametros de construccion (se guardan en el manifiesto) y de consulta (se pueden
+# cambiar sin reconstruir). nlist None: 4 * sqrt(n); pq_m None: dimension / 8.
+# block_rows / readahead: filas por bloque y bloques leidos por adelantado en 'stream'.
+# rerank: candidatos por consulta que 'binary' recalcula exactos.
+# pca_dim None: sin reduccion de dimension.
+BUILD_PARAMS = {'nlist': None, 'pq_m': None, 'pq_bits': 8, 'hnsw_m': 32, 'ef_construction': 200, 'shards': 1,
+                'pca_dim': None}
+QUERY_PARAMS = {'nprobe': 8, 'ef_search': 64, 'block_rows': 8192, 'readahead': 2, 'rerank': 256}
+# Candidatos por resultado que se recalculan exactos cuando el indice esta cuantizado
+RESCORE_FACTOR = 4
+# Filas por bloque al cuantizar y al puntuar (la copia float32 temporal cabe en cache)
+BLOCK_ROWS = 4096
+# Maximo de similitudes (consultas x vectores) por producto matriz-matriz en search_batch
+SCORE_ELEMS = 1 << 24
+INDEX_MANIFEST = 'manifest.json'
+
+
+def _check_dtype(dtype: str) -> None:
+    if dtype not in DTYPES:
+        raise ValueError(f"tipo de indice desconocido: {dtype} (disponibles: {', '.join(DTYPES)})")
+
+
+def index_params(kind: str, n: int, d: int, dtype: str = 'float32', **params) -> Dict[str, int]:
+    # Valida el tipo de indice y completa los parametros de construccion que aplican.
+    if kind not in KINDS:
+        raise ValueError(f"indice desconocido: {kind} (disponibles: {', '.join(KINDS)})")
+    _check_dtype(dtype)
+    unknown = set(params) - set(BUILD_PARAMS) - set(QUERY_PARAMS)
+    if unknown:
+        raise ValueError(f"parametros desconocidos: {', '.join(sorted(unknown))}")
+    p = dict(BUILD_PARAMS, **{k: v for k, v in params.items() if k in BUILD_PARAMS and v is not None})
+    if p['pca_dim'] is not None:
+        if kind == 'stream':
+            raise ValueError('stream recorre el almacen original: no admite pca_dim')
+        if not 0 < p['pca_dim'] < d:
+            raise ValueError(f"pca_dim={p['pca_dim']} debe estar entre 1 y {d - 1}")
+        d = p['pca_dim']
+    if kind == 'stream' and dtype != 'float32':
+        raise ValueError('stream lee los vectores float32 del almacen tal cual: use dtype float32')
+    if kind == 'binary' and dtype != 'float32':
+        raise ValueError('binary ya comprime los vectores (1 bit por dimension): use dtype float32')
+    if kind in ('flat', 'stream', 'binary'):
+        return {}
+    if kind == 'hnsw':
+        return {'hnsw_m': p['hnsw_m'], 'ef_construction': p['ef_construction']}
+    nlist = p['nlist'] or int(4 * math.sqrt(n))
+    out = {'nlist': max(1, min(nlist, n))}
+    if kind == 'ivfpq':
+        if dtype != 'float32':
+            raise ValueError('ivfpq ya comprime los vectores (product quantization): use dtype float32')
+        pq_m = p['pq_m'] or max(1, d // 8)
+        if d % pq_m:
+            raise ValueError(f'pq_m={pq_m} debe dividir la dimension {d}')
+        # Cada subcuantizador necesita al menos 2**pq_bits vectores de entrenamiento.
+        out.update(pq_m=pq_m, pq_bits=max(1, min(p['pq_bits'], int(math.log2(max(n, 2))))))
+    return out
+
+
+def _query_params(params: dict) -> Dict[str, int]:
+    return dict(QUERY_PARAMS, **{k: v for k, v in params.items() if k in QUERY_PARAMS and v is not None})
+
+
+def _normalized(embeddings: np.ndarray, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+    # Copia float32 normalizada de las filas [start, end).
+    emb = np.asarray(embeddings[start:end], dtype='float32')
+    norms = np.linalg.norm(emb, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return emb / norms
+
+
+def quantize(embeddings: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    # Normaliza y convierte por bloques (sin una copia float32 completa intermedia).
+    # int8: cuantizacion escalar por fila, v ~ codes * scale con scale = max|v| / 127.
+    _check_dtype(dtype)
+    n = len(embeddings)
+    codes = np.empty((n, embeddings.shape[1]), dtype=dtype)
+    scales = np.empty(n, dtype='float32') if dtype == 'int8' else None
+    for start in range(0, n, BLOCK_ROWS):
+        block = _normalized(embeddings, start, start + BLOCK_ROWS)
+        end = start + len(block)
+        if dtype == 'int8':
+            scale = np.abs(block).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            codes[start:end] = np.round(block / scale[:, None])
+            scales[start:end] = scale
+        else:
+            codes[start:end] = block
+    return codes, scales
+
+
+def _normalized_queries(queries: np.ndarray) -> np.ndarray:
+    # Matriz (m, d) de consultas normalizadas; acepta tambien un unico vector.
+    q = np.atleast_2d(np.asarray(queries, dtype='float32'))
+    return q / (np.linalg.norm(q, axis=1, keepdims=True) + 1e-12)
+
+
+def top_k_indices(sims: np.ndarray, k: int) -> np.ndarray:
+    # Indices de los k mayores valores (por fila si sims es 2D), de mayor a menor.
+    # argpartition selecciona en O(n); solo se ordenan los k elegidos.
+    n = sims.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(sims.shape[:-1] + (0,), dtype=np.intp)
+    if k == n:
+        return np.argsort(-sims, axis=-1)
+    part = np.argpartition(sims, n - k, axis=-1)[..., n - k:]
+    order = np.argsort(-np.take_along_axis(sims, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def _scores(emb: np.ndarray, scales: Optional[np.ndarray], qn: np.ndarray) -> np.ndarray:
+    # Similitudes (m, n) de las consultas qn (m, d) con cada fila de emb
+    # (float32, float16 o int8 con escalas), en un solo producto matriz-matriz.
+    if emb.dtype == np.float32:
+        return qn @ emb.T
+    # numpy no tiene BLAS para float16/int8: se convierte bloque a bloque.
+    sims = np.empty((len(qn), len(emb)), dtype='float32')
+    for start in range(0, len(emb), BLOCK_ROWS):
+        end = start + BLOCK_ROWS
+        sims[:, start:end] = qn @ emb[start:end].astype('float32').T
+    if scales is not None:
+        sims *= scales
+    return sims
+
+
+def rescore(source: np.ndarray, candidates: np.ndarray, qn: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    # Similitud coseno exacta de los candidatos con los vectores float32 originales.
+    # Se leen en orden de fila: con un memmap solo se tocan las paginas necesarias.
+    candidates = np.sort(candidates)
+    rows = np.asarray(source[candidates], dtype='float32')
+    norms = np.linalg.norm(rows, axis=1)
+    norms[norms == 0] = 1.0
+    sims = (rows @ qn) / norms
+    return [(int(candidates[i]), float(sims[i])) for i in top_k_indices(sims, top_k)]
+
+
+def _faiss_factory(kind: str, dtype: str, params: dict) -> str:
+    storage = {'float32': 'Flat', 'float16': 'SQfp16', 'int8': 'SQ8'}[dtype]
+    if kind == 'flat':
+        return storage
+    if kind == 'hnsw':
+        return f"HNSW{params['hnsw_m']},{storage}"
+    if kind == 'ivfpq':
+        return f"IVF{params['nlist']},PQ{params['pq_m']}x{params['pq_bits']}"
+    return f"IVF{params['nlist']},{storage}"
+
 
 class FaissIndexWrapper:
-    def __init__(self, embeddings: np.ndarray):
+    def __init__(self, embeddings: np.ndarray, dtype: str = 'float32', kind: str = 'flat', **params):
         d = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(d)
+        self.dtype = dtype
+        self.kind = kind
+        self.params = index_params(kind, len(embeddings), d, dtype, **params)
+        self.source = embeddings
         # we will store normalized vectors to use inner product as cosine
-        emb = embeddings.astype('float32')
-        # normalize
-        norms = np.linalg.norm(emb, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        emb = emb / norms
+        emb = _normalized(embeddings)
+        if kind == 'flat' and dtype == 'float32':
+            self.index = faiss.IndexFlatIP(d)
+        else:
+            self.index = faiss.index_factory(d, _faiss_factory(kind, dtype, self.params), faiss.METRIC_INNER_PRODUCT)
+        if kind == 'hnsw':
+            self.index.hnsw.efConstruction = self.params['ef_construction']
+        if not self.index.is_trained:
+            self.index.train(emb)
         self.index.add(emb)
+        self.set_params(**params)
+
+    def set_params(self, **params) -> None:
+        # Parametros de consulta: nprobe (listas IVF visitadas) y ef_search (HNSW).
+        q = _query_params(params)
+        if self.kind in ('ivf', 'ivfpq'):
+            faiss.extract_index_ivf(self.index).nprobe = q['nprobe']
+        elif self.kind == 'hnsw':
+            self.index.hnsw.efSearch = q['ef_search']
+
+    @property
+    def exact_scores(self) -> bool:
+        return self.dtype == 'float32' and self.kind != 'ivfpq'
+
+    def memory_bytes(self) -> int:
+        if self.kind == 'flat':
+            return self.index.ntotal * self.index.code_size
+        # Incluye listas invertidas / grafo HNSW: se mide el indice serializado.
+        return int(faiss.serialize_index(self.index).nbytes)
+
+    def save(self, index_dir: Path) -> None:
+        faiss.write_index(self.index, str(index_dir / 'index.faiss'))
+
+    @classmethod
+    def load(cls, index_dir: Path, embeddings: np.ndarray, dtype: str, kind: str = 'flat', params: dict = None):
+        # IO_FLAG_MMAP: los codigos se mapean desde el archivo en lugar de copiarse.
+        self = cls.__new__(cls)
+        self.dtype = dtype
+        self.kind = kind
+        self.params = params or {}
+        self.source = embeddings
+        self.index = faiss.read_index(str(index_dir / 'index.faiss'), faiss.IO_FLAG_MMAP)
+        self.set_params()
+        return self
 
     def search(self, q: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
-        q = q.astype('float32')
-        q_norm = q / (np.linalg.norm(q) + 1e-12)
-        D, I = self.index.search(q_norm.reshape(1, -1), top_k)
-        return [(int(I[0, i]), float(D[0, i])) for i in range(len(I[0]))]
+        return self.search_batch(q.reshape(1, -1), top_k)[0]
+
+    def search_batch(self, queries: np.ndarray, top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        # Todas las consultas en una sola llamada a FAISS.
+        q_norm = _normalized_queries(queries)
+        if not self.exact_scores:
+            k = min(self.index.ntotal, top_k * RESCORE_FACTOR)
+            D, I = self.index.search(q_norm, k)
+            return [rescore(self.source, ids[ids >= 0], q, top_k) for ids, q in zip(I, q_norm)]
+        D, I = self.index.search(q_norm, top_k)
+        return [[(int(i), float(s)) for i, s in zip(ids, sims) if i >= 0] for ids, sims in zip(I, D)]
 
 
 class NumpyIndex:
-    def __init__(self, embeddings: np.ndarray):
-        emb = embeddings.astype('float32')
-        norms = np.linalg.norm(emb, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        self.emb = emb / norms
+    kind = 'flat'
+    params: dict = {}
+
+    def __init__(self, embeddings: np.ndarray, dtype: str = 'float32'):
+        self.emb, self.scales = quantize(embeddings, dtype)
+        self.dtype = dtype
+        self.source = embeddings
+
+    def set_params(self, **params) -> None:
+        pass
+
+    def memory_bytes(self) -> int:
+        return self.emb.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def save(self, index_dir: Path) -> None:
+        np.save(index_dir / 'vectors.npy', self.emb)
+        if self.scales is not None:
+            np.save(index_dir / 'scales.npy', self.scales)
+
+    @classmethod
+    def load(cls, index_dir: Path, embeddings: np.ndarray, dtype: str, kind: str = 'flat', params: dict = None):
+        self = cls.__new__(cls)
+        self.dtype = dtype
+        self.source = embeddings
+        self.emb = np.load(index_dir / 'vectors.npy', mmap_mode='r')
+        self.scales = np.load(index_dir / 'scales.npy') if dtype == 'int8' else None
+        return self
 
     def search(self, q: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
-        q = q.astype('float32')
-        qn = q / (np.linalg.norm(q) + 1e-12)
-        sims = (self.emb @ qn).astype('float32')
-        idx = np.argsort(-sims)[:top_k]
-        return [(int(i), float(sims[i])) for i in idx]
+        return self.search_batch(q.reshape(1, -1), top_k)[0]
+
+    def search_batch(self, queries: np.ndarray, top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        # Un producto matriz-matriz por grupo de consultas (hasta SCORE_ELEMS similitudes).
+        qn = _normalized_queries(queries)
+        step = max(1, SCORE_ELEMS // max(len(self.emb), 1))
+        results = []
+        for start in range(0, len(qn), step):
+            block = qn[start:start + step]
+            sims = _scores(self.emb, self.scales, block)
+            if self.dtype != 'float32':
+                candidates = top_k_indices(sims, top_k * RESCORE_FACTOR)
+                results.extend(rescore(self.source, c, q, top_k) for c, q in zip(candidates, block))
+                continue
+            for row, idx in zip(sims, top_k_indices(sims, top_k)):
+                results.append([(int(i), float(row[i])) for i in idx])
+        return results
+
 
+def _assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # Centroide mas cercano (mayor producto interno) de cada fila, por bloques.
+    out = np.empty(len(x), dtype='int64')
+    for start in range(0, len(x), BLOCK_ROWS):
+        block = _normalized(x, start, start + BLOCK_ROWS)
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
 
-def build_index(embeddings: np.ndarray):
+
+def kmeans(x: np.ndarray, k: int, iters: int = 20, seed: int = 0) -> np.ndarray:
+    # k-means esferico (centroides normalizados), como la IVF con producto interno de FAISS.
+    rng = np.random.default_rng(seed)
+    x = _normalized(x)
+    centroids = x[np.sort(rng.choice(len(x), size=k, replace=False))]
+    for _ in range(iters):
+        assign = _assign(x, centroids)
+        # Suma por cluster con las filas ordenadas por centroide (np.add.at es muy lento).
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(x[np.argsort(assign, kind='stable')], starts[~empty])
+        # Los centroides vacios se reinician en un punto al azar.
+        sums[empty] = x[rng.choice(len(x), size=int(empty.sum()))]
+        centroids = _normalized(sums)
+    return centroids
+
+
+class NumpyIVFIndex:
+    # IVF en numpy (sin FAISS): k-means sobre el corpus, listas invertidas contiguas
+    # y en cada consulta solo se puntuan las nprobe listas mas cercanas.
+    # Con FAISS ausente se usa tambien para 'ivfpq' y 'hnsw' (solo aplica nlist).
+    def __init__(self, embeddings: np.ndarray, dtype: str = 'float32', kind: str = 'ivf', **params):
+        n, d = embeddings.shape
+        self.dtype = dtype
+        self.kind = kind
+        self.params = {'nlist': index_params('ivf', n, d, dtype, **params)['nlist']}
+        self.source = embeddings
+        # Entrenamiento con una muestra (hasta 64 puntos por lista).
+        rng = np.random.default_rng(0)
+        sample_size = min(n, 64 * self.params['nlist'])
+        sample = np.asarray(embeddings[np.sort(rng.choice(n, size=sample_size, replace=False))], dtype='float32')
+        self.centroids = kmeans(sample, self.params['nlist'])
+        assign = _assign(embeddings, self.centroids)
+        # Las filas de cada lista quedan contiguas: ids[offsets[c]:offsets[c+1]].
+        self.ids = np.argsort(assign, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.params['nlist']))])
+        self.emb, self.scales = quantize(_Rows(embeddings, self.ids), dtype)
+        self.set_params(**params)
+
+    def set_params(self, **params) -> None:
+        self.nprobe = _query_params(params)['nprobe']
+
+    def memory_bytes(self) -> int:
+        extra = self.scales.nbytes if self.scales is not None else 0
+        return self.emb.nbytes + extra + self.centroids.nbytes + self.ids.nbytes + self.offsets.nbytes
+
+    def save(self, index_dir: Path) -> None:
+        np.save(index_dir / 'vectors.npy', self.emb)
+        if self.scales is not None:
+            np.save(index_dir / 'scales.npy', self.scales)
+        np.save(index_dir / 'centroids.npy', self.centroids)
+        np.save(index_dir / 'ids.npy', self.ids)
+        np.save(index_dir / 'offsets.npy', self.offsets)
+
+    @classmethod
+    def load(cls, index_dir: Path, embeddings: np.ndarray, dtype: str, kind: str = 'ivf', params: dict = None):
+        self = cls.__new__(cls)
+        self.dtype = dtype
+        self.kind = kind
+        self.params = params or {}
+        self.source = embeddings
+        self.emb = np.load(index_dir / 'vectors.npy', mmap_mode='r')
+        self.scales = np.load(index_dir / 'scales.npy') if dtype == 'int8' else None
+        self.centroids = np.load(index_dir / 'centroids.npy')
+        self.ids = np.load(index_dir / 'ids.npy', mmap_mode='r')
+        self.offsets = np.load(index_dir / 'offsets.npy')
+        self.set_params()
+        return self
+
+    def search(self, q: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+        return self.search_batch(q.reshape(1, -1), top_k)[0]
+
+    def search_batch(self, queries: np.ndarray, top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        # Los centroides se puntuan para todas las consultas a la vez; las listas
+        # visitadas son distintas por consulta, asi que el resto va una a una.
+        qn = _normalized_queries(queries)
+        probes = top_k_indices(qn @ self.centroids.T, self.nprobe)
+        results = []
+        for q, lists in zip(qn, probes):
+            rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in np.sort(lists)])
+            scales = self.scales[rows] if self.scales is not None else None
+            sims = _scores(self.emb[rows], scales, q[None])[0]
+            if self.dtype != 'float32':
+                candidates = self.ids[rows[top_k_indices(sims, top_k * RESCORE_FACTOR)]]
+                results.append(rescore(self.source, candidates, q, top_k))
+                continue
+            results.append([(int(self.ids[rows[i]]), float(sims[i])) for i in top_k_indices(sims, top_k)])
+        return results
+
+
+class _Rows:
+    # Vista perezosa de embeddings[ids] para quantize(): lee bloque a bloque.
+    def __init__(self, embeddings: np.ndarray, ids: np.ndarray):
+        self.embeddings = embeddings
+        self.ids = ids
+        self.shape = (len(ids), embeddings.shape[1])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, key: slice) -> np.ndarray:
+        return np.asarray(self.embeddings[self.ids[key]], dtype='float32')
+
+
+# Crea el pool de hilos de cada ShardedIndex (dos primeras busquedas a la vez crearian dos).
+# En el hijo de un fork se sustituye: otro hilo del padre podia tenerlo tomado.
+_POOL_LOCK = threading.Lock()
+
+
+def _reset_pool_lock() -> None:
+    global _POOL_LOCK
+    _POOL_LOCK = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pool_lock)
+
+
+def _limit_omp(threads: int) -> None:
+    # Hilos OpenMP de FAISS en este hilo del pool.
     if _HAS_FAISS:
-        return FaissIndexWrapper(embeddings)
-    else:
-        return NumpyIndex(embeddings)
+        faiss.omp_set_num_threads(threads)
+
+
+def shard_bounds(n: int, shards: int) -> List[Tuple[int, int]]:
+    # Rangos de filas [start, end) de cada shard, de tamaños casi iguales.
+    edges = [n * i // shards for i in range(shards + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+class ShardedIndex:
+    # Reparte las filas en shards contiguos, cada uno con su propio indice, y los
+    # busca a la vez en un pool de hilos; cada shard devuelve su top-k y se fusionan.
+    # factory(filas) permite elegir el indice de cada shard (por defecto el de build_index).
+    def __init__(self, embeddings: np.ndarray, shards: int, dtype: str = 'float32', kind: str = 'flat',
+                 factory=None, **params):
+        self.dtype = dtype
+        self.kind = kind
+        self.source = embeddings
+        self.bounds = shard_bounds(len(embeddings), shards)
+        # Slices de un memmap son vistas: los shards no copian el almacen.
+        factory = factory or (lambda rows: _single_index(rows, dtype, kind, **params))
+        self.shards = [factory(embeddings[a:b]) for a, b in self.bounds]
+        self.params = dict(self.shards[0].params, shards=shards)
+        self._pool = None
+        self._pool_pid = None
+
+    def set_params(self, **params) -> None:
+        for shard in self.shards:
+            shard.set_params(**params)
+
+    def memory_bytes(self) -> int:
+        return sum(shard.memory_bytes() for shard in self.shards)
+
+    def save(self, index_dir: Path) -> None:
+        for i, shard in enumerate(self.shards):
+            shard_dir = index_dir / f'shard_{i:03d}'
+            shard_dir.mkdir()
+            shard.save(shard_dir)
+            (shard_dir / 'params.json').write_text(json.dumps(shard.params), encoding='utf-8')
+
+    @classmethod
+    def load(cls, index_dir: Path, embeddings: np.ndarray, dtype: str, kind: str = 'flat', params: dict = None):
+        self = cls.__new__(cls)
+        self.dtype = dtype
+        self.kind = kind
+        self.params = params
+        self.source = embeddings
+        self.bounds = shard_bounds(len(embeddings), params['shards'])
+        self.shards = []
+        for i, (a, b) in enumerate(self.bounds):
+            shard_dir = index_dir / f'shard_{i:03d}'
+            shard_params = json.loads((shard_dir / 'params.json').read_text(encoding='utf-8'))
+            self.shards.append(_index_class(kind).load(shard_dir, embeddings[a:b], dtype, kind, shard_params))
+        self._pool = None
+        self._pool_pid = None
+        return self
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # El pool se crea en el primer uso de cada proceso: tras un fork (serve_workers.py)
+        # los hilos del padre no existen en el hijo y su executor heredado se bloquearia.
+        # Hilos del pool x hilos OpenMP de cada uno <= hilos de FAISS del proceso (los que
+        # fija serve_workers.py --threads) o nucleos: los shards no compiten entre si.
+        pid = os.getpid()
+        if self._pool_pid != pid:
+            with _POOL_LOCK:
+                if self._pool_pid != pid:
+                    budget = faiss.omp_get_max_threads() if _HAS_FAISS else (os.cpu_count() or 1)
+                    workers = max(1, min(len(self.shards), budget))
+                    self._pool = ThreadPoolExecutor(max_workers=workers, initializer=_limit_omp,
+                                                    initargs=(max(1, budget // workers),))
+                    self._pool_pid = pid
+        return self._pool
+
+    def search(self, q: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+        return self.search_batch(q.reshape(1, -1), top_k)[0]
+
+    def search_batch(self, queries: np.ndarray, top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        queries = np.atleast_2d(np.asarray(queries, dtype='float32'))
+        parts = list(self._executor().map(lambda shard: shard.search_batch(queries, top_k), self.shards))
+        results = []
+        for i in range(len(queries)):
+            hits = ((start + idx, score) for (start, _), part in zip(self.bounds, parts) for idx, score in part[i])
+            results.append(heapq.nlargest(top_k, hits, key=lambda hit: hit[1]))
+        return results
+
+
+class StreamingIndex:
+    # Busqueda exacta fuera de memoria: no guarda nada, recorre los shards del almacen
+    # (memmap) por bloques de block_rows filas y mantiene el top-k acumulado de cada
+    # consulta. Un hilo lee los siguientes `readahead` bloques mientras se puntua el
+    # actual. last_stats guarda los bytes leidos y el ritmo (GB/s) de la ultima busqueda.
+    def __init__(self, embeddings: np.ndarray, dtype: str = 'float32', kind: str = 'stream', **params):
+        index_params('stream', len(embeddings), embeddings.shape[1], dtype, **params)
+        self.dtype = dtype
+        self.kind = kind
+        self.params = {}
+        self.source = embeddings
+        # ShardedMatrix (varios shards) expone sus memmaps en .parts
+        self.parts = getattr(embeddings, 'parts', [embeddings])
+        self.last_stats: Dict[str, float] = {}
+        self.set_params(**params)
+
+    def set_params(self, **params) -> None:
+        q = _query_params(params)
+        self.block_rows = max(1, q['block_rows'])
+        self.readahead = max(0, q['readahead'])
+
+    def memory_bytes(self) -> int:
+        # Solo los bloques en vuelo: el actual y los leidos por adelantado.
+        d = self.source.shape[1]
+        return min(len(self.source), self.block_rows * (1 + self.readahead)) * d * 4
+
+    def save(self, index_dir: Path) -> None:
+        pass
+
+    @classmethod
+    def load(cls, index_dir: Path, embeddings: np.ndarray, dtype: str, kind: str = 'stream', params: dict = None):
+        return cls(embeddings, dtype, kind)
+
+    def _ranges(self):
+        start = 0
+        for part in self.parts:
+            for a in range(0, len(part), self.block_rows):
+                yield part, start + a, a, min(a + self.block_rows, len(part))
+            start += len(part)
+
+    @staticmethod
+    def _read(part: np.ndarray, a: int, b: int) -> np.ndarray:
+        # La copia fuerza la lectura del disco (en el hilo de lectura anticipada).
+        return np.array(part[a:b], dtype='float32')
+
+    def _blocks(self):
+        # (fila global inicial, bloque float32), leyendo `readahead` bloques por delante.
+        ranges = self._ranges()
+        if not self.readahead:
+            for part, start, a, b in ranges:
+                yield start, self._read(part, a, b)
+            return
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = deque()
+            for part, start, a, b in ranges:
+                pending.append((start, pool.submit(self._read, part, a, b)))
+                if len(pending) > self.readahead:
+                    start0, future = pending.popleft()
+                    yield start0, future.result()
+            while pending:
+                start0, future = pending.popleft()
+                yield start0, future.result()
+
+    def search(self, q: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+        return self.search_batch(q.reshape(1, -1), top_k)[0]
+
+    def search_batch(self, queries: np.ndarray, top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        qn = _normalized_queries(queries)
+        best_scores = np.empty((len(qn), 0), dtype='float32')
+        best_ids = np.empty((len(qn), 0), dtype=np.int64)
+        scanned = 0
+        t0 = time.perf_counter()
+        for start, block in self._blocks():
+            scanned += block.nbytes
+            norms = np.linalg.norm(block, axis=1)
+            norms[norms == 0] = 1.0
+            sims = (qn @ block.T) / norms
+            # Top-k del bloque y fusion con el acumulado: nunca mas de 2k por consulta.
+            idx = top_k_indices(sims, top_k)
+            scores = np.concatenate([best_scores, np.take_along_axis(sims, idx, axis=1)], axis=1)
+            ids = np.concatenate([best_ids, start + idx], axis=1)
+            keep = top_k_indices(scores, top_k)
+            best_scores = np.take_along_axis(scores, keep, axis=1)
+            best_ids = np.take_along_axis(ids, keep, axis=1)
+        elapsed = time.perf_counter() - t0
+        self.last_stats = {'bytes': scanned, 'seconds': elapsed, 'gbps': scanned / max(elapsed, 1e-9) / 1e9}
+        return [[(int(i), float(sc)) for i, sc in zip(ids, scores)] for ids, scores in zip(best_ids, best_scores)]
+
+
+# Bits a 1 de cada byte, para numpy sin np.bitwise_count (< 2.0)
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x)
+    return _POPCOUNT[x.view(np.uint8)].reshape(x.shape + (-1,)).sum(axis=-1, dtype=np.uint8)
+
+
+def binarize(embeddings: np.ndarray, center: np.ndarray) -> np.ndarray:
+    # Codigos de 1 bit por dimension (signo de v - center) empaquetados en palabras
+    # uint64 y guardados por palabra: (palabras, n). Cada palabra de todos los vectores
+    # queda contigua y el XOR + popcount recorre memoria seguida.
+    n, d = embeddings.shape
+    width = -(-d // 64) * 8
+    codes = np.zeros((n, width), dtype=np.uint8)
+    for start in range(0, n, BLOCK_ROWS):
+        block = _normalized(embeddings, start, start + BLOCK_ROWS)
+        codes[start:start + len(block), :-(-d // 8)] = np.packbits(block > center, axis=1)
+    return np.ascontiguousarray(codes.view(np.uint64).T)
+
+
+def hamming(codes: np.ndarray, qcodes: np.ndarray) -> np.ndarray:
+    # Distancias de Hamming (m, n) entre las consultas qcodes (palabras, m) y codes
+    # (palabras, n): XOR y popcount palabra a palabra, por bloques de filas.
+    words, m = qcodes.shape
+    out = np.empty((m, codes.shape[1]), dtype=np.uint16)
+    step = 4 * BLOCK_ROWS
+    for start in range(0, codes.shape[1], step):
+        acc = out[:, start:start + step]
+        acc[:] = 0
+        for w in range(words):
+            acc += _popcount(np.asarray(codes[w, start:start + step])[None] ^ qcodes[w, :, None])
+    return out
+
+
+class BinaryIndex:
+    # Prefiltro binario: 1 bit por dimension (signo respecto a la media del corpus, que
+    # reparte mejor los bits que el signo en bruto). Cada consulta recorre los codigos
+    # por distancia de Hamming y los `rerank` mas cercanos se recalculan exactos con los
+    # float32 del almacen; rerank controla el compromiso entre recall y latencia.
+    def __init__(self, embeddings: np.ndarray, dtype: str = 'float32', kind: str = 'binary', **params):
+        index_params('binary', len(embeddings), embeddings.shape[1], dtype, **params)
+        self.dtype = dtype
+        self.kind = kind
+        self.params = {}
+        self.source = embeddings
+        self.center = np.zeros(embeddings.shape[1], dtype='float32')
+        for start in range(0, len(embeddings), BLOCK_ROWS):
+            self.center += _normalized(embeddings, start, start + BLOCK_ROWS).sum(axis=0)
+        self.center /= max(len(embeddings), 1)
+        self.codes = binarize(embeddings, self.center)
+        self.set_params(**params)
+
+    def set_params(self, **params) -> None:
+        self.rerank = max(1, _query_params(params)['rerank'])
+
+    def memory_bytes(self) -> int:
+        return self.codes.nbytes + self.center.nbytes
+
+    def save(self, index_dir: Path) -> None:
+        np.save(index_dir / 'codes.npy', self.codes)
+        np.save(index_dir / 'center.npy', self.center)
+
+    @classmethod
+    def load(cls, index_dir: Path, embeddings: np.ndarray, dtype: str, kind: str = 'binary', params: dict = None):
+        self = cls.__new__(cls)
+        self.dtype = dtype
+        self.kind = kind
+        self.params = params or {}
+        self.source = embeddings
+        self.codes = np.load(index_dir / 'codes.npy', mmap_mode='r')
+        self.center = np.load(index_dir / 'center.npy')
+        self.set_params()
+        return self
+
+    def search(self, q: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+        return self.search_batch(q.reshape(1, -1), top_k)[0]
+
+    def search_batch(self, queries: np.ndarray, top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        qn = _normalized_queries(queries)
+        qcodes = binarize(qn, self.center)
+        step = max(1, SCORE_ELEMS // max(self.codes.shape[1], 1))
+        results = []
+        for start in range(0, len(qn), step):
+            dist = hamming(self.codes, qcodes[:, start:start + step])
+            candidates = top_k_indices(-dist.astype(np.int32), max(top_k, self.rerank))
+            results.extend(rescore(self.source, c, q, top_k) for c, q in zip(candidates, qn[start:start + step]))
+        return results
+
+
+def fit_pca(embeddings: np.ndarray, dim: int, sample: int = 65536, seed: int = 0) -> Tuple[np.ndarray, float]:
+    # Ejes principales (dim, d) de los vectores normalizados y fraccion de energia que
+    # conservan. Sin centrar (matriz de segundos momentos): asi el producto interno
+    # proyectado aproxima el coseno original, que es lo que se busca.
+    rng = np.random.default_rng(seed)
+    n, d = embeddings.shape
+    rows = np.sort(rng.choice(n, size=min(n, sample), replace=False))
+    x = _Rows(embeddings, rows)
+    moments = np.zeros((d, d), dtype='float64')
+    for start in range(0, len(x), BLOCK_ROWS):
+        block = _normalized(x, start, start + BLOCK_ROWS)
+        moments += block.T.astype('float64') @ block
+    values, vectors = np.linalg.eigh(moments)
+    order = np.argsort(values)[::-1][:dim]
+    energy = float(values[order].sum() / max(values.sum(), 1e-12))
+    return np.ascontiguousarray(vectors[:, order].T, dtype='float32'), energy
+
+
+def project(embeddings: np.ndarray, components: np.ndarray) -> np.ndarray:
+    # Vectores normalizados proyectados sobre los ejes (n, dim), por bloques.
+    out = np.empty((len(embeddings), len(components)), dtype='float32')
+    for start in range(0, len(embeddings), BLOCK_ROWS):
+        block = _normalized(embeddings, start, start + BLOCK_ROWS)
+        out[start:start + len(block)] = block @ components.T
+    return out
+
+
+class Projected:
+    # Vista de solo lectura de project(embeddings, components) que proyecta solo las filas
+    # que se piden: el indice interno de PCAIndex la usa como fuente (al construirse y
+    # para recalcular sus candidatos) sin otra copia (n, pca_dim) en RAM ni en disco.
+    def __init__(self, embeddings: np.ndarray, components: np.ndarray):
+        self.embeddings = embeddings
+        self.components = components
+        self.dtype = np.dtype('float32')
+        self.shape = (len(embeddings), len(components))
+        self.ndim = 2
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        out = project(self.embeddings, self.components)
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.step in (None, 1):
+            return Projected(self.embeddings[key], self.components)
+        idx = np.asarray(key)
+        if idx.ndim == 0:
+            return self[idx[None]][0]
+        return project(np.asarray(self.embeddings[idx], dtype='float32'), self.components)
+
+
+class PCAIndex:
+    # Indice sobre los vectores reducidos a pca_dim dimensiones. Solo guarda la proyeccion
+    # y el indice interno, construido sobre Projected (los reducidos se calculan desde el
+    # almacen cuando hacen falta); cada consulta se proyecta igual, el indice interno da
+    # top_k * RESCORE_FACTOR candidatos y se recalculan exactos con los float32 originales.
+    # factory(reducidos) permite elegir el indice interno (por defecto el de build_index).
+    def __init__(self, embeddings: np.ndarray, pca_dim: int, dtype: str = 'float32', kind: str = 'flat',
+                 factory=None, **params):
+        self.dtype = dtype
+        self.kind = kind
+        self.source = embeddings
+        self.components, self.energy = fit_pca(embeddings, pca_dim)
+        factory = factory or (lambda rows: build_index(rows, dtype, kind, **params))
+        self.inner = factory(Projected(embeddings, self.components))
+        self.params = dict(self.inner.params, pca_dim=pca_dim)
+
+    def set_params(self, **params) -> None:
+        self.inner.set_params(**params)
+
+    def memory_bytes(self) -> int:
+        return self.inner.memory_bytes() + self.components.nbytes
+
+    def save(self, index_dir: Path) -> None:
+        np.save(index_dir / 'components.npy', self.components)
+        (index_dir / 'reduced').mkdir()
+        self.inner.save(index_dir / 'reduced')
+
+    @classmethod
+    def load(cls, index_dir: Path, embeddings: np.ndarray, dtype: str, kind: str = 'flat', params: dict = None):
+        self = cls.__new__(cls)
+        self.dtype = dtype
+        self.kind = kind
+        self.params = params
+        self.source = embeddings
+        self.components = np.load(index_dir / 'components.npy')
+        self.energy = None
+        inner = {k: v for k, v in params.items() if k != 'pca_dim'}
+        self.inner = _index_class(kind, inner.get('shards', 1)).load(
+            index_dir / 'reduced', Projected(embeddings, self.components), dtype, kind, inner)
+        return self
+
+    def search(self, q: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+        return self.search_batch(q.reshape(1, -1), top_k)[0]
+
+    def search_batch(self, queries: np.ndarray, top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        qn = _normalized_queries(queries)
+        parts = self.inner.search_batch(qn @ self.components.T, top_k * RESCORE_FACTOR)
+        return [rescore(self.source, np.array([i for i, _ in hits], dtype=np.int64), q, top_k)
+                for hits, q in zip(parts, qn)]
+
+
+def _single_index(embeddings: np.ndarray, dtype: str = 'float32', kind: str = 'flat', **params):
+    if kind == 'stream':
+        return StreamingIndex(embeddings, dtype, kind, **params)
+    if kind == 'binary':
+        return BinaryIndex(embeddings, dtype, kind, **params)
+    if _HAS_FAISS:
+        return FaissIndexWrapper(embeddings, dtype, kind, **params)
+    if kind == 'flat':
+        return NumpyIndex(embeddings, dtype)
+    return NumpyIVFIndex(embeddings, dtype, kind, **params)
+
+
+def build_index(embeddings: np.ndarray, dtype: str = 'float32', kind: str = 'flat', **params):
+    # kind: 'flat' (exacto), 'ivf', 'ivfpq', 'hnsw', 'stream' o 'binary'; params: ver BUILD_PARAMS y QUERY_PARAMS.
+    # shards > 1 devuelve un ShardedIndex con ese numero de shards del mismo tipo y
+    # pca_dim un PCAIndex que indexa los vectores proyectados a esa dimension.
+    index_params(kind, len(embeddings), embeddings.shape[1], dtype, **params)
+    pca_dim = params.pop('pca_dim', None)
+    if pca_dim:
+        return PCAIndex(embeddings, pca_dim, dtype, kind, **params)
+    shards = min(params.pop('shards', None) or 1, max(len(embeddings), 1))
+    if shards > 1:
+        return ShardedIndex(embeddings, shards, dtype, kind, **params)
+    return _single_index(embeddings, dtype, kind, **params)
+
+
+def _index_class(kind: str, shards: int = 1, pca_dim: Optional[int] = None):
+    if pca_dim:
+        return PCAIndex
+    if shards > 1:
+        return ShardedIndex
+    if kind == 'stream':
+        return StreamingIndex
+    if kind == 'binary':
+        return BinaryIndex
+    if _HAS_FAISS:
+        return FaissIndexWrapper
+    return NumpyIndex if kind == 'flat' else NumpyIVFIndex
+
+
+def _manifest(fingerprint: dict, dtype: str, kind: str, params: dict) -> dict:
+    return dict(fingerprint, dtype=dtype, kind=kind, params=params, backend='faiss' if _HAS_FAISS else 'numpy')
+
+
+def save_index(index, index_dir: Path, fingerprint: dict) -> None:
+    # Escribe el indice en un directorio temporal y lo sustituye de golpe;
+    # el manifiesto con la huella es lo ultimo que se escribe.
+    index_dir = Path(index_dir)
+    tmp = index_dir.with_name(index_dir.name + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    index.save(tmp)
+    manifest = _manifest(fingerprint, index.dtype, index.kind, index.params)
+    (tmp / INDEX_MANIFEST).write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    if index_dir.exists():
+        shutil.rmtree(index_dir)
+    os.replace(tmp, index_dir)
+
+
+def load_index(index_dir: Path, embeddings: np.ndarray, fingerprint: dict, dtype: str = 'float32',
+               kind: str = 'flat', **params):
+    # Devuelve el indice guardado, o None si no existe, su huella no coincide o se
+    # piden parametros de construccion distintos (los no indicados se toman del manifiesto).
+    index_params(kind, fingerprint['chunks'], fingerprint['dim'], dtype, **params)
+    manifest_path = Path(index_dir) / INDEX_MANIFEST
+    if not manifest_path.exists():
+        return None
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    except json.JSONDecodeError:
+        return None
+    build = manifest.get('params', {})
+    if manifest != _manifest(fingerprint, dtype, kind, build):
+        return None
+    requested = {k: v for k, v in params.items() if k in BUILD_PARAMS and v is not None}
+    for key in ('shards', 'pca_dim'):
+        if requested.pop(key, build.get(key, BUILD_PARAMS[key])) != build.get(key, BUILD_PARAMS[key]):
+            return None
+    if any(k in build and build[k] != v for k, v in requested.items()):
+        return None
+    index = _index_class(kind, build.get('shards', 1), build.get('pca_dim')).load(Path(index_dir), embeddings,
+                                                                                 dtype, kind, build)
+    index.set_params(**params)
+    return index
+
+
+def load_or_build_index(embeddings: np.ndarray, index_dir: Path, fingerprint: dict, dtype: str = 'float32',
+                        kind: str = 'flat', **params):
+    # Carga el indice persistido; si falta o esta desactualizado lo construye y lo guarda.
+    index = load_index(index_dir, embeddings, fingerprint, dtype, kind, **params)
+    if index is not None:
+        return index
+    index = build_index(embeddings, dtype, kind, **params)
+    try:
+        save_index(index, index_dir, fingerprint)
+    except OSError as e:
+        print(f'Aviso: no se pudo guardar el indice en {index_dir}: {e}')
+    return index
 
 
 def search(index, query_embedding: np.ndarray, top_k: int = 5):
     return index.search(query_embedding, top_k=top_k)
+
+
+def search_batch(index, query_embeddings: np.ndarray, top_k: int = 5):
+    # Una lista de resultados (idx, score) por fila de query_embeddings.
+    return index.search_batch(query_embeddings, top_k=top_k)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# Servidor multi-proceso de app_flask_fixed.py con precarga y fork (estilo "preload" de gunicorn).
+# El proceso padre carga una sola vez embeddings, metadata, modelo, indices y caches
+# (importando app_flask_fixed) y luego crea --workers procesos con fork. Los hijos comparten
+# esas paginas con el padre (copia en escritura; la busqueda y el modelo solo las leen) y
+# los memmaps de Data/embeddings y Data/index son la misma cache de paginas del sistema:
+# N workers ocupan poco mas que uno. Todos aceptan conexiones del mismo socket.
+# Cada worker limita sus hilos de torch, FAISS y BLAS a --threads (por defecto nucleos / workers)
+# para que entre todos no haya mas hilos de calculo que nucleos.
+# Uso: python scripts/serve_workers.py [--workers 4] [--threads 1] [--port 5000]
+#
+# Solo en sistemas con fork (Linux, macOS). Las caches de consultas son de cada worker y
+# /api/stats muestra las del worker que atiende; solo el worker 0 guarda la cache semantica.
+
+import argparse
+import gc
+import os
+from pathlib import Path
+import signal
+import socket
+import sys
+import time
+
+# Asegurar import local de app_flask_fixed
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Variables de los pools de hilos de OpenMP/BLAS: se leen al cargar las librerias.
+THREAD_ENV = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+# Segundos que se espera a los workers al parar antes de matarlos
+STOP_TIMEOUT = 10.0
+# Pausa antes de reponer un worker caido (evita un bucle de forks si falla al arrancar)
+RESPAWN_DELAY = 1.0
+
+
+def limit_threads(threads: int) -> None:
+    # Hilos de calculo de torch y FAISS en este proceso (los que esten importados).
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+    if 'faiss' in sys.modules:
+        sys.modules['faiss'].omp_set_num_threads(threads)
+
+
+def run_worker(core, sock: socket.socket, slot: int, threads: int, semantic_path) -> None:
+    # Cuerpo de cada hijo tras el fork: no devuelve, termina con os._exit.
+    from werkzeug.serving import make_server
+    import micro_batch
+
+    status = 0
+    try:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        limit_threads(threads)
+        # Los hilos no sobreviven al fork: el micro-lote necesita uno nuevo en cada hijo.
+        core.BATCHER = micro_batch.MicroBatcher(core.encode_and_search, core.BATCH_MAX, core.BATCH_WAIT_MS)
+        # Un solo escritor para Data/semantic_cache.npz
+        core.SEMANTIC.path = None if slot else semantic_path
+        server = make_server('', 0, core.APP, threaded=True, fd=sock.fileno())
+        server.serve_forever()
+    except SystemExit:
+        pass
+    except Exception as e:
+        print(f'Worker {slot} ({os.getpid()}): {e}', file=sys.stderr)
+        status = 1
+    finally:
+        try:
+            core.SEMANTIC.save()
+        finally:
+            sys.stdout.flush()
+            os._exit(status)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Sirve app_flask_fixed.py con varios procesos que comparten '
+                                                 'modelo e indice (precarga + fork)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=2, help='Procesos que atienden peticiones')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Hilos de torch/FAISS/BLAS por worker (por defecto nucleos / workers)')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        print('ERROR: este sistema no tiene fork; usa app_flask_fixed.py o app_asgi.py')
+        return 2
+    if args.workers < 1:
+        print('ERROR: --workers debe ser >= 1')
+        return 2
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    for name in THREAD_ENV:
+        os.environ[name] = str(threads)
+    # Los tokenizers de HF paralelos no son seguros tras fork
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+    # Socket antes de cargar nada: si el puerto esta ocupado se falla al momento.
+    try:
+        sock = socket.create_server((args.host, args.port), backlog=1024)
+    except OSError as e:
+        print(f'ERROR: no se puede escuchar en {args.host}:{args.port}: {e}')
+        return 2
+    sock.set_inheritable(True)
+
+    # Precarga con un solo hilo de torch: si el padre arranca el pool de OpenMP, los hijos
+    # pueden bloquearse al usarlo tras el fork (ver generate_embeddings.py).
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    import app_flask_fixed as core
+    if core.SEARCH_MODE != 'dense':
+        # El indice BM25 se usara en cada peticion: se carga antes del fork para compartirlo.
+        core.get_lexical()
+    limit_threads(1)
+    # Los objetos cargados pasan a la generacion permanente: el recolector de los hijos no
+    # los recorre y no ensucia (copia) sus paginas.
+    gc.collect()
+    gc.freeze()
+
+    workers = {}
+    semantic_path = core.SEMANTIC.path
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            run_worker(core, sock, slot, threads, semantic_path)
+        workers[pid] = slot
+
+    for slot in range(args.workers):
+        spawn(slot)
+    # La cache semantica la guarda el worker 0; el padre no debe sobrescribirla al salir.
+    core.SEMANTIC.path = None
+    print(f'✅ {args.workers} workers ({threads} hilos cada uno) en http://{args.host}:{args.port}')
+    print('Presiona CTRL+C para detener')
+
+    deadline = None
+
+    def stop(*_):
+        nonlocal deadline
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if deadline is not None and time.monotonic() > deadline:
+                for pid in workers:
+                    os.kill(pid, signal.SIGKILL)
+            time.sleep(0.1)
+            continue
+        slot = workers.pop(pid)
+        if deadline is None:
+            # Un worker caido se repone con otro fork: el padre sigue teniendo todo cargado.
+            print(f'Worker {slot} ({pid}) terminado (estado {status}); se reinicia', file=sys.stderr)
+            time.sleep(RESPAWN_DELAY)
+            spawn(slot)
+    sock.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+from pathlib import Path
+import sys
+
+import nltk
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'scripts'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import chunk_text
+import legacy_chunk_text
+
+BOOK = ROOT / 'Data' / 'FUNDAMENTO+DE+LA+IA+volumen+I.txt'
+
+# Bloques sin oraciones al principio y en medio, abreviaturas y parrafos de una linea.
+SAMPLE = ('   \n\n  \n\nEl Sr. Pérez estudió IA en la U. de Chile.  Luego, etc. volvió.\n\n\n\n'
+          'Capítulo 2\n\nLa búsqueda A* es óptima. ¿Por qué? Porque h(n) es admisible.\n\n \n\n'
+          'Fin del texto sin punto final')
+
+_PUNKT = PunktSentenceTokenizer()
+
+
+def _untrained_sent_tokenize(text, language='english'):
+    return _PUNKT.tokenize(text)
+
+
+@pytest.fixture(autouse=True)
+def punkt(monkeypatch):
+    # Sin los datos 'punkt' (sin red) se usa Punkt sin entrenar: el mismo algoritmo, que
+    # tambien mira la oracion siguiente para decidir cada corte.
+    try:
+        nltk.sent_tokenize('Hola.')
+    except LookupError:
+        monkeypatch.setattr(nltk, 'sent_tokenize', _untrained_sent_tokenize)
+
+
+@pytest.fixture(scope='module')
+def book():
+    if not BOOK.exists():
+        pytest.skip(f'falta {BOOK}')
+    return BOOK.read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('block_chars', [1, 7, 64, 1000, chunk_text.BLOCK_CHARS])
+def test_sentences_match_baseline_sample(block_chars, workers):
+    blocks = chunk_text.iter_text_blocks(SAMPLE, block_chars)
+    assert list(chunk_text.iter_sentences(blocks, workers)) == nltk.sent_tokenize(SAMPLE)
+
+
+@pytest.mark.parametrize('width', [1, 5, 33])
+def test_sentences_arbitrary_blocks(width):
+    # Cortes en cualquier posicion, como las paginas unidas de ingest_corpus.py.
+    blocks = [SAMPLE[i:i + width] for i in range(0, len(SAMPLE), width)]
+    assert list(chunk_text.iter_sentences(blocks)) == nltk.sent_tokenize(SAMPLE)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('block_chars', [1, 512, 4096])
+def test_chunks_match_baseline_book_prefix(book, block_chars, workers):
+    text = book[:40000]
+    blocks = chunk_text.iter_text_blocks(text, block_chars)
+    chunks = list(chunk_text.iter_chunks(chunk_text.iter_sentences(blocks, workers)))
+    assert chunks == legacy_chunk_text.chunk_text(text)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_chunk_text_matches_baseline_book(book, workers):
+    assert chunk_text.chunk_text(book, workers=workers) == legacy_chunk_text.chunk_text(book)
+
+
+def test_iter_text_blocks_reproduce_text(tmp_path):
+    path = tmp_path / 'libro.txt'
+    path.write_text(SAMPLE, encoding='utf-8')
+    assert ''.join(chunk_text.iter_text_blocks(path, 7)) == SAMPLE
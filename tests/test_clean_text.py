@@ -0,0 +1,105 @@
+import json
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'scripts'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import clean_text
+import legacy_clean_text
+
+BOOK = ROOT / 'Data' / 'FUNDAMENTO+DE+LA+IA+volumen+I.txt'
+
+SAMPLE = '''FUNDAMENTOS DE LA INTELIGENCIA ARTIFICIAL: UNA VISION INTRODUCTORIA
+Volumen I
+ISBN 978-9-87-123456-7
+
+- 12 -
+
+A mis hijos,
+y a los lectores de Russell y Norvig
+
+PATRICIO XAVIER MORENO VALLEJO
+GISEL KATERINE BASTIDAS GUACHO
+PATRICIO RENÉ MORENO COSTALES
+
+La inteligencia artificial estudia agentes que perciben su entorno [1] y actúan
+sobre él. Ver https://example.org/ia para más detalles , y la pág. 23 del capí-
+tulo anterior   sobre búsqueda .
+
+CAPITULO DOS
+
+Introducción ............ 14
+El perceptrón es un clasificador lineal • propuesto por Rosenblatt en 1958.
+'''
+
+
+@pytest.fixture(scope='module')
+def book():
+    if not BOOK.exists():
+        pytest.skip(f'falta {BOOK}')
+    return BOOK.read_text(encoding='utf-8')
+
+
+def test_clean_text_matches_baseline(book):
+    assert clean_text.clean_text(book) == legacy_clean_text.clean_text(book)
+
+
+def test_clean_text_matches_baseline_sample():
+    assert clean_text.clean_text(SAMPLE) == legacy_clean_text.clean_text(SAMPLE)
+
+
+@pytest.mark.parametrize('block_chars', [0, 1000, clean_text.BLOCK_CHARS])
+def test_clean_pages_page_split(book, block_chars):
+    expected = legacy_clean_text.clean_text(book)
+    blocks = clean_text.clean_pages(book.split('\n\n'), block_chars=block_chars)
+    assert '\n'.join(blocks) == expected
+
+
+@pytest.mark.parametrize('block_chars', [0, 1000, clean_text.BLOCK_CHARS])
+def test_clean_pages_line_split(book, block_chars):
+    expected = legacy_clean_text.clean_text(book)
+    blocks = clean_text.clean_pages(book.split('\n'), sep='\n', block_chars=block_chars)
+    assert '\n'.join(blocks) == expected
+
+
+@pytest.mark.parametrize('sep', ['\n\n', '\n'])
+def test_clean_pages_sample(sep):
+    # Cortes en cada pagina: reglas que cruzan uniones (titulo, autores, dedicatoria, guiones).
+    expected = legacy_clean_text.clean_text(SAMPLE)
+    assert '\n'.join(clean_text.clean_pages(SAMPLE.split(sep), sep=sep, block_chars=0)) == expected
+
+
+def _ungrouped(config):
+    # Mismo conjunto de reglas, una pasada por regla (como antes de los grupos).
+    return clean_text.RuleSet({k: [{x: y for x, y in e.items() if x != 'group'} for e in v] if isinstance(v, list) else v
+                               for k, v in config.items()})
+
+
+@pytest.mark.parametrize('name', ['fundamentos_ia.json', 'generic.json'])
+def test_grouped_rules_match_sequential(name):
+    config = json.loads((clean_text.RULES_DIR / name).read_text(encoding='utf-8'))
+    grouped, sequential = clean_text.RuleSet(config), _ungrouped(config)
+    assert len(grouped.pre) < len(sequential.pre)
+    for text in [SAMPLE, SAMPLE.upper(), SAMPLE.replace('\n', '\n\n'), 'ISBN: 1-2 ISBN 3 isbn x: 4\nTomo 1 Volumen I']:
+        assert clean_text.clean_text(text, grouped) == clean_text.clean_text(text, sequential)
+
+
+def test_fuse_dispatches_replacement():
+    rules = clean_text._compile_rules([
+        {'name': 'a', 'group': 'g', 'pattern': '(x+)(y)', 'repl': r'\2\1'},
+        {'name': 'b', 'group': 'g', 'pattern': 'hola!', 'repl': 'HOLA'},
+        {'name': 'c', 'group': 'g', 'pattern': '(z)', 'repl': r'[\g<1>]'},
+        {'name': 'd', 'pattern': 'q'},
+    ])
+    assert [r[0] for r in rules] == ['g', 'd']
+    rs = clean_text.RuleSet({})
+    assert rs.apply(rules, 'xxy\nhola\nz q hola!') == 'yxx\nhola\n[z]  HOLA'
+    timings = {}
+    rs.apply(rules, 'xy', timings)
+    assert set(timings) == {'g', 'd'}
+    with pytest.raises(ValueError):
+        clean_text._compile_rules([{'name': 'a', 'group': 'g', 'pattern': 'a', 'flags': ['IGNORECASE']},
+                                   {'name': 'b', 'group': 'g', 'pattern': 'b'}])
@@ -0,0 +1,41 @@
+import os
+from pathlib import Path
+import sys
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
+import embedding_store
+
+
+def test_npz_fingerprint_hash_cached_by_size_and_mtime(tmp_path, monkeypatch):
+    path = tmp_path / 'embeddings.npz'
+    np.savez_compressed(path, embeddings=np.ones((5, 4), dtype='float32'))
+    fp = embedding_store.fingerprint(path, 'm')
+    assert fp['chunks'] == 5 and fp['dim'] == 4
+    assert (tmp_path / 'embeddings.npz.sha256.json').exists()
+
+    # Segundo arranque: no se vuelve a leer el .npz.
+    def fail(paths):
+        raise AssertionError('npz hasheado otra vez')
+    monkeypatch.setattr(embedding_store, '_file_sha256', fail)
+    assert embedding_store.fingerprint(path, 'm') == fp
+    monkeypatch.undo()
+
+    # Embeddings regenerados: cambia la fecha y se recalcula la huella.
+    np.savez_compressed(path, embeddings=np.zeros((6, 4), dtype='float32'))
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    fp2 = embedding_store.fingerprint(path, 'm')
+    assert fp2['chunks'] == 6 and fp2['embeddings_sha256'] != fp['embeddings_sha256']
+
+
+def test_store_fingerprint_matches_content(tmp_path):
+    emb = np.arange(24, dtype='float32').reshape(6, 4)
+    with embedding_store.EmbeddingStoreWriter(tmp_path / 'emb', 4, 'm', shard_rows=4) as w:
+        w.append(emb)
+    fp = embedding_store.fingerprint(tmp_path / 'emb')
+    assert fp == {'embeddings_sha256': embedding_store._file_sha256(
+        [tmp_path / 'emb' / 'shard_00000.bin', tmp_path / 'emb' / 'shard_00001.bin']),
+        'model': 'm', 'chunks': 6, 'dim': 4}
+    np.testing.assert_array_equal(np.asarray(embedding_store.load_embeddings(tmp_path / 'emb')), emb)
@@ -0,0 +1,46 @@
+from pathlib import Path
+import sys
+
+import PyPDF2
+from PyPDF2.generic import ArrayObject, DecodedStreamObject, NameObject
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
+import extract_pdf
+
+PARTS = [b'BT /F1 12 Tf 72 720 Td (Hola) Tj ET\n', b'BT /F1 12 Tf 72 700 Td (mundo) Tj ET\n']
+
+
+def _stream(writer, data: bytes):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+
+@pytest.fixture
+def multi_stream_pdf(tmp_path):
+    # Una pagina cuyo /Contents es un array de dos flujos (como la portada del libro).
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    writer.pages[0][NameObject('/Contents')] = ArrayObject([_stream(writer, data) for data in PARTS])
+    path = tmp_path / 'multi.pdf'
+    with path.open('wb') as f:
+        writer.write(f)
+    return path
+
+
+@pytest.mark.parametrize('backend', sorted(set(extract_pdf.BACKENDS) & {'pypdf2', 'pypdf'}))
+def test_page_content_concatenates_streams(multi_stream_pdf, backend):
+    doc = extract_pdf.open_backend(multi_stream_pdf, backend)
+    assert isinstance(doc.reader.pages[0]['/Contents'].get_object(), list)
+    assert doc.page_content(0) == b''.join(PARTS)
+    assert extract_pdf.page_hash(doc, 0) is not None
+
+
+def test_multi_stream_page_is_cached(multi_stream_pdf, tmp_path):
+    doc = extract_pdf.open_backend(multi_stream_pdf)
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    text, hit = extract_pdf._extract_page(doc, 0, cache_dir)
+    assert not hit
+    assert extract_pdf._extract_page(doc, 0, cache_dir) == (text, True)
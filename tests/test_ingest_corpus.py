@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+import sys
+
+import nltk
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+from PyPDF2 import PdfWriter
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
+import ingest_corpus
+
+_PUNKT = PunktSentenceTokenizer()
+
+
+def _untrained_sent_tokenize(text, language='english'):
+    return _PUNKT.tokenize(text)
+
+
+@pytest.fixture(autouse=True)
+def punkt(monkeypatch):
+    # Sin los datos 'punkt' (sin red) se usa Punkt sin entrenar (ver test_chunk_text.py).
+    try:
+        nltk.sent_tokenize('Hola.')
+    except LookupError:
+        monkeypatch.setattr(nltk, 'sent_tokenize', _untrained_sent_tokenize)
+
+
+def _pdf(path: Path) -> None:
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    with path.open('wb') as f:
+        writer.write(f)
+
+
+def _ingest(monkeypatch, corpus: Path, out: Path) -> list:
+    monkeypatch.setattr(sys, 'argv', ['ingest_corpus.py', '--corpus', str(corpus), '--out-dir', str(out),
+                                      '--workers', '1', '--no-cache', '--max-chars', '40', '--overlap', '0'])
+    assert ingest_corpus.main() == 0
+    with (out / 'chunks.jsonl').open(encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_directory_skips_text_extracted_from_pdf(tmp_path):
+    # Lo que deja extract_pdf.py por defecto: libro.pdf y libro.txt en la misma carpeta.
+    _pdf(tmp_path / 'libro.pdf')
+    (tmp_path / 'libro.txt').write_text('Texto extraido.', encoding='utf-8')
+    (tmp_path / 'notas.txt').write_text('Notas.', encoding='utf-8')
+    docs = ingest_corpus.load_manifest(tmp_path)
+    assert [(d['id'], Path(d['path']).name) for d in docs] == [('libro', 'libro.pdf'), ('notas', 'notas.txt')]
+
+
+def test_manifest_paths_relative_to_manifest(tmp_path):
+    (tmp_path / 'docs').mkdir()
+    manifest = tmp_path / 'corpus.jsonl'
+    manifest.write_text('{"path": "docs/a.txt", "rules": "reglas/generic.json"}\n', encoding='utf-8')
+    doc, = ingest_corpus.load_manifest(manifest)
+    assert doc == {'path': str(tmp_path / 'docs' / 'a.txt'), 'rules': str(tmp_path / 'reglas' / 'generic.json'),
+                   'id': 'a'}
+
+
+def test_duplicate_id_rejected(tmp_path):
+    manifest = tmp_path / 'corpus.json'
+    manifest.write_text('[{"path": "a.txt"}, {"path": "otra/a.txt"}]', encoding='utf-8')
+    with pytest.raises(ValueError):
+        ingest_corpus.load_manifest(manifest)
+
+
+def test_ingest_ids_and_uids(tmp_path, monkeypatch):
+    corpus = tmp_path / 'corpus'
+    corpus.mkdir()
+    text = 'Primera oración del documento. Segunda oración, algo más larga. Tercera.'
+    # Mismo contenido en a y b: los uid deben seguir siendo unicos.
+    for name in ('a', 'b', 'c'):
+        (corpus / f'{name}.txt').write_text(text if name != 'c' else 'Otro texto. Corto.', encoding='utf-8')
+
+    chunks = _ingest(monkeypatch, corpus, tmp_path / 'out')
+    assert [c['id'] for c in chunks] == list(range(len(chunks)))
+    assert len({c['uid'] for c in chunks}) == len(chunks)
+    by_source = {}
+    for c in chunks:
+        by_source.setdefault(c['source'], []).append(c)
+    assert [c['text'] for c in by_source['a']] == [c['text'] for c in by_source['b']]
+    assert all(c['uid'].startswith(f"{c['source']}:") for c in chunks)
+
+    # Editar 'a' desplaza los id de b y c, pero no cambia sus uid.
+    (corpus / 'a.txt').write_text(text + ' Una oración nueva al final. Y otra más para el cierre.', encoding='utf-8')
+    edited = _ingest(monkeypatch, corpus, tmp_path / 'out2')
+    assert [c['uid'] for c in edited if c['source'] != 'a'] == [c['uid'] for c in chunks if c['source'] != 'a']
+    assert [c['id'] for c in edited if c['source'] == 'b'] != [c['id'] for c in by_source['b']]
+
+    docs = [json.loads(line) for line in (tmp_path / 'out' / 'documents.jsonl').read_text().splitlines()]
+    assert [(d['id'], d['first_chunk'], d['num_chunks']) for d in docs] == [
+        (s, by_source[s][0]['id'], len(by_source[s])) for s in ('a', 'b', 'c')]
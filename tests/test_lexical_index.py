@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
+import lexical_index
+
+TEXTS = [
+    'El perceptrón de Rosenblatt es un clasificador lineal.',
+    'La prueba de Turing evalúa si una máquina piensa.',
+    'Alan Turing propuso su prueba en 1950; Turing es clave en la computación.',
+    'Los agentes inteligentes perciben su entorno.',
+]
+
+
+def _write_chunks(path: Path, texts) -> None:
+    with path.open('w', encoding='utf-8') as f:
+        for i, t in enumerate(texts):
+            f.write(json.dumps({'id': i, 'text': t}, ensure_ascii=False) + '\n')
+
+
+def test_tokenize_folds_accents_and_drops_stopwords():
+    assert lexical_index.tokenize('La Canción del PERCEPTRÓN') == ['cancion', 'perceptron']
+
+
+def test_bm25_ranks_by_term_weight():
+    index = lexical_index.BM25Index(TEXTS)
+    hits = index.search('turing', 5)
+    assert [i for i, _ in hits] == [2, 1]
+    assert hits[0][1] > hits[1][1] > 0
+    assert [i for i, _ in index.search('perceptron', 5)] == [0]
+    assert index.search('de la', 5) == []
+
+
+def test_rrf_fuses_by_rank():
+    fused = lexical_index.rrf([[(1, 0.9), (2, 0.8)], [(2, 12.0), (3, 5.0)]], top_k=3)
+    assert [i for i, _ in fused] == [2, 1, 3]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_retrieve_threshold_only_applies_to_dense():
+    index = lexical_index.BM25Index(TEXTS)
+    dense = lambda q, k: [(3, 0.2), (0, 0.1)][:k]
+    results, accepted = lexical_index.retrieve('dense', 'turing', 2, index, dense, threshold=0.5)
+    assert results == [(3, 0.2), (0, 0.1)] and not accepted
+    results, accepted = lexical_index.retrieve('lexical', 'turing', 2, index, None, threshold=0.5)
+    assert [i for i, _ in results] == [2, 1] and accepted
+    results, accepted = lexical_index.retrieve('hybrid', 'turing', 2, index, dense, threshold=0.5)
+    assert accepted and len(results) == 2
+    with pytest.raises(ValueError):
+        lexical_index.retrieve('otro', 'turing', 2, index, dense)
+
+
+def test_load_or_build_persists_and_rebuilds(tmp_path):
+    chunks = tmp_path / 'chunks.jsonl'
+    _write_chunks(chunks, TEXTS)
+    built = lexical_index.load_or_build_index(chunks, tmp_path / 'lexical')
+    loaded = lexical_index.load_index(tmp_path / 'lexical', lexical_index.fingerprint(chunks))
+    assert loaded is not None and loaded.search('turing', 5) == built.search('turing', 5)
+
+    _write_chunks(chunks, TEXTS + ['Turing otra vez.'])
+    assert lexical_index.load_index(tmp_path / 'lexical', lexical_index.fingerprint(chunks)) is None
+    assert lexical_index.load_or_build_index(chunks, tmp_path / 'lexical').n == 5
@@ -0,0 +1,47 @@
+from pathlib import Path
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
+import micro_batch
+
+
+def test_results_in_order():
+    batcher = micro_batch.MicroBatcher(lambda items: [x * 2 for x in items])
+    assert [batcher(i, timeout=5) for i in range(5)] == [0, 2, 4, 6, 8]
+
+
+def test_concurrent_requests_share_batches():
+    # Mientras fn procesa el primer lote, el resto se acumula en la cola y va junto.
+    started, release = threading.Event(), threading.Event()
+    sizes = []
+
+    def fn(items):
+        sizes.append(len(items))
+        started.set()
+        release.wait(5)
+        return [x + 1 for x in items]
+
+    batcher = micro_batch.MicroBatcher(fn, max_batch=8)
+    first = batcher.submit(0)
+    assert started.wait(5)
+    futures = [batcher.submit(i) for i in range(1, 11)]
+    release.set()
+    assert first.result(5) == 1
+    assert [f.result(5) for f in futures] == list(range(2, 12))
+    assert sizes == [1, 8, 2]
+    assert batcher.stats == {'batches': 3, 'items': 11, 'max_batch': 8}
+
+
+def test_exception_reaches_every_caller():
+    def fn(items):
+        raise ValueError('fallo')
+
+    batcher = micro_batch.MicroBatcher(fn)
+    with pytest.raises(ValueError):
+        batcher('x', timeout=5)
+    # El hilo sigue atendiendo tras un error.
+    batcher.fn = lambda items: items
+    assert batcher('y', timeout=5) == 'y'
@@ -0,0 +1,151 @@
+from pathlib import Path
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'scripts'))
+import query_cache
+
+
+def _unit(*values):
+    v = np.array(values, dtype='float32')
+    return v / np.linalg.norm(v)
+
+
+def _at_distance(base: np.ndarray, distance: float) -> np.ndarray:
+    # Vector a distancia coseno `distance` de base (en el plano de base y un eje ortogonal).
+    ortho = np.zeros_like(base)
+    ortho[np.argmin(np.abs(base))] = 1.0
+    ortho -= (ortho @ base) * base
+    ortho /= np.linalg.norm(ortho)
+    sim = 1.0 - distance
+    return sim * base + np.sqrt(1 - sim ** 2) * ortho
+
+
+def test_normalize_question():
+    assert query_cache.normalize_question('¿Qué es un  Perceptrón?') == 'qué es un perceptrón'
+
+
+def test_lru_evicts_least_recently_used():
+    lru = query_cache.LRUCache(2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1
+    lru.put('c', 3)
+    assert lru.get('b') is None and lru.get('a') == 1 and lru.get('c') == 3
+    assert (lru.hits, lru.misses) == (3, 1)
+
+
+def test_query_cache_cached_and_validate():
+    cache = query_cache.QueryCache(fingerprint={'sha': 1})
+    calls = []
+    compute = lambda: calls.append(1) or ['r']
+    assert cache.cached('¿Hola?', compute, 'dense', 3) == ['r']
+    assert cache.cached('hola', compute, 'dense', 3) == ['r']
+    assert cache.cached('hola', compute, 'lexical', 3) == ['r']
+    assert len(calls) == 2
+    cache.validate({'sha': 1})
+    assert cache.stats()['invalidations'] == 0
+    cache.validate({'sha': 2})
+    assert cache.stats()['invalidations'] == 1 and len(cache.results) == 0
+
+
+def test_semantic_lookup_within_distance():
+    cache = query_cache.SemanticCache(max_distance=0.2)
+    base = _unit(1, 2, 3, 4)
+    cache.put(base * 5, [(7, 0.9), (3, 0.8), (1, 0.7)], 3)
+    assert cache.lookup(_at_distance(base, 0.15), 2) == [(7, 0.9), (3, 0.8)]
+    assert cache.lookup(_at_distance(base, 0.25), 2) is None
+    # Con menos resultados guardados que los pedidos no se reutiliza.
+    assert cache.lookup(base, 5) is None
+    assert cache.stats() == {'semantic_hits': 1, 'semantic_misses': 2, 'semantic_entries': 1}
+
+
+def test_semantic_default_distance_accepts_paraphrase_margin():
+    # El valor por defecto ya no es el 0.1 que solo aceptaba preguntas casi identicas.
+    assert query_cache.SEMANTIC_DISTANCE >= 0.2
+    cache = query_cache.SemanticCache()
+    base = _unit(0, 1, 0, 1)
+    cache.put(base, [(1, 1.0)], 1)
+    assert cache.lookup(_at_distance(base, 0.18), 1) == [(1, 1.0)]
+
+
+def test_semantic_eviction_replaces_least_recently_used():
+    cache = query_cache.SemanticCache(max_distance=0.01, max_entries=2)
+    a, b, c = _unit(1, 0, 0), _unit(0, 1, 0), _unit(0, 0, 1)
+    cache.put(a, [(1, 1.0)], 1)
+    cache.put(b, [(2, 1.0)], 1)
+    assert cache.lookup(a, 1) == [(1, 1.0)]
+    cache.put(c, [(3, 1.0)], 1)
+    assert len(cache) == 2
+    assert cache.lookup(b, 1) is None
+    assert cache.lookup(a, 1) == [(1, 1.0)] and cache.lookup(c, 1) == [(3, 1.0)]
+
+
+def test_semantic_validate_clears_on_new_fingerprint():
+    cache = query_cache.SemanticCache(fingerprint={'sha': 'x', 'params': (1, 2)})
+    cache.put(_unit(1, 1), [(0, 1.0)], 1)
+    cache.validate({'sha': 'x', 'params': [1, 2]})  # igual tras pasar por JSON
+    assert len(cache) == 1
+    cache.validate({'sha': 'y'})
+    assert len(cache) == 0 and cache.lookup(_unit(1, 1), 1) is None
+
+
+def test_semantic_persistence(tmp_path):
+    path = tmp_path / 'semantic.npz'
+    cache = query_cache.SemanticCache(path=path, fingerprint={'sha': 'x'})
+    cache.put(_unit(1, 0, 0), [(4, 0.5), (2, 0.25)], 2)
+    cache.put(_unit(0, 1, 0), [(9, 0.75)], 1)
+    cache.save()
+
+    loaded = query_cache.SemanticCache(path=path, fingerprint={'sha': 'x'})
+    assert len(loaded) == 2
+    assert loaded.lookup(_unit(1, 0, 0), 2) == [(4, 0.5), (2, 0.25)]
+    assert loaded.lookup(_unit(0, 1, 0), 1) == [(9, 0.75)]
+    # Guardada con otra huella (otros embeddings): se ignora.
+    assert len(query_cache.SemanticCache(path=path, fingerprint={'sha': 'y'})) == 0
+
+
+def test_semantic_autosave(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_cache, 'SAVE_EVERY', 2)
+    path = tmp_path / 'semantic.npz'
+    cache = query_cache.SemanticCache(path=path)
+    cache.put(_unit(1, 0), [(1, 1.0)], 1)
+    assert not path.exists()
+    cache.put(_unit(0, 1), [(2, 1.0)], 1)
+    assert path.exists()
+
+
+def test_semantic_warm_searches_only_new_questions():
+    vectors = {'a': _unit(1, 0, 0), 'b': _unit(0, 1, 0), 'a2': _unit(1, 0.01, 0)}
+    searched = []
+
+    def search(embs, k):
+        searched.append(len(embs))
+        return [[(len(searched), 1.0)] for _ in embs]
+
+    cache = query_cache.SemanticCache(max_distance=0.05)
+    encode = lambda qs: np.stack([vectors[q] for q in qs])
+    assert cache.warm(['a', 'b'], encode, search, 1) == 2
+    assert cache.warm(['a2', 'b'], encode, search, 1) == 0
+    assert searched == [2]
+
+
+def test_calibrate_suggests_distance_between_groups():
+    base = _unit(1, 2, 3, 4)
+    vectors = {'a': base, 'a_same': _at_distance(base, 0.1), 'a_other': _at_distance(base, 0.3)}
+    encode = lambda qs: np.stack([vectors[q] for q in qs])
+    distances, suggested = query_cache.calibrate([('a', 'a_same', True), ('a', 'a_other', False)], encode)
+    assert distances == pytest.approx([0.1, 0.3], abs=1e-5)
+    assert suggested == pytest.approx(0.2, abs=1e-5)
+    # Solapados: por debajo del par distinto mas cercano.
+    _, suggested = query_cache.calibrate([('a', 'a_other', True), ('a', 'a_same', False)], encode)
+    assert suggested < 0.1
+
+
+def test_paraphrase_pairs_file():
+    pairs = query_cache.load_pairs(ROOT / 'Data' / 'paraphrase_pairs.tsv')
+    assert ('¿Qué es la IA?', 'qué es inteligencia artificial', True) in pairs
+    assert any(not same for _, _, same in pairs)
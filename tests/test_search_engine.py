@@ -0,0 +1,107 @@
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
+import search_engine
+
+
+def _wait(pid: int, timeout: float) -> int:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return os.waitstatus_to_exitcode(status)
+        time.sleep(0.05)
+    os.kill(pid, 9)
+    os.waitpid(pid, 0)
+    return -1
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requiere fork')
+def test_sharded_search_after_fork():
+    # Como serve_workers.py: el padre ya busco (su pool tiene hilos) y el hijo busca tras el fork.
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((2000, 32)).astype('float32')
+    index = search_engine.build_index(emb, 'float32', 'flat', shards=2)
+    assert isinstance(index, search_engine.ShardedIndex)
+    expected = search_engine.search_batch(index, emb[:3], top_k=5)
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            ok = search_engine.search_batch(index, emb[:3], top_k=5) == expected
+        finally:
+            os._exit(0 if ok else 1)
+    assert _wait(pid, 20.0) == 0
+
+
+def test_sharded_pool_created_once_under_concurrency(monkeypatch):
+    created = []
+
+    class CountingPool(search_engine.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            created.append(self)
+            time.sleep(0.05)  # ensancha la carrera entre las primeras busquedas
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(search_engine, 'ThreadPoolExecutor', CountingPool)
+    emb = np.random.default_rng(1).standard_normal((400, 16)).astype('float32')
+    index = search_engine.build_index(emb, 'float32', 'flat', shards=4)
+    barrier = threading.Barrier(8)
+
+    def first_search():
+        barrier.wait()
+        return search_engine.search_batch(index, emb[:2], top_k=3)
+
+    threads = [threading.Thread(target=first_search) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(created) == 1
+
+
+def test_sharded_pool_within_thread_budget(monkeypatch):
+    # 4 shards con un presupuesto de 2 hilos: 2 hilos en el pool, 1 hilo OpenMP cada uno.
+    if search_engine._HAS_FAISS:
+        monkeypatch.setattr(search_engine.faiss, 'omp_get_max_threads', lambda: 2)
+    else:
+        monkeypatch.setattr(search_engine.os, 'cpu_count', lambda: 2)
+    emb = np.random.default_rng(2).standard_normal((400, 16)).astype('float32')
+    index = search_engine.build_index(emb, 'float32', 'flat', shards=4)
+    assert search_engine.search_batch(index, emb[:1], top_k=1)[0][0][0] == 0
+    assert index._executor()._max_workers == 2
+
+
+@pytest.mark.parametrize('use_faiss', [True, False])
+@pytest.mark.parametrize('dtype', search_engine.DTYPES)
+@pytest.mark.parametrize('kind,params', [('flat', {}), ('flat', {'shards': 2}), ('ivf', {'nlist': 8})])
+def test_pca_index_without_reduced_copy(tmp_path, monkeypatch, use_faiss, dtype, kind, params):
+    # El indice interno sobre Projected da lo mismo que sobre los reducidos materializados.
+    if use_faiss and not search_engine._HAS_FAISS:
+        pytest.skip('sin FAISS')
+    monkeypatch.setattr(search_engine, '_HAS_FAISS', use_faiss)
+    emb = np.random.default_rng(3).standard_normal((600, 32)).astype('float32')
+    queries = emb[:5] + 0.1
+    index = search_engine.build_index(emb, dtype, kind, pca_dim=8, **params)
+    dense = search_engine.PCAIndex(emb, 8, dtype, kind, factory=lambda rows: search_engine.build_index(
+        np.asarray(rows), dtype, kind, **params))
+    assert not hasattr(index, 'reduced')
+    expected = search_engine.search_batch(dense, queries, top_k=5)
+    got = search_engine.search_batch(index, queries, top_k=5)
+    assert [[i for i, _ in hits] for hits in got] == [[i for i, _ in hits] for hits in expected]
+    assert index.memory_bytes() == dense.memory_bytes()
+
+    fp = {'embeddings_sha256': 'x', 'model': 'm', 'chunks': len(emb), 'dim': emb.shape[1]}
+    search_engine.save_index(index, tmp_path / 'index', fp)
+    assert (tmp_path / 'index' / 'components.npy').exists()
+    assert not (tmp_path / 'index' / 'reduced.npy').exists()
+    loaded = search_engine.load_index(tmp_path / 'index', emb, fp, dtype, kind, pca_dim=8, **params)
+    assert isinstance(loaded, search_engine.PCAIndex)
+    assert search_engine.search_batch(loaded, queries, top_k=5) == got